@@ -0,0 +1,414 @@
+"""Benchmark gopher on synthetic data as it scales.
+
+Each case generates a deterministic synthetic ontology, GAF file, proteome,
+and protein matrix with ``gopher.synthetic``, writes them to a temporary
+data directory, and times the main steps of an analysis against them in
+offline mode. Nothing is downloaded.
+
+Run a preset scale and save the timings::
+
+    python benchmarks/benchmark.py --scale small --output baseline.json
+
+Then check a later version for regressions, failing if any benchmark is more
+than 25% slower::
+
+    python benchmarks/benchmark.py --scale small --compare baseline.json
+
+The p-values of the sparse engine are also checked against
+``scipy.stats.mannwhitneyu`` for every case.
+"""
+
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+import numpy as np
+from scipy import stats as sp_stats
+
+import gopher
+from gopher import annotations, enrichment, normalize, stats, tree_search
+from gopher.synthetic import SyntheticDataset
+
+LOGGER = logging.getLogger("gopher.benchmark")
+
+# The (proteins, terms, samples) of each case:
+SCALES = {
+    "tiny": [(500, 200, 2)],
+    "small": [
+        (2000, 1000, 4),
+        (5000, 2000, 4),
+        (5000, 2000, 32),
+    ],
+    "medium": [
+        (5000, 5000, 8),
+        (10000, 10000, 8),
+        (20000, 20000, 8),
+        (20000, 20000, 64),
+    ],
+    "large": [
+        (20000, 20000, 16),
+        (20000, 40000, 16),
+        (20000, 40000, 256),
+        (60000, 40000, 16),
+    ],
+}
+
+# The largest relative difference allowed between gopher and SciPy:
+RTOL = 1e-8
+
+
+def main(argv=None):
+    """Run the benchmarks.
+
+    Parameters
+    ----------
+    argv : list of str, optional
+        The command line arguments.
+
+    Returns
+    -------
+    int
+        The exit code: 1 if the p-values disagree with SciPy or a benchmark
+        regressed, 0 otherwise.
+
+    """
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+    LOGGER.setLevel(logging.INFO)
+
+    # The unit tests replace the annotations with a tiny dummy set:
+    os.environ.pop("PYTEST_CURRENT_TEST", None)
+
+    LOGGER.info("Compiling the Numba kernels...")
+    stats.warmup()
+
+    cases = SCALES[args.scale]
+    if args.case:
+        cases = [tuple(c) for c in args.case]
+
+    results = []
+    agreement = []
+    for n_proteins, n_terms, n_samples in cases:
+        name = f"{n_proteins}x{n_terms}x{n_samples}"
+        LOGGER.info("Case %s (proteins x terms x samples)...", name)
+        dataset = SyntheticDataset.generate(
+            n_proteins, n_terms, n_samples, seed=args.seed
+        )
+        with tempfile.TemporaryDirectory() as tmp:
+            files = dataset.write(tmp)
+            gopher.set_data_dir(tmp)
+            gopher.set_offline(True)
+            timings, error = run_case(dataset, files, args.repeat)
+
+        agreement.append({"case": name, "max_rel_error": error})
+        for bench, times in timings.items():
+            results.append(
+                {
+                    "case": name,
+                    "benchmark": bench,
+                    "n_proteins": n_proteins,
+                    "n_terms": n_terms,
+                    "n_samples": n_samples,
+                    "min": min(times),
+                    "median": float(np.median(times)),
+                }
+            )
+
+    report = {
+        "environment": environment(),
+        "results": results,
+        "agreement": agreement,
+    }
+    print_results(results, agreement)
+    if args.output is not None:
+        with Path(args.output).open("w") as out_ref:
+            json.dump(report, out_ref, indent=2)
+
+    failed = any(a["max_rel_error"] > RTOL for a in agreement)
+    if failed:
+        LOGGER.error("The p-values disagree with SciPy.")
+
+    if args.compare is not None:
+        with Path(args.compare).open() as base_ref:
+            baseline = json.load(base_ref)["results"]
+
+        failed |= compare(results, baseline, args.tolerance)
+
+    return int(failed)
+
+
+def parse_args(argv=None):
+    """Parse the command line arguments."""
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--scale",
+        choices=list(SCALES),
+        default="small",
+        help="The preset cases to run.",
+    )
+    parser.add_argument(
+        "--case",
+        nargs=3,
+        type=int,
+        action="append",
+        metavar=("PROTEINS", "TERMS", "SAMPLES"),
+        help="Run a custom case instead of the preset ones. Repeatable.",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="The number of times to run each benchmark.",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="The seed for the synthetic data.",
+    )
+    parser.add_argument(
+        "--output",
+        help="Save the timings to this JSON file.",
+    )
+    parser.add_argument(
+        "--compare",
+        help="Compare the timings to those in this JSON file.",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=1.25,
+        help="The largest allowed ratio to the baseline timings.",
+    )
+    return parser.parse_args(argv)
+
+
+def run_case(dataset, files, repeat):
+    """Time each step of an analysis on one dataset.
+
+    Parameters
+    ----------
+    dataset : gopher.synthetic.SyntheticDataset
+        The synthetic dataset.
+    files : dict of str: Path
+        The files written by ``dataset.write()``.
+    repeat : int
+        The number of times to run each benchmark.
+
+    Returns
+    -------
+    timings : dict of str: list of float
+        The seconds taken by each run of each benchmark.
+    max_rel_error : float
+        The largest relative difference from SciPy's p-values.
+
+    """
+    data_dir = files["obo"].parents[1]
+    proteins = dataset.proteins
+
+    def clear(*patterns):
+        """Create a function that removes cached files."""
+
+        def remove():
+            for pattern in patterns:
+                for path in data_dir.glob(pattern):
+                    path.unlink()
+
+        return remove
+
+    def load():
+        """Load the annotations from the cache."""
+        return annotations.load_annotations("human")
+
+    annot, mapping = load()
+    subset = dataset.terms["go_name"].iloc[3:13].tolist()
+
+    values = proteins.to_numpy()
+    ranked = stats.rankdata(values)
+    terms, membership = enrichment.membership_matrix(annot, proteins.index)
+    rank_sums = membership @ ranked
+    n1 = np.diff(membership.indptr)[:, None]
+    t_correction = stats.tiecorrect(ranked)
+    pvals = enrichment._test_sparse(values, membership, desc=True)
+
+    benchmarks = {
+        "load_annotations (parse)": (
+            clear("annotations/*/*.npz", "ontologies/*.npz"),
+            load,
+        ),
+        "load_annotations (cached)": (None, load),
+        "tree_search": (
+            None,
+            lambda: tree_search.tree_search(mapping, subset, annot),
+        ),
+        "normalize (parse)": (
+            clear("fasta/*.npz"),
+            lambda: normalize.normalize(proteins, files["fasta"]),
+        ),
+        "normalize (cached)": (
+            None,
+            lambda: normalize.normalize(proteins, files["fasta"]),
+        ),
+        "test_enrichment": (None, lambda: gopher.test_enrichment(proteins)),
+        "test_enrichment (exact)": (
+            None,
+            lambda: gopher.test_enrichment(proteins, method="exact"),
+        ),
+        "stats.rankdata": (None, lambda: stats.rankdata(values)),
+        "stats.tiecorrect": (None, lambda: stats.tiecorrect(ranked)),
+        "stats.ranksum_test": (
+            None,
+            lambda: stats.ranksum_test(
+                rank_sums, n1, len(values), t_correction, alternative="greater"
+            ),
+        ),
+        "stats.permutation_test (100)": (
+            None,
+            lambda: stats.permutation_test(
+                ranked,
+                membership.indptr,
+                membership.indices,
+                n_permutations=100,
+                seed=0,
+            ),
+        ),
+        "stats.fdr_correction": (None, lambda: stats.fdr_correction(pvals)),
+    }
+
+    timings = {}
+    for bench, (setup, func) in benchmarks.items():
+        timings[bench] = []
+        for _ in range(repeat):
+            if setup is not None:
+                setup()
+
+            start = time.perf_counter()
+            func()
+            timings[bench].append(time.perf_counter() - start)
+
+        LOGGER.info("  %-30s %10.4f s", bench, min(timings[bench]))
+
+    return timings, max_rel_error(values, membership, pvals)
+
+
+def max_rel_error(values, membership, pvals, n_checked=50):
+    """Compare the sparse engine's p-values to SciPy's.
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        The protein abundances.
+    membership : scipy.sparse.csr_matrix
+        The terms by proteins membership matrix.
+    pvals : numpy.ndarray
+        The uncorrected p-values from the sparse engine.
+    n_checked : int, optional
+        The number of terms to check, spread evenly across all of them.
+
+    Returns
+    -------
+    float
+        The largest relative difference.
+
+    """
+    errors = [0.0]
+    checked = np.linspace(0, membership.shape[0] - 1, n_checked)
+    for term in np.unique(checked.astype(int)):
+        members = np.zeros(len(values), dtype=bool)
+        members[membership[term].indices] = True
+        expected = sp_stats.mannwhitneyu(
+            values[members],
+            values[~members],
+            alternative="greater",
+            method="asymptotic",
+        ).pvalue
+        with np.errstate(divide="ignore", invalid="ignore"):
+            diff = np.abs(pvals[term] - expected) / expected
+
+        errors.append(np.nanmax(diff, initial=0))
+
+    return float(max(errors))
+
+
+def compare(results, baseline, tolerance):
+    """Compare timings to a baseline.
+
+    Parameters
+    ----------
+    results : list of dict
+        The current timings.
+    baseline : list of dict
+        The baseline timings.
+    tolerance : float
+        The largest allowed ratio of the current to the baseline timings.
+
+    Returns
+    -------
+    bool
+        True if any benchmark regressed.
+
+    """
+    base = {(r["case"], r["benchmark"]): r["min"] for r in baseline}
+    regressed = False
+    for res in results:
+        key = (res["case"], res["benchmark"])
+        if key not in base:
+            continue
+
+        ratio = res["min"] / max(base[key], 1e-9)
+        if ratio > tolerance:
+            regressed = True
+            LOGGER.error(
+                "Regression in %s, %s: %.4f s vs %.4f s (%.2fx)",
+                *key,
+                res["min"],
+                base[key],
+                ratio,
+            )
+
+    return regressed
+
+
+def environment():
+    """Describe the machine and the versions of the main dependencies."""
+    import numba
+    import pandas
+    import scipy
+
+    return {
+        "gopher": gopher.__version__,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pandas.__version__,
+        "scipy": scipy.__version__,
+        "numba": numba.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "numba_threads": numba.get_num_threads(),
+    }
+
+
+def print_results(results, agreement):
+    """Print a table of the timings."""
+    print(f"{'case':<22}{'benchmark':<32}{'min (s)':>10}{'median (s)':>12}")
+    for res in results:
+        print(
+            f"{res['case']:<22}{res['benchmark']:<32}"
+            f"{res['min']:>10.4f}{res['median']:>12.4f}"
+        )
+
+    for agree in agreement:
+        print(
+            f"{agree['case']:<22}{'max relative error vs SciPy':<32}"
+            f"{agree['max_rel_error']:>10.2e}"
+        )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,8 @@
 """See the README for detailed documentation and examples."""
 
+import importlib
+from typing import TYPE_CHECKING
+
 try:
     from importlib.metadata import PackageNotFoundError, version
 
@@ -16,12 +19,86 @@ except ImportError:
     except DistributionNotFound:
         __version__ = None
 
-from . import graph_search
-from .config import get_data_dir, set_data_dir
-from .enrichment import test_enrichment
-from .parsers import read_diann, read_encyclopedia, read_metamorpheus
 from .version import _get_version
 
 # Fall back to version helper if metadata lookup failed
 if __version__ is None:
     __version__ = _get_version()
+
+# The public API and the submodule that defines each function. These are
+# imported on first use, so that importing gopher is fast.
+_EXPORTS = {
+    "get_data_dir": "config",
+    "set_data_dir": "config",
+    "set_offline": "config",
+    "set_release_ttl": "config",
+    "test_enrichment": "enrichment",
+    "test_enrichment_many": "enrichment",
+    "EnrichmentState": "incremental",
+    "update_enrichment": "incremental",
+    "read_diann": "parsers",
+    "read_encyclopedia": "parsers",
+    "read_metamorpheus": "parsers",
+    "to_long": "results",
+    "write_results": "results",
+    "test_enrichment_chunked": "streaming",
+}
+
+_SUBMODULES = {
+    "annotations",
+    "bundle",
+    "cache",
+    "config",
+    "display_data",
+    "enrichment",
+    "graph_search",
+    "incremental",
+    "interning",
+    "metrics",
+    "normalize",
+    "ontologies",
+    "parallel",
+    "parsers",
+    "results",
+    "stats",
+    "streaming",
+    "synthetic",
+    "tree_search",
+    "utils",
+}
+
+__all__ = sorted(_EXPORTS)
+
+# Static analysis tools, such as type checkers and mkdocstrings, cannot see
+# the lazy imports, so the public API is also imported here for them:
+if TYPE_CHECKING:
+    from .config import (
+        get_data_dir,
+        set_data_dir,
+        set_offline,
+        set_release_ttl,
+    )
+    from .enrichment import test_enrichment, test_enrichment_many
+    from .incremental import EnrichmentState, update_enrichment
+    from .parsers import read_diann, read_encyclopedia, read_metamorpheus
+    from .results import to_long, write_results
+    from .streaming import test_enrichment_chunked
+
+
+def __getattr__(name):
+    """Import the public API and submodules on first use."""
+    if name in _EXPORTS:
+        module = importlib.import_module(f".{_EXPORTS[name]}", __name__)
+        value = getattr(module, name)
+    elif name in _SUBMODULES:
+        value = importlib.import_module(f".{name}", __name__)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    """List the public API and submodules."""
+    return sorted({*globals(), *_EXPORTS, *_SUBMODULES})
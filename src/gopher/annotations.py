@@ -1,12 +1,22 @@
 """Get GO annotations."""
 
+import json
+import logging
 import os
+import time
 import uuid
 
+import numpy as np
 import pandas as pd
 import requests
+from scipy import sparse
 
-from . import config, ontologies, utils
+from . import cache, config, interning, metrics, ontologies, utils
+
+LOGGER = logging.getLogger(__name__)
+
+CURRENT_URL = "http://current.geneontology.org/"
+RELEASE_URL = "http://release.geneontology.org/{release}/"
 
 SPECIES = {
     "yeast": "sgd",
@@ -53,7 +63,8 @@ def generate_annotations(proteins, aspect, go_name, go_id=None):
     return annot
 
 
-def download_annotations(stem, release="current", fetch=False):
+@metrics.instrument
+def download_annotations(stem, release="current", fetch=False, offline=None):
     """Download the annotation file.
 
     See http://current.geneontology.org/annotations/index.html for details.
@@ -66,7 +77,14 @@ def download_annotations(stem, release="current", fetch=False):
         The Gene Ontology release version. Using "current" will look up the
         most current version.
     fetch : bool
-        Download the file even if it already exists?
+        Check for a newer file even if it already exists? The file is only
+        downloaded again if it has changed on the server. This is ignored in
+        offline mode.
+    offline : bool, optional
+        Never access the network. When the "current" release is requested,
+        the newest release that has already been downloaded is used instead.
+        By default, this is set by ``gopher.config.set_offline()`` or the
+        GOPHER_OFFLINE environment variable.
 
     Returns
     -------
@@ -74,25 +92,138 @@ def download_annotations(stem, release="current", fetch=False):
         The path to downloaded file.
 
     """
+    if offline is None:
+        offline = config.config.offline
+
     fname = stem.split(".")[0] + ".gaf.gz"
     if release == "current":
-        base = "http://current.geneontology.org/"
-        meta_url = base + "metadata/release-date.json"
-        release = requests.get(meta_url).json()["date"]
-        url = base + "annotations/"
+        release = resolve_release(fname, offline=offline)
+        url = CURRENT_URL + "annotations/"
     else:
-        url = f"http://release.geneontology.org/{release}/annotations/"
+        url = RELEASE_URL.format(release=release) + "annotations/"
 
     out_file = config.get_data_dir() / "annotations" / release / fname
-    if out_file.exists() and not fetch:
+    if out_file.exists() and fetch and offline:
+        LOGGER.warning(
+            "Using the downloaded %s without checking for a newer file, "
+            "because gopher is in offline mode.",
+            out_file,
+        )
+
+    if out_file.exists() and (offline or not fetch):
         return out_file
 
+    if offline:
+        raise FileNotFoundError(
+            f"{fname} for the {release} release has not been downloaded and "
+            "gopher is in offline mode."
+        )
+
     out_file.parent.mkdir(exist_ok=True, parents=True)
     utils.http_download(url + fname, out_file)
     return out_file
 
 
-def load_annotations(species, aspect="all", release="current", fetch=False):
+def resolve_release(fname=None, offline=None):
+    """Find the date of the current Gene Ontology release.
+
+    The release date is cached in the data directory and reused until it is
+    older than the configured time-to-live (see
+    ``gopher.config.set_release_ttl()``). If the release cannot be looked up,
+    the cached or newest local release is used instead.
+
+    Parameters
+    ----------
+    fname : str, optional
+        Only consider local releases that contain this annotation file.
+    offline : bool, optional
+        Never access the network and use the newest local release.
+
+    Returns
+    -------
+    str
+        The release date.
+
+    """
+    if offline is None:
+        offline = config.config.offline
+
+    if offline:
+        return _newest_local_release(fname)
+
+    cache_file = config.get_data_dir() / "annotations" / "release-date.json"
+    try:
+        with cache_file.open() as cache_ref:
+            cached = json.load(cache_ref)
+    except (OSError, ValueError):
+        cached = None
+
+    if cached and time.time() - cached["checked"] < config.config.release_ttl:
+        return cached["date"]
+
+    try:
+        res = requests.get(CURRENT_URL + "metadata/release-date.json")
+        res.raise_for_status()
+        release = res.json()["date"]
+    except (requests.RequestException, ValueError, KeyError) as err:
+        if cached:
+            release = cached["date"]
+        else:
+            release = _newest_local_release(fname)
+
+        LOGGER.warning(
+            "Could not look up the current GO release (%s). Using %s.",
+            err,
+            release,
+        )
+        return release
+
+    cache_file.parent.mkdir(exist_ok=True, parents=True)
+    with cache_file.open("w") as cache_ref:
+        json.dump({"date": release, "checked": time.time()}, cache_ref)
+
+    return release
+
+
+def _newest_local_release(fname=None):
+    """Find the newest release that has already been downloaded.
+
+    Parameters
+    ----------
+    fname : str, optional
+        Only consider releases that contain this annotation file.
+
+    Returns
+    -------
+    str
+        The release date.
+
+    """
+    annot_dir = config.get_data_dir() / "annotations"
+    releases = sorted(
+        (
+            d.name
+            for d in annot_dir.glob("*")
+            if d.is_dir() and (fname is None or (d / fname).exists())
+        ),
+        reverse=True,
+    )
+    if not releases:
+        raise FileNotFoundError(
+            f"No downloaded GO releases were found in {annot_dir}."
+        )
+
+    return releases[0]
+
+
+@metrics.instrument
+def load_annotations(
+    species,
+    aspect="all",
+    release="current",
+    fetch=False,
+    propagate=False,
+):
     """Load the Gene Ontology (GO) annotations for a species.
 
     Parameters
@@ -110,6 +241,10 @@ def load_annotations(species, aspect="all", release="current", fetch=False):
         most current version.
     fetch : bool
         Download the file even if it already exists?
+    propagate : bool
+        Annotate each protein with every ancestor of its annotated terms,
+        following the true path rule? The propagated annotations are cached
+        alongside the parsed annotations.
 
     Returns
     -------
@@ -160,18 +295,157 @@ def load_annotations(species, aspect="all", release="current", fetch=False):
             "GO:0002": [],
             "GO:0003": [],
         }
+        dummy = interning.intern_annotations(dummy)
+        if propagate:
+            dummy = propagate_annotations(dummy, mapping)
+
         return dummy, mapping
 
     aspects = {"cc": "C", "mf": "F", "bp": "P", "all": None}
 
     try:
-        aspect = aspects[aspect.lower()]
+        aspect_code = aspects[aspect.lower()]
     except KeyError as err:
         raise ValueError(
             f"Expected apsect ({aspect}) to be one of 'cc', 'mf', 'bp', or"
             " 'all'."
         ) from err
 
+    terms, mapping = ontologies.load_ontology()
+    species = SPECIES.get(species.lower(), species.lower())
+    annot_file = download_annotations(species, release=release, fetch=fetch)
+    sources = [annot_file, ontologies.download_ontology()]
+    stem = f"{species}.{aspect.lower()}"
+    if propagate:
+        cache_file = annot_file.with_name(f"{stem}.propagated.npz")
+        annot = cache.load_table(cache_file, sources, categorical=True)
+        if annot is not None:
+            return annot, mapping
+
+    annot = read_annotations(
+        annot_file,
+        aspect=aspect_code,
+        terms=terms,
+        sources=sources,
+        cache_file=annot_file.with_name(f"{stem}.annot.npz"),
+    )
+    if propagate:
+        annot = propagate_annotations(annot, mapping)
+        cache.save_table(annot, cache_file, sources)
+
+    metrics.count(annotations=len(annot))
+    return annot, mapping
+
+
+@metrics.instrument
+def propagate_annotations(annot, ontology):
+    """Propagate annotations to every ancestor of the annotated terms.
+
+    Following the true path rule, a protein annotated with a term is also
+    annotated with all of the term's ancestors. The propagation is done for
+    every term at once, by multiplying the sparse protein by term
+    annotations with the precomputed ancestor closure. Relationships are
+    only followed within each GO aspect: ancestors that the ontology assigns
+    to a different aspect than the annotation are not added.
+
+    Parameters
+    ----------
+    annot : pandas.DataFrame
+        The annotations, with "uniprot_accession", "go_id", "aspect", and
+        "go_name" columns.
+    ontology : Ontology or dict of str: list of str
+        The compiled ontology, or a mapping of each term to its children.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The propagated annotations. Annotations with terms that are not in
+        the ontology are kept as they are.
+
+    """
+    if not isinstance(ontology, ontologies.Ontology):
+        ontology = ontologies.Ontology.from_mapping(ontology)
+
+    annot = annot.reset_index(drop=True)
+    names = annot.dropna(subset="go_name").drop_duplicates("go_id")
+    names = dict(zip(names["go_id"], names["go_name"], strict=True))
+    names = {**ontology.terms(), **names}
+
+    codes = interning.lookup(annot["go_id"], ontology.id_index)
+    known = codes >= 0
+    closure = ontology.ancestor_matrix(include_self=True).astype(np.float32)
+
+    propagated = [annot.loc[~known, :]]
+    for aspect, group in annot.loc[known, :].groupby(
+        "aspect", sort=False, observed=True
+    ):
+        # Drop ancestors from other aspects, but keep the annotated terms:
+        other = (ontology.aspects != "") & (ontology.aspects != aspect)
+        aspect_closure = closure @ sparse.diags(
+            (~other).astype(np.float32)
+        ) + sparse.diags(other.astype(np.float32))
+        prot_idx, accessions = pd.factorize(group["uniprot_accession"])
+        found = sparse.csr_matrix(
+            (
+                np.ones(len(group), dtype=np.float32),
+                (prot_idx, codes[group.index]),
+            ),
+            shape=(len(accessions), len(ontology)),
+        )
+        found = (found @ aspect_closure).tocoo()
+        order = np.lexsort((found.col, found.row))
+        go_ids = pd.Series(ontology.ids[found.col[order]], dtype=object)
+        propagated.append(
+            pd.DataFrame(
+                {
+                    "uniprot_accession": accessions[found.row[order]],
+                    "go_id": go_ids,
+                    "aspect": aspect,
+                    "go_name": go_ids.map(names),
+                }
+            )
+        )
+
+    annot = pd.concat(propagated, ignore_index=True)
+    annot = annot.drop_duplicates(ignore_index=True)
+    return interning.intern_annotations(annot)
+
+
+@metrics.instrument
+def read_annotations(annot_file, aspect, terms, sources=None, cache_file=None):
+    """Read and deduplicate the annotations in a GAF file.
+
+    Parameters
+    ----------
+    annot_file : Path
+        The GAF file to read.
+    aspect : str, {"C", "F", "P"} or None
+        The GO aspect to keep. ``None`` keeps all of them.
+    terms : dict of str: str
+        The GO accessions mapped to their names.
+    sources : list of Path, optional
+        The files the parsed annotations depend on. Changes to any of them
+        invalidate the cache. By default, this is ``annot_file``.
+    cache_file : Path, optional
+        Store the parsed annotations in this file and read them from it on
+        subsequent calls.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The "uniprot_accession", "go_id", "aspect", and "go_name" of each
+        annotation, as categoricals.
+
+    """
+    if sources is None:
+        sources = [annot_file]
+
+    if cache_file is not None:
+        annot = cache.load_table(cache_file, sources, categorical=True)
+        if annot is not None:
+            metrics.count(annotations=len(annot))
+            return annot
+
     cols = [
         "db",
         "uniprot_accession",
@@ -192,9 +466,6 @@ def load_annotations(species, aspect="all", release="current", fetch=False):
         "gene_product_form_id",
     ]
 
-    terms, mapping = ontologies.load_ontology()
-    species = SPECIES.get(species.lower(), species.lower())
-    annot_file = download_annotations(species, release=release, fetch=fetch)
     annot = pd.read_table(
         annot_file,
         comment="!",
@@ -215,4 +486,10 @@ def load_annotations(species, aspect="all", release="current", fetch=False):
     keep = ["uniprot_accession", "go_id", "aspect"]
     annot = annot.loc[:, keep].drop_duplicates()
     annot["go_name"] = annot["go_id"].map(terms)
-    return annot, mapping
+    annot = interning.intern_annotations(annot.reset_index(drop=True))
+
+    if cache_file is not None:
+        cache.save_table(annot, cache_file, sources)
+
+    metrics.count(annotations=len(annot))
+    return annot
@@ -0,0 +1,170 @@
+"""Prepare self-contained data directories for offline use.
+
+A bundle is a gopher data directory with the GAF files, the ontology, and
+their parsed caches for a set of species, releases, and aspects, along with
+a manifest of its contents. It only contains relative paths, so it can be
+copied to shared storage and used by pointing GOPHER_DATA_DIR at it::
+
+    gopher prepare /shared/gopher -s human yeast -a all cc
+
+gopher never accesses the network when using a bundle, unless offline mode
+is explicitly disabled. Copy bundles with their modification times (such as
+with ``cp -a`` or ``rsync -a``). Otherwise, each process computes the digest
+of the GAF and OBO files the first time it loads a cache built from them,
+to check that they have not changed.
+"""
+
+import json
+import logging
+import time
+from pathlib import Path
+
+from . import annotations, cache, config, ontologies
+
+LOGGER = logging.getLogger(__name__)
+
+# Increment when the layout of the manifest changes:
+BUNDLE_VERSION = 1
+
+
+def prepare_bundle(
+    path,
+    species=("human",),
+    releases=("current",),
+    aspects=("all",),
+    propagate=False,
+    fetch=False,
+    offline=False,
+):
+    """Download and compile the annotations for offline use.
+
+    Parameters
+    ----------
+    path : str or Path
+        The bundle directory. It is created if needed, and an existing bundle
+        is extended.
+    species : list of str, optional
+        The species to prepare, as for ``load_annotations()``.
+    releases : list of str, optional
+        The Gene Ontology releases to prepare. "current" is resolved to the
+        date of the current release.
+    aspects : list of str, optional
+        The aspects to prepare: "cc", "mf", "bp", or "all".
+    propagate : bool, optional
+        Also prepare the annotations propagated to every ancestor term?
+    fetch : bool, optional
+        Download the GAF files even if they have already been downloaded?
+    offline : bool, optional
+        Only use files that have already been downloaded to the bundle?
+
+    Returns
+    -------
+    dict
+        The manifest of the bundle.
+
+    """
+    path = Path(path).expanduser()
+    path.mkdir(parents=True, exist_ok=True)
+    previous_path = config.config.path
+    previous_offline = config.config._offline
+    config.set_data_dir(path)
+    config.set_offline(offline)
+    try:
+        manifest = read_manifest(path) or {"annotations": []}
+        entries = {_key(e): e for e in manifest["annotations"]}
+        for name in species:
+            stem = annotations.SPECIES.get(name.lower(), name.lower())
+            for release in releases:
+                gaf = annotations.download_annotations(
+                    stem, release=release, fetch=fetch
+                )
+                for aspect in aspects:
+                    LOGGER.info(
+                        "Compiling %s annotations for %s (%s)...",
+                        aspect,
+                        name,
+                        gaf.parent.name,
+                    )
+                    annotations.load_annotations(
+                        name,
+                        aspect=aspect,
+                        release=gaf.parent.name,
+                        propagate=propagate,
+                    )
+                    entry = {
+                        "species": stem,
+                        "release": gaf.parent.name,
+                        "aspect": aspect.lower(),
+                        "propagate": propagate,
+                    }
+                    entries[_key(entry)] = entry
+
+        ontologies.load_compiled_ontology()
+        manifest = {
+            "version": BUNDLE_VERSION,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "annotations": sorted(entries.values(), key=_key),
+            "files": _describe_files(path),
+        }
+        with (path / config.BUNDLE_FILE).open("w") as out_ref:
+            json.dump(manifest, out_ref, indent=2)
+
+    finally:
+        config.config._path = previous_path
+        config.config.offline = previous_offline
+
+    LOGGER.info(
+        "Prepared a bundle of %i files in %s", len(manifest["files"]), path
+    )
+    return manifest
+
+
+def read_manifest(path=None):
+    """Read the manifest of a bundle.
+
+    Parameters
+    ----------
+    path : str or Path, optional
+        The bundle directory. By default, the current data directory.
+
+    Returns
+    -------
+    dict or None
+        The manifest, or None if the directory is not a bundle.
+
+    """
+    path = config.get_data_dir() if path is None else Path(path)
+    try:
+        with (path / config.BUNDLE_FILE).open() as manifest_ref:
+            return json.load(manifest_ref)
+    except FileNotFoundError:
+        return None
+
+
+def _describe_files(path):
+    """The size and SHA-256 digest of each file in a bundle."""
+    files = {}
+    for fname in sorted(path.rglob("*")):
+        rel = fname.relative_to(path).as_posix()
+        if not fname.is_file() or rel in {
+            config.BUNDLE_FILE,
+            "annotations/release-date.json",
+        }:
+            continue
+
+        files[rel] = {
+            "size": fname.stat().st_size,
+            "sha256": cache.file_digest(fname),
+        }
+
+    return files
+
+
+def _key(entry):
+    """Identify the annotations described by a manifest entry."""
+    return (
+        entry["species"],
+        entry["release"],
+        entry["aspect"],
+        entry["propagate"],
+    )
@@ -0,0 +1,266 @@
+"""Compiled, on-disk caches of parsed data files.
+
+Tables are stored as NumPy ``.npz`` archives, with each column dictionary
+encoded as integer codes and an array of unique values. Each cache records
+the files it was built from, so that it is rebuilt when they change.
+"""
+
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+LOGGER = logging.getLogger(__name__)
+
+# Increment when the layout of the cached files changes:
+FORMAT_VERSION = 1
+
+# The (path, size, modification time, digest) of the source files whose
+# digest has already been verified by this process:
+_VERIFIED = set()
+
+
+def file_digest(path, chunk_size=2**20):
+    """Compute the SHA-256 digest of a file.
+
+    Parameters
+    ----------
+    path : str or Path
+        The file.
+    chunk_size : int, optional
+        The number of bytes to read at a time.
+
+    Returns
+    -------
+    str
+        The hexadecimal digest.
+
+    """
+    digest = hashlib.sha256()
+    with Path(path).open("rb") as file_ref:
+        for chunk in iter(lambda: file_ref.read(chunk_size), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def file_signature(path):
+    """Describe a file so that changes to it can be detected.
+
+    Parameters
+    ----------
+    path : str or Path
+        The file.
+
+    Returns
+    -------
+    dict
+        The name, size, modification time, and SHA-256 digest of the file.
+
+    """
+    path = Path(path)
+    stat = path.stat()
+    return {
+        "name": path.name,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": file_digest(path),
+    }
+
+
+def is_fresh(signatures, sources):
+    """Check whether the source files still match their signatures.
+
+    The modification time is checked first; the digest is only computed when
+    it differs, such as after the files have been copied elsewhere. A file
+    whose digest matches is remembered, so each process computes it at most
+    once for each file.
+
+    Parameters
+    ----------
+    signatures : list of dict
+        The signatures from ``file_signature()`` when the cache was built.
+    sources : list of str or Path
+        The current source files.
+
+    Returns
+    -------
+    bool
+        True if none of the source files have changed.
+
+    """
+    if len(signatures) != len(sources):
+        return False
+
+    for sig, path in zip(signatures, sources, strict=True):
+        path = Path(path)
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return False
+
+        if sig["name"] != path.name or sig["size"] != stat.st_size:
+            return False
+
+        if sig["mtime_ns"] == stat.st_mtime_ns:
+            continue
+
+        key = (str(path.resolve()), stat.st_size, stat.st_mtime_ns)
+        if (*key, sig["sha256"]) in _VERIFIED:
+            continue
+
+        if sig["sha256"] != file_digest(path):
+            return False
+
+        _VERIFIED.add((*key, sig["sha256"]))
+
+    return True
+
+
+def save_table(table, path, sources):
+    """Save a table of strings to a cache file.
+
+    Parameters
+    ----------
+    table : pandas.DataFrame
+        The table to save. Missing values are preserved.
+    path : str or Path
+        The cache file to create.
+    sources : list of str or Path
+        The files the table was built from.
+
+    """
+    data = {}
+    for col in table.columns:
+        codes, uniques = pd.factorize(
+            table[col], sort=True, use_na_sentinel=True
+        )
+        data[f"codes/{col}"] = codes.astype(np.int32)
+        data[f"values/{col}"] = np.asarray(uniques, dtype=str)
+
+    save_arrays(path, sources, columns=list(table.columns), **data)
+
+
+def load_table(path, sources, categorical=False):
+    """Load a table from a cache file, if it is still valid.
+
+    Parameters
+    ----------
+    path : str or Path
+        The cache file.
+    sources : list of str or Path
+        The files the table was built from.
+    categorical : bool, optional
+        Return the columns as pandas categoricals, with sorted categories,
+        instead of strings?
+
+    Returns
+    -------
+    pandas.DataFrame or None
+        The cached table, or None if the cache is missing or out of date.
+
+    """
+    data = load_arrays(path, sources)
+    if data is None:
+        return None
+
+    table = {}
+    for col in data["columns"]:
+        codes = data[f"codes/{col}"]
+        values = data[f"values/{col}"].astype(object)
+        if categorical:
+            table[col] = pd.Categorical.from_codes(codes, values)
+        else:
+            table[col] = _decode(codes, values)
+
+    return pd.DataFrame(table)
+
+
+def save_arrays(path, sources, **arrays):
+    """Save NumPy arrays to a cache file.
+
+    Parameters
+    ----------
+    path : str or Path
+        The cache file to create.
+    sources : list of str or Path
+        The files the arrays were built from.
+    **arrays : numpy.ndarray
+        The arrays to save. Lists of strings are also accepted.
+
+    """
+    path = Path(path)
+    meta = {
+        "version": FORMAT_VERSION,
+        "keys": list(arrays),
+        "sources": [file_signature(s) for s in sources],
+    }
+    data = {k: np.asarray(v) for k, v in arrays.items()}
+    data["meta"] = np.array(json.dumps(meta))
+
+    path.parent.mkdir(exist_ok=True, parents=True)
+    tmp_file = path.with_name(path.name + f".{os.getpid()}.tmp")
+    with tmp_file.open("wb") as out_ref:
+        np.savez(out_ref, **data)
+
+    os.replace(tmp_file, path)
+
+
+def load_arrays(path, sources):
+    """Load NumPy arrays from a cache file, if it is still valid.
+
+    Parameters
+    ----------
+    path : str or Path
+        The cache file.
+    sources : list of str or Path
+        The files the arrays were built from.
+
+    Returns
+    -------
+    dict of str: numpy.ndarray or None
+        The cached arrays, or None if the cache is missing or out of date.
+
+    """
+    path = Path(path)
+    if not path.exists():
+        return None
+
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            if meta["version"] != FORMAT_VERSION or not is_fresh(
+                meta["sources"], sources
+            ):
+                LOGGER.info("Rebuilding out-of-date cache %s", path)
+                return None
+
+            return {k: data[k] for k in meta["keys"]}
+
+    except (OSError, ValueError, KeyError) as err:
+        LOGGER.warning("Ignoring unreadable cache %s: %s", path, err)
+        return None
+
+
+def _decode(codes, values):
+    """Decode dictionary encoded strings, restoring missing values.
+
+    Parameters
+    ----------
+    codes : numpy.ndarray
+        The integer codes, where -1 indicates a missing value.
+    values : numpy.ndarray
+        The unique values.
+
+    Returns
+    -------
+    numpy.ndarray
+        The decoded object array.
+
+    """
+    values = np.append(values, np.nan).astype(object)
+    return values[codes]
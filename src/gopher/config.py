@@ -6,6 +6,11 @@ from pathlib import Path
 
 LOGGER = logging.getLogger(__name__)
 
+TRUTHY = {"1", "true", "yes", "on"}
+
+# The manifest written by ``gopher prepare`` in a bundle data directory.
+BUNDLE_FILE = "gopher-bundle.json"
+
 
 class GopherConfig:
     """Configure the data directory for ppx.
@@ -13,6 +18,14 @@ class GopherConfig:
     Attributes
     ----------
     path : pathlib.Path object
+    offline : bool
+        Never access the network. Set with the GOPHER_OFFLINE environment
+        variable. By default, this is True only for bundles prepared by
+        ``gopher prepare``.
+    release_ttl : float
+        The number of seconds to reuse the resolved "current" GO release
+        before checking it again. Set with the GOPHER_RELEASE_TTL environment
+        variable.
 
     """
 
@@ -20,6 +33,24 @@ class GopherConfig:
         """Initialize the _PPXDataDir."""
         self._path = None
         self.path = os.getenv("GOPHER_DATA_DIR")
+        self._offline = None
+        if "GOPHER_OFFLINE" in os.environ:
+            self.offline = os.environ["GOPHER_OFFLINE"].lower() in TRUTHY
+
+        self.release_ttl = float(os.getenv("GOPHER_RELEASE_TTL", 86400))
+
+    @property
+    def offline(self):
+        """Whether gopher never accesses the network."""
+        if self._offline is None:
+            return (self.path / BUNDLE_FILE).exists()
+
+        return self._offline
+
+    @offline.setter
+    def offline(self, offline):
+        """Set whether gopher never accesses the network."""
+        self._offline = offline
 
     @property
     def path(self):
@@ -68,5 +99,34 @@ def set_data_dir(path=None):
     config.path = path
 
 
+def set_offline(offline=True):
+    """Prevent gopher from accessing the network.
+
+    In offline mode, the newest GO release that has already been downloaded
+    is used when the "current" release is requested. Data directories
+    prepared by ``gopher prepare`` are used in offline mode unless it is
+    disabled here or by the GOPHER_OFFLINE environment variable.
+
+    Parameters
+    ----------
+    offline : bool or None, optional
+        Enable offline mode? None restores the default.
+
+    """
+    config.offline = None if offline is None else bool(offline)
+
+
+def set_release_ttl(seconds):
+    """Set how long the resolved "current" GO release is reused.
+
+    Parameters
+    ----------
+    seconds : float
+        The number of seconds before the current release is checked again.
+
+    """
+    config.release_ttl = float(seconds)
+
+
 # Initialize the configuration when loaded:
 config = GopherConfig()
@@ -4,20 +4,231 @@ import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 import seaborn as sns
-from scipy import stats
+from scipy import sparse
 
+from . import interning
 from .annotations import load_annotations
+from .enrichment import GRP_COLS_OUT, membership_matrix
 from .stats import rankdata
 
 LOGGER = logging.getLogger(__name__)
 
 
+class AnnotationSession:
+    """GO annotations loaded and indexed once for a set of proteins.
+
+    Pass a session to the functions in this module to skip loading the
+    annotations and matching them to the proteins on every call. Use
+    ``AnnotationSession.load()`` to create one.
+
+    Parameters
+    ----------
+    annot : pandas.DataFrame
+        The annotations, with "uniprot_accession", "go_id", "go_name", and
+        "aspect" columns.
+    accessions : list of str, optional
+        The UniProt accessions of the proteins of interest. By default, every
+        annotated protein is used.
+
+    Attributes
+    ----------
+    accessions : pandas.Index
+        The unique UniProt accessions of the proteins of interest.
+    annot : pandas.DataFrame
+        The annotations of these proteins.
+    terms : pandas.DataFrame
+        The "go_id", "go_name", and "aspect" of each term.
+    membership : scipy.sparse.csr_matrix
+        A terms by proteins matrix, where 1 indicates that a protein is
+        annotated with a term.
+
+    """
+
+    def __init__(self, annot, accessions=None):
+        """Initialize the AnnotationSession."""
+        annot = interning.intern_annotations(annot)
+        if accessions is None:
+            accessions = annot["uniprot_accession"].dropna().unique()
+
+        self.accessions = pd.Index(accessions).unique()
+        keep = annot["uniprot_accession"].isin(self.accessions)
+        self.annot = annot.loc[keep, :].reset_index(drop=True)
+        self.terms, self.membership = membership_matrix(
+            self.annot, self.accessions
+        )
+
+        # An extra empty column stands in for unknown proteins:
+        empty = sparse.csc_matrix((self.membership.shape[0], 1))
+        self._by_protein = sparse.hstack(
+            [self.membership.tocsc(), empty], format="csc"
+        )
+        self._rows = {}
+        for col in ["go_id", "go_name"]:
+            for term, rows in self.terms.groupby(col).indices.items():
+                self._rows.setdefault(term, []).extend(rows)
+
+    @classmethod
+    def load(
+        cls,
+        proteins=None,
+        aspect="all",
+        species="human",
+        release="current",
+        fetch=False,
+        propagate=False,
+    ):
+        """Load the annotations for a set of proteins.
+
+        Parameters
+        ----------
+        proteins : pandas.DataFrame or list of str, optional
+            The proteins of interest, as a dataframe indexed by UniProt
+            accession or a list of accessions. By default, every annotated
+            protein is used.
+        aspect : str, {"cc", "mf", "bp", "all"}, optional
+            The Gene Ontology aspect to use. Use "cc" for "Cellular
+            Compartment", "mf" for "Molecular Function", "bp" for "Biological
+            Process", or "all" for all three.
+        species : str, {"human", "yeast", ...}, optional.
+            The species for which to retrieve GO annotations. If not "human"
+            or "yeast", see
+            [here](http://current.geneontology.org/products/pages/downloads.html).
+        release : str, optional
+            The Gene Ontology release version. Using "current" will look up
+            the most current version.
+        fetch : bool, optional
+            Download the GO annotations even if they have been downloaded
+            before?
+        propagate : bool, optional
+            Annotate each protein with every ancestor of its annotated terms?
+
+        Returns
+        -------
+        AnnotationSession
+            The loaded annotations.
+
+        """
+        annot, _ = load_annotations(
+            species=species,
+            aspect=aspect,
+            release=release,
+            fetch=fetch,
+            propagate=propagate,
+        )
+        if isinstance(proteins, pd.DataFrame):
+            proteins = proteins.index
+
+        return cls(annot, proteins)
+
+    def term_proteins(self, go_term):
+        """The proteins annotated with a GO term.
+
+        Parameters
+        ----------
+        go_term : str
+            The GO term name or accession.
+
+        Returns
+        -------
+        pandas.Index
+            The UniProt accessions of the proteins.
+
+        """
+        rows = self._rows.get(go_term, [])
+        cols = np.unique(self.membership[rows, :].indices)
+        return self.accessions[cols]
+
+    def protein_terms(self, accession):
+        """The GO terms that a protein is annotated with.
+
+        Parameters
+        ----------
+        accession : str
+            The UniProt accession.
+
+        Returns
+        -------
+        pandas.DataFrame
+            The "go_id", "go_name", and "aspect" of each term.
+
+        """
+        col = self._position([accession])[0]
+        rows = self._by_protein[:, col].indices
+        return self.terms.iloc[np.sort(rows), :].reset_index(drop=True)
+
+    def annotations(self, index, go_subset=None):
+        """The annotations of the proteins in a dataset.
+
+        Parameters
+        ----------
+        index : pandas.Index or list of str
+            The UniProt accession of each protein in the dataset.
+        go_subset : list of str, optional
+            The GO term names or accessions of interest.
+
+        Returns
+        -------
+        pandas.DataFrame
+            The annotations of each protein, in the order of ``index``.
+
+        """
+        annot = self.annot
+        if go_subset:
+            in_names = annot["go_name"].isin(go_subset)
+            in_ids = annot["go_id"].isin(go_subset)
+            annot = annot.loc[in_names | in_ids, :]
+
+        accessions = pd.DataFrame(list(index), columns=["uniprot_accession"])
+        return accessions.merge(annot, how="inner")
+
+    def select(self, index, go_terms=None):
+        """The membership matrix for the proteins in a dataset.
+
+        Parameters
+        ----------
+        index : pandas.Index or list of str
+            The UniProt accession of each protein in the dataset.
+        go_terms : list of str, optional
+            The GO term names or accessions of interest. By default, every
+            term that annotates at least one of the proteins is used.
+
+        Returns
+        -------
+        terms : pandas.DataFrame
+            The "go_id", "go_name", and "aspect" of each row of the matrix.
+        membership : scipy.sparse.csr_matrix
+            A terms by proteins matrix, with one column for each protein in
+            ``index``.
+
+        """
+        membership = self._by_protein[:, self._position(index)].tocsr()
+        keep = np.diff(membership.indptr) > 0
+        if go_terms:
+            wanted = np.zeros(len(keep), dtype=bool)
+            for term in go_terms:
+                wanted[self._rows.get(term, [])] = True
+
+            keep &= wanted
+
+        return (
+            self.terms.loc[keep, :].reset_index(drop=True),
+            membership[keep, :],
+        )
+
+    def _position(self, index):
+        """The column of each protein, or the empty column if unknown."""
+        cols = interning.encode(index, self.accessions)
+        cols[cols < 0] = len(self.accessions)
+        return cols
+
+
 def map_proteins(
     protein_list,
     aspect="all",
     species="human",
     release="current",
     fetch=False,
+    session=None,
 ):
     """Map the proteins to the GO terms.
 
@@ -38,6 +249,9 @@ def map_proteins(
         most current version.
     fetch : bool, optional
         Download the GO annotations even if they have been downloaded before?
+    session : AnnotationSession, optional
+        Use these annotations instead of loading them. The aspect, species,
+        release, and fetch options are then ignored.
 
     Returns
     -------
@@ -49,7 +263,9 @@ def map_proteins(
     # annotations.
     proteins = pd.DataFrame(index=protein_list)
     # Get the annotations
-    annot = get_annotations(proteins, aspect, species, release, fetch)
+    annot = get_annotations(
+        proteins, aspect, species, release, fetch, session=session
+    )
     # Return relevant columns
     return annot[["uniprot_accession", "go_id", "go_name"]]
 
@@ -61,6 +277,7 @@ def get_rankings(
     species="human",
     release="current",
     fetch=False,
+    session=None,
 ):
     """Rank the proteins and show whether proteins are in a specified term.
 
@@ -83,6 +300,9 @@ def get_rankings(
         most current version.
     fetch : bool, optional
         Download the GO annotations even if they have been downloaded before?
+    session : AnnotationSession, optional
+        Use these annotations instead of loading them. The aspect, species,
+        release, and fetch options are then ignored.
 
     Returns
     -------
@@ -92,7 +312,9 @@ def get_rankings(
 
     """
     # Get the annotations
-    annot = get_annotations(proteins, aspect, species, release, fetch)
+    annot = get_annotations(
+        proteins, aspect, species, release, fetch, session=session
+    )
     # Rank the data and format it as a dataframe
     ranked = rankdata(proteins.to_numpy())
     ranked = pd.DataFrame(ranked, columns=proteins.columns)
@@ -102,6 +324,170 @@ def get_rankings(
     return ranked
 
 
+def rank_membership(
+    proteins,
+    go_terms=None,
+    aspect="all",
+    species="human",
+    release="current",
+    fetch=False,
+    session=None,
+):
+    """Rank the proteins and find their membership in many GO terms at once.
+
+    Parameters
+    ----------
+    proteins : pd.DataFrame
+        Dataframe of protein quant data
+    go_terms : list of str, optional
+        The GO term names or accessions of interest. By default, every term
+        that annotates at least one of the proteins is used.
+    aspect : str, {"cc", "mf", "bp", "all"}, optional
+        The Gene Ontology aspect to use. Use "cc" for "Cellular Compartment",
+        "mf" for "Molecular Function", "bp" for "Biological Process", or "all"
+        for all three.
+    species : str, {"human", "yeast", ...}, optional.
+        The species for which to retrieve GO annotations. If not "human" or
+        "yeast", see
+        [here](http://current.geneontology.org/products/pages/downloads.html).
+    release : str, optional
+        The Gene Ontology release version. Using "current" will look up the
+        most current version.
+    fetch : bool, optional
+        Download the GO annotations even if they have been downloaded before?
+    session : AnnotationSession, optional
+        Use these annotations instead of loading them. The aspect, species,
+        release, and fetch options are then ignored.
+
+    Returns
+    -------
+    ranks : pandas.DataFrame
+        The rank of each protein in each sample, where the most abundant
+        protein has the highest rank.
+    membership : pandas.DataFrame
+        A protein by term boolean matrix, where True indicates that a protein
+        is annotated with a term. The columns are sparse, so only the
+        annotations are stored, and are labeled by the "go_id" and "go_name"
+        of each term.
+
+    """
+    terms, membership = _select(
+        proteins, go_terms, aspect, species, release, fetch, session
+    )
+    ranks = pd.DataFrame(
+        rankdata(proteins.to_numpy()),
+        index=proteins.index,
+        columns=proteins.columns,
+    )
+    membership = pd.DataFrame.sparse.from_spmatrix(
+        membership.T.tocsc().astype(np.uint8),
+        index=proteins.index,
+        columns=pd.MultiIndex.from_frame(terms.loc[:, ["go_id", "go_name"]]),
+    )
+    return ranks, membership.astype(pd.SparseDtype(bool, False))
+
+
+def term_auc(
+    proteins,
+    go_terms=None,
+    aspect="all",
+    species="human",
+    release="current",
+    fetch=False,
+    session=None,
+):
+    """Calculate the area under the ROC curve of many GO terms at once.
+
+    The AUC of a term is the probability that one of its proteins is more
+    abundant than a protein outside of it. It is calculated from the rank
+    sums of every term in every sample with one sparse matrix product, and
+    matches the AUC shown by ``roc()``.
+
+    Parameters
+    ----------
+    proteins : pd.DataFrame
+        Dataframe of protein quant data
+    go_terms : list of str, optional
+        The GO term names or accessions of interest. By default, every term
+        that annotates at least one of the proteins is used.
+    aspect : str, {"cc", "mf", "bp", "all"}, optional
+        The Gene Ontology aspect to use. Use "cc" for "Cellular Compartment",
+        "mf" for "Molecular Function", "bp" for "Biological Process", or "all"
+        for all three.
+    species : str, {"human", "yeast", ...}, optional.
+        The species for which to retrieve GO annotations. If not "human" or
+        "yeast", see
+        [here](http://current.geneontology.org/products/pages/downloads.html).
+    release : str, optional
+        The Gene Ontology release version. Using "current" will look up the
+        most current version.
+    fetch : bool, optional
+        Download the GO annotations even if they have been downloaded before?
+    session : AnnotationSession, optional
+        Use these annotations instead of loading them. The aspect, species,
+        release, and fetch options are then ignored.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The "GO ID", "GO Name", and "GO Aspect" of each term, followed by its
+        AUC in each sample.
+
+    """
+    terms, membership = _select(
+        proteins, go_terms, aspect, species, release, fetch, session
+    )
+    aucs = _auc(rankdata(proteins.to_numpy()), membership)
+    results = terms.set_axis(GRP_COLS_OUT, axis=1)
+    aucs = pd.DataFrame(aucs, columns=proteins.columns)
+    return pd.concat([results, aucs], axis=1)
+
+
+def _select(proteins, go_terms, aspect, species, release, fetch, session):
+    """Build the term by protein membership matrix of a dataset.
+
+    Returns
+    -------
+    terms : pandas.DataFrame
+        The "go_id", "go_name", and "aspect" of each row of the matrix.
+    membership : scipy.sparse.csr_matrix
+        A terms by proteins matrix for the rows of ``proteins``.
+
+    """
+    if session is not None:
+        return session.select(proteins.index, go_terms)
+
+    annot = get_annotations(
+        proteins, aspect, species, release, fetch, go_subset=go_terms
+    )
+    return membership_matrix(annot, proteins.index)
+
+
+def _auc(ranked, membership):
+    """Calculate the AUC of each term from the ranks of the proteins.
+
+    Parameters
+    ----------
+    ranked : numpy.ndarray
+        The rank of each protein in each sample.
+    membership : scipy.sparse.csr_matrix or numpy.ndarray
+        A terms by proteins membership matrix.
+
+    Returns
+    -------
+    numpy.ndarray
+        The AUC of each term in each sample. Terms that contain all or none of
+        the proteins are NaN.
+
+    """
+    n_pos = np.asarray(membership.sum(axis=1), dtype=np.float64)
+    n_pos = n_pos.reshape(-1, 1)
+    n_neg = ranked.shape[0] - n_pos
+    u_stat = membership @ ranked - n_pos * (n_pos + 1) / 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return u_stat / (n_pos * n_neg)
+
+
 def get_annotations(
     proteins,
     aspect="all",
@@ -109,6 +495,7 @@ def get_annotations(
     release="current",
     fetch=False,
     go_subset=None,
+    session=None,
 ):
     """Get the annotations for proteins in a dataset.
 
@@ -132,6 +519,9 @@ def get_annotations(
     go_subset: list of str, optional
         The go terms of interest. Should consists of the go term names such
         as 'nucleus' or 'cytoplasm'.
+    session : AnnotationSession, optional
+        Use these annotations instead of loading them. The aspect, species,
+        release, and fetch options are then ignored.
 
     Returns
     -------
@@ -139,6 +529,9 @@ def get_annotations(
         Dataframe with protein annotations.
 
     """
+    if session is not None:
+        return session.annotations(proteins.index, go_subset)
+
     # Load the annotation file
     annot, _ = load_annotations(
         species=species,
@@ -195,6 +588,7 @@ def roc(
     species="human",
     release="current",
     fetch=False,
+    session=None,
 ):
     """Plot the ROC curve for a GO term in each sample.
 
@@ -217,6 +611,9 @@ def roc(
         most current version.
     fetch : bool, optional
         Download the GO annotations even if they have been downloaded before?
+    session : AnnotationSession, optional
+        Use these annotations instead of loading them. The aspect, species,
+        release, and fetch options are then ignored.
 
     Returns
     -------
@@ -227,12 +624,20 @@ def roc(
     # Get a list of the samples
     samples = proteins.columns
     # Get annotations
-    annot = get_annotations(proteins, aspect, species, release, fetch)
+    annot = get_annotations(
+        proteins, aspect, species, release, fetch, session=session
+    )
     # Rank the data based on the go term
     proteins = in_term(proteins, go_term, annot)
-    # Get the number of positive and negative cases
-    n_pos = sum(proteins["in_term"])
-    n_neg = len(proteins) - n_pos
+    # Calculate the AUC in every sample at once
+    values = proteins[samples].to_numpy()
+    members = proteins["in_term"].to_numpy()
+    aucs = _auc(rankdata(values), members[None, :].astype(np.float64))[0]
+
+    # Calculate TPR and FPR for every sample, from the most abundant protein
+    hits = members[np.argsort(-values, axis=0, kind="stable")]
+    tprs = hits.cumsum(axis=0) / hits.sum(axis=0)
+    fprs = (~hits).cumsum(axis=0) / (~hits).sum(axis=0)
 
     # Set up plot
     fig, axs = plt.subplots(1, len(samples), figsize=(13, 4.5))
@@ -240,18 +645,9 @@ def roc(
 
     # Graph the ROC curve for each sample
     for sample in samples:
-        # Sort values
-        sorted = proteins.sort_values(sample, ascending=False)
-
-        # Calculate TPR and FPR
-        sorted["tpr"] = sorted["in_term"].cumsum() / sorted["in_term"].sum()
-        sorted["fpr"] = (~sorted["in_term"]).cumsum() / (
-            ~sorted["in_term"]
-        ).sum()
-
         # Need to add a point at 0, 0:
-        tpr = np.append(0, sorted["tpr"])
-        fpr = np.append(0, sorted["fpr"])
+        tpr = np.append(0, tprs[:, i])
+        fpr = np.append(0, fprs[:, i])
 
         # Graph ROC curve
         ax = axs[i]
@@ -263,13 +659,8 @@ def roc(
         ax.set_xlabel("False Positive Rate (FPR)")
         ax.set_ylabel("True Positive Rate (TPR)")
 
-        # Calculate AUC and put on graph in lower right corner
-        u_stat, _ = stats.mannwhitneyu(
-            proteins.loc[proteins["in_term"], sample],
-            proteins.loc[~proteins["in_term"], sample],
-        )
-        auc = u_stat / (n_pos * n_neg)
-        auc = "AUC = " + str(round(auc, 3))
+        # Put the AUC on graph in lower right corner
+        auc = "AUC = " + str(round(aucs[i], 3))
         p.annotate(auc, xy=(0.75, 0))
 
         i += 1
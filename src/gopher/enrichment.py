@@ -1,18 +1,35 @@
 """Calculate the enrichments for a collection of experiments."""
 
 import logging
+from collections.abc import Mapping
+from pathlib import Path
 
+import numpy as np
 import pandas as pd
-from statsmodels.stats import multitest
+from scipy import sparse
 from tqdm.auto import tqdm
 
-from .annotations import load_annotations
-from .stats import mannwhitneyu
+from . import interning, metrics, parallel
+from .annotations import load_annotations, propagate_annotations
+from .ontologies import load_ontology
+from .parsers import read_encyclopedia
+from .stats import (
+    fdr_correction,
+    mannwhitneyu,
+    permutation_test,
+    rankdata,
+    ranksum_test,
+    tiecorrect,
+)
 from .tree_search import tree_search
 
 LOGGER = logging.getLogger(__name__)
 
+GRP_COLS = ["go_id", "go_name", "aspect"]
+GRP_COLS_OUT = ["GO ID", "GO Name", "GO Aspect"]
 
+
+@metrics.instrument
 def test_enrichment(
     proteins,
     desc=True,
@@ -26,6 +43,13 @@ def test_enrichment(
     annotations=None,
     mapping=None,
     aggregate_terms=True,
+    engine="sparse",
+    propagate=False,
+    method="asymptotic",
+    n_permutations=10000,
+    seed=None,
+    n_jobs=1,
+    log_pvals=False,
 ):
     """Test for the enrichment of Gene Ontology terms from protein abundance.
 
@@ -71,85 +95,803 @@ def test_enrichment(
         A custom mapping of the GO term relationships.
     aggregate_terms : bool, optional
         Aggregate the terms and do the tree search.
+    engine : str, {"sparse", "loop"}, optional
+        How the tests are computed. "sparse" ranks each column once and
+        computes the rank sums of every term with a single sparse matrix
+        product. "loop" runs a separate test for each term and is kept as a
+        reference implementation.
+    propagate : bool, optional
+        Annotate each protein with every ancestor of its annotated terms,
+        following the true path rule, before testing. This applies to all
+        terms, so ``aggregate_terms`` has no further effect.
+    method : str, {"asymptotic", "exact", "permutation"}, optional
+        How the p-values are calculated. "exact" uses the exact null
+        distribution of the U statistic for terms with at most
+        ``gopher.stats.EXACT_CUTOFF`` proteins in samples without ties, and
+        the normal approximation otherwise. "permutation" compares the rank
+        sum of each term to those obtained after shuffling the proteins
+        between terms, and requires the "sparse" engine.
+    n_permutations : int, optional
+        The number of permutations for the "permutation" method.
+    seed : int or numpy.random.Generator, optional
+        The seed for the "permutation" method.
+    n_jobs : int, optional
+        The number of processes used to test terms and samples. -1 uses all
+        of the available cores.
+    log_pvals : bool, optional
+        Return the natural logarithm of the adjusted p-values? These are
+        computed in log space throughout, so very strong enrichments keep
+        their order instead of underflowing to 0.
 
     Returns
     -------
     pandas.DataFrame
-        The adjusted p-value for each tested GO term in each sample.
+        The adjusted p-value for each tested GO term in each sample, or its
+        natural logarithm.
 
     """
+    metrics.count(proteins=proteins.shape[0], samples=proteins.shape[1])
     LOGGER.info("Retrieving GO annotations...")
+    annot = _prepare_annotations(
+        annotations=annotations,
+        mapping=mapping,
+        species=species,
+        aspect=aspect,
+        release=release,
+        fetch=fetch,
+        go_subset=go_subset,
+        aggregate_terms=aggregate_terms,
+        propagate=propagate,
+    )
 
+    annot, rows = _annotated_rows(proteins.index, annot, contaminants_filter)
+    proteins = pd.DataFrame(proteins).iloc[rows, :]
+
+    LOGGER.info("Testing enrichment...")
+    if engine == "sparse":
+        terms, membership = membership_matrix(annot, proteins.index)
+        pvals = _test_sparse(
+            proteins.to_numpy(),
+            membership,
+            desc,
+            method,
+            n_permutations=n_permutations,
+            seed=seed,
+            n_jobs=n_jobs,
+            log=log_pvals,
+        )
+    elif engine == "loop":
+        terms, pvals = _test_loop(
+            proteins, annot, desc, progress, method, log=log_pvals
+        )
+    else:
+        raise ValueError(
+            f"Expected engine ({engine}) to be one of 'sparse' or 'loop'."
+        )
+
+    return _format_results(terms, pvals, proteins.columns, log=log_pvals)
+
+
+@metrics.instrument
+def test_enrichment_many(
+    datasets,
+    reader=read_encyclopedia,
+    desc=True,
+    aspect="all",
+    species="human",
+    release="current",
+    go_subset=None,
+    contaminants_filter=None,
+    fetch=False,
+    progress=False,
+    annotations=None,
+    mapping=None,
+    aggregate_terms=True,
+    propagate=False,
+    method="asymptotic",
+    n_permutations=10000,
+    seed=None,
+    n_jobs=1,
+    log_pvals=False,
+):
+    """Test for the enrichment of GO terms in many datasets.
+
+    The annotations are loaded and compiled into a single membership matrix
+    once, which is then reused for every dataset, so the per-dataset cost is
+    essentially that of the statistics. Each result is the same as that of
+    ``test_enrichment()`` for the dataset on its own.
+
+    Parameters
+    ----------
+    datasets : iterable or dict of pandas.DataFrame, str, or Path
+        The protein dataframes to test, each formatted as for
+        ``test_enrichment()``, or files to read with ``reader``.
+    reader : callable, optional
+        The function used to read datasets that are given as files.
+    desc : bool, optional
+        Rank proteins in descending order?
+    aspect : str, {"cc", "mf", "bp", "all"}, optional
+        The Gene Ontology aspect to use.
+    species : str, {"human", "yeast", ...}, optional.
+        The species for which to retrieve GO annotations.
+    release : str, optional
+        The Gene Ontology release version.
+    go_subset: list of str, optional
+        The go terms of interest.
+    contaminants_filter: List[str], optional
+        A list of uniprot accessions for common contaminants to filter out.
+    fetch : bool, optional
+        Download the GO annotations even if they have been downloaded before?
+    progress : bool, optional
+        Show a progress bar over the datasets?
+    annotations: pandas.DataFrame, optional
+        A custom annotations dataframe.
+    mapping: defaultdict, optional
+        A custom mapping of the GO term relationships.
+    aggregate_terms : bool, optional
+        Aggregate the terms and do the tree search.
+    propagate : bool, optional
+        Propagate the annotations to all ancestor terms.
+    method : str, {"asymptotic", "exact", "permutation"}, optional
+        How the p-values are calculated.
+    n_permutations : int, optional
+        The number of permutations for the "permutation" method.
+    seed : int, optional
+        The seed for the "permutation" method.
+    n_jobs : int, optional
+        The number of processes used to test terms and samples. -1 uses all
+        of the available cores.
+    log_pvals : bool, optional
+        Return the natural logarithm of the adjusted p-values?
+
+    Returns
+    -------
+    list or dict of pandas.DataFrame
+        The adjusted p-value for each tested GO term in each sample of each
+        dataset. A dict with the same keys is returned if ``datasets`` is a
+        dict.
+
+    """
+    keyed = isinstance(datasets, Mapping)
+    results = iter_enrichment_many(
+        datasets.items() if keyed else enumerate(datasets),
+        reader=reader,
+        desc=desc,
+        aspect=aspect,
+        species=species,
+        release=release,
+        go_subset=go_subset,
+        contaminants_filter=contaminants_filter,
+        fetch=fetch,
+        progress=progress,
+        annotations=annotations,
+        mapping=mapping,
+        aggregate_terms=aggregate_terms,
+        propagate=propagate,
+        method=method,
+        n_permutations=n_permutations,
+        seed=seed,
+        n_jobs=n_jobs,
+        log_pvals=log_pvals,
+    )
+    if keyed:
+        return dict(results)
+
+    return [result for _, result in results]
+
+
+def iter_enrichment_many(
+    datasets,
+    reader=read_encyclopedia,
+    desc=True,
+    aspect="all",
+    species="human",
+    release="current",
+    go_subset=None,
+    contaminants_filter=None,
+    fetch=False,
+    progress=False,
+    annotations=None,
+    mapping=None,
+    aggregate_terms=True,
+    propagate=False,
+    method="asymptotic",
+    n_permutations=10000,
+    seed=None,
+    n_jobs=1,
+    log_pvals=False,
+    on_error=None,
+):
+    """Test for the enrichment of GO terms, yielding each dataset's result.
+
+    Datasets are only read when the previous result has been consumed.
+    ``datasets`` is an iterable of the key and the dataset of each dataset,
+    such as the items of a dict. If ``on_error`` is given, it is called with
+    the key and the exception of each dataset that cannot be read or tested,
+    which is then skipped. Otherwise, the exception is raised. See
+    ``test_enrichment_many()`` for a description of the other parameters.
+
+    Yields
+    ------
+    key : object
+        The key of the dataset.
+    result : pandas.DataFrame
+        The adjusted p-value for each tested GO term in each sample of the
+        dataset.
+
+    """
+    LOGGER.info("Retrieving GO annotations...")
+    annot = _prepare_annotations(
+        annotations=annotations,
+        mapping=mapping,
+        species=species,
+        aspect=aspect,
+        release=release,
+        fetch=fetch,
+        go_subset=go_subset,
+        aggregate_terms=aggregate_terms,
+        propagate=propagate,
+    )
+    index = _AnnotationIndex(annot, contaminants_filter)
+
+    for key, proteins in tqdm(datasets, disable=not progress):
+        try:
+            if isinstance(proteins, str | Path):
+                proteins = reader(proteins)
+
+            rows, terms, membership = index.select(proteins.index)
+            proteins = pd.DataFrame(proteins).iloc[rows, :]
+            pvals = _test_sparse(
+                proteins.to_numpy(),
+                membership,
+                desc,
+                method,
+                n_permutations=n_permutations,
+                seed=seed,
+                n_jobs=n_jobs,
+                log=log_pvals,
+            )
+            result = _format_results(
+                terms, pvals, proteins.columns, log=log_pvals
+            )
+        except Exception as err:
+            if on_error is None:
+                raise
+
+            on_error(key, err)
+            continue
+
+        yield key, result
+
+
+@metrics.instrument
+def _prepare_annotations(
+    annotations,
+    mapping,
+    species,
+    aspect,
+    release,
+    fetch,
+    go_subset,
+    aggregate_terms,
+    propagate=False,
+):
+    """Load the annotations and restrict them to the terms of interest.
+
+    Parameters
+    ----------
+    annotations : pandas.DataFrame or None
+        A custom annotations dataframe.
+    mapping : dict or None
+        A custom mapping of the GO term relationships.
+    species : str
+        The species for which to retrieve GO annotations.
+    aspect : str, {"cc", "mf", "bp", "all"}
+        The Gene Ontology aspect to use.
+    release : str
+        The Gene Ontology release version.
+    fetch : bool
+        Download the GO annotations even if they have been downloaded before?
+    go_subset : list of str or None
+        The GO term names or IDs of interest.
+    aggregate_terms : bool
+        Aggregate the terms and do the tree search.
+    propagate : bool, optional
+        Propagate the annotations to all ancestor terms.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The annotations to test.
+
+    """
     if annotations is not None:
         annot = annotations
+        if propagate:
+            if not mapping:
+                _, mapping = load_ontology()
+
+            annot = propagate_annotations(annot, mapping)
     else:
         annot, map = load_annotations(
             species=species,
             aspect=aspect,
             release=release,
             fetch=fetch,
+            propagate=propagate and not mapping,
         )
         if not mapping:
             mapping = map
+        elif propagate:
+            annot = propagate_annotations(annot, mapping)
 
     if go_subset:
-        if aggregate_terms and mapping:
+        if aggregate_terms and mapping and not propagate:
             annot = tree_search(mapping, go_subset, annot)
 
         in_names = annot["go_name"].isin(go_subset)
         in_ids = annot["go_id"].isin(go_subset)
         annot = annot.loc[in_names | in_ids, :]
 
-    accessions = pd.DataFrame(
-        list(proteins.index),
-        columns=["uniprot_accession"],
-    )
-    if contaminants_filter:
-        accessions = accessions[
-            ~accessions["uniprot_accession"].isin(contaminants_filter)
-        ]
-
-    # Get the GO terms and proteins
-    annot = accessions.merge(annot, how="inner")
-    n_prot = proteins.shape[1]
-    proteins = pd.DataFrame(proteins).loc[annot["uniprot_accession"], :]
-    lost = n_prot - proteins.shape[1]
+    return annot
+
+
+@metrics.instrument
+def _annotated_rows(index, annot, contaminants_filter=None):
+    """Find the proteins that are annotated with at least one term.
+
+    Parameters
+    ----------
+    index : pandas.Index or list of str
+        The UniProt accession for each protein.
+    annot : pandas.DataFrame
+        The annotations.
+    contaminants_filter : list of str, optional
+        UniProt accessions to exclude.
+
+    Returns
+    -------
+    annot : pandas.DataFrame
+        The annotations for the proteins that were found.
+    rows : numpy.ndarray
+        The positions of the annotated proteins in ``index``.
+
+    """
+    annot = interning.intern_annotations(annot)
+    accessions = annot["uniprot_accession"].cat.categories
+    annot_codes = interning.codes(annot["uniprot_accession"])
+    index_codes = interning.encode(index, accessions)
+    usable = _usable_accessions(annot, contaminants_filter)
+
+    # Get the GO terms and proteins. Each protein is only ranked once, no
+    # matter how many terms it is annotated with.
+    rows = np.flatnonzero(usable[index_codes])
+    found = np.zeros(len(accessions) + 1, dtype=bool)
+    found[index_codes[rows]] = True
+    annot = annot.loc[found[annot_codes], :]
+    metrics.count(proteins=len(rows), annotations=len(annot))
+    lost = len(index) - len(rows)
     if lost:
         LOGGER.warning("%i proteins not found in GO annotations.", lost)
 
+    return annot, rows
+
+
+def _usable_accessions(annot, contaminants_filter=None):
+    """Find the accessions that have annotations and are not contaminants.
+
+    Parameters
+    ----------
+    annot : pandas.DataFrame
+        The interned annotations.
+    contaminants_filter : list of str, optional
+        UniProt accessions to exclude.
+
+    Returns
+    -------
+    numpy.ndarray
+        A boolean array indexed by the accession codes, with an extra final
+        element for missing accessions (code -1) that is always False.
+
+    """
+    accessions = annot["uniprot_accession"].cat.categories
+    usable = np.zeros(len(accessions) + 1, dtype=bool)
+    usable[interning.codes(annot["uniprot_accession"])] = True
+    if contaminants_filter:
+        usable[interning.encode(contaminants_filter, accessions)] = False
+
+    usable[-1] = False
+    return usable
+
+
+def _format_results(terms, pvals, columns, adjust=True, log=False):
+    """Assemble the results dataframe.
+
+    Parameters
+    ----------
+    terms : pandas.DataFrame
+        The "go_id", "go_name", and "aspect" of each tested term.
+    pvals : numpy.ndarray
+        The p-values for each term in each column.
+    columns : list of str
+        The column names for the p-values.
+    adjust : bool, optional
+        Apply the Benjamini-Hochberg correction to each column?
+    log : bool, optional
+        Are the p-values natural logarithms?
+
+    Returns
+    -------
+    pandas.DataFrame
+        The p-value for each tested GO term in each sample.
+
+    """
+    if adjust and len(terms):
+        pvals = adjust_pvals(pvals, log=log)
+
+    results = terms.set_axis(GRP_COLS_OUT, axis=1).reset_index(drop=True)
+    pvals = pd.DataFrame(pvals, columns=columns)
+    return pd.concat([results, pvals], axis=1)
+
+
+@metrics.instrument
+def membership_matrix(annot, accessions):
+    """Build a sparse term by protein membership matrix.
+
+    Terms are ordered as they would be by
+    ``annot.groupby(["go_id", "go_name", "aspect"])``, so annotations with a
+    missing GO ID, name, or aspect are dropped.
+
+    Parameters
+    ----------
+    annot : pandas.DataFrame
+        The annotations, with "uniprot_accession", "go_id", "go_name", and
+        "aspect" columns.
+    accessions : pandas.Index or list of str
+        The proteins that define the columns of the matrix.
+
+    Returns
+    -------
+    terms : pandas.DataFrame
+        The "go_id", "go_name", and "aspect" of each row of the matrix.
+    membership : scipy.sparse.csr_matrix
+        A terms by proteins matrix, where 1 indicates that a protein is
+        annotated with a term.
+
+    """
+    annot = interning.intern_annotations(annot)
+    accessions = pd.Index(accessions)
+
+    # Combine the codes for the GO ID, name, and aspect into a single key.
+    # Because the categories are sorted, so are the keys.
+    key = np.zeros(len(annot), dtype=np.int64)
+    grp_codes = {}
+    for col in GRP_COLS:
+        grp_codes[col] = interning.codes(annot[col])
+        key = key * (len(annot[col].cat.categories) + 1) + grp_codes[col]
+
+    missing = np.any([c < 0 for c in grp_codes.values()], axis=0)
+    _, first, term_idx = np.unique(
+        key[~missing], return_index=True, return_inverse=True
+    )
+    terms = pd.DataFrame(
+        {
+            c: np.asarray(
+                annot[c].cat.categories.take(grp_codes[c][~missing][first]),
+                dtype=object,
+            )
+            for c in GRP_COLS
+        }
+    )
+
+    acc_codes = interning.codes(annot["uniprot_accession"])[~missing]
+    index_codes = interning.encode(
+        accessions, annot["uniprot_accession"].cat.categories
+    )
+    if accessions.is_unique:
+        position = np.full(
+            len(annot["uniprot_accession"].cat.categories) + 1,
+            -1,
+            dtype=np.int64,
+        )
+        position[index_codes] = np.arange(len(accessions))
+        position[-1] = -1
+        prot_idx = position[acc_codes]
+    else:
+        # Every copy of a duplicated accession is a member of the term:
+        rows = pd.DataFrame(
+            {"code": index_codes, "prot_idx": np.arange(len(accessions))}
+        )
+        rows = rows.loc[rows["code"] >= 0, :]
+        pairs = rows.merge(
+            pd.DataFrame({"code": acc_codes, "term_idx": term_idx})
+        )
+        term_idx = pairs["term_idx"].to_numpy()
+        prot_idx = pairs["prot_idx"].to_numpy()
+
+    keep = (term_idx >= 0) & (prot_idx >= 0)
+    membership = sparse.csr_matrix(
+        (
+            np.ones(keep.sum(), dtype=np.float64),
+            (term_idx[keep], prot_idx[keep]),
+        ),
+        shape=(len(terms), len(accessions)),
+    )
+
+    # Duplicate annotations are summed during construction:
+    membership.data[:] = 1.0
+    metrics.count(terms=membership.shape[0], annotations=membership.nnz)
+    return terms, membership
+
+
+class _AnnotationIndex:
+    """A membership matrix for every annotated protein, for reuse.
+
+    The membership matrix for a dataset is the subset of columns for its
+    proteins, without the terms that none of them are annotated with. Only
+    the last subset is remembered, so consecutive datasets with the same
+    proteins share it without keeping a subset alive for every dataset.
+
+    Parameters
+    ----------
+    annot : pandas.DataFrame
+        The annotations.
+    contaminants_filter : list of str, optional
+        UniProt accessions to exclude.
+
+    """
+
+    def __init__(self, annot, contaminants_filter=None):
+        """Initialize the _AnnotationIndex."""
+        annot = interning.intern_annotations(annot)
+        self.accessions = annot["uniprot_accession"].cat.categories
+        self.usable = _usable_accessions(annot, contaminants_filter)
+        self.terms, membership = membership_matrix(annot, self.accessions)
+        self.membership = membership.tocsc()
+        self._last = (None, None, None)
+
+    def select(self, index):
+        """Get the proteins and membership matrix for a dataset.
+
+        Parameters
+        ----------
+        index : pandas.Index or list of str
+            The UniProt accession for each protein in the dataset.
+
+        Returns
+        -------
+        rows : numpy.ndarray
+            The positions of the annotated proteins in ``index``.
+        terms : pandas.DataFrame
+            The "go_id", "go_name", and "aspect" of each tested term.
+        membership : scipy.sparse.csr_matrix
+            The terms by proteins membership matrix for these rows.
+
+        """
+        index_codes = interning.encode(index, self.accessions)
+        rows = np.flatnonzero(self.usable[index_codes])
+        lost = len(index_codes) - len(rows)
+        if lost:
+            LOGGER.warning("%i proteins not found in GO annotations.", lost)
+
+        cols = index_codes[rows]
+        key = cols.tobytes()
+        if key != self._last[0]:
+            membership = self.membership[:, cols].tocsr()
+            tested = np.diff(membership.indptr) > 0
+            self._last = (
+                key,
+                self.terms.loc[tested, :].reset_index(drop=True),
+                membership[tested, :],
+            )
+
+        return (rows, *self._last[1:])
+
+
+@metrics.instrument
+def _test_sparse(
+    values,
+    membership,
+    desc,
+    method="asymptotic",
+    n_permutations=10000,
+    seed=None,
+    n_jobs=1,
+    log=False,
+):
+    """Test every term at once from a single ranking of each column.
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        The protein quantities, with one row per protein.
+    membership : scipy.sparse.csr_matrix
+        The terms by proteins membership matrix.
+    desc : bool
+        Rank proteins in descending order?
+    method : str, {"asymptotic", "exact", "permutation"}, optional
+        How the p-values are calculated.
+    n_permutations : int, optional
+        The number of permutations for the "permutation" method.
+    seed : int or numpy.random.Generator, optional
+        The seed for the "permutation" method.
+    n_jobs : int, optional
+        The number of processes. Values other than 1 shard the terms and
+        columns across a process pool.
+    log : bool, optional
+        Return the natural logarithm of the p-values?
+
+    Returns
+    -------
+    numpy.ndarray
+        The p-values for each term in each column, or their logarithms.
+
+    """
+    values = np.asarray(values, dtype=np.float64)
+    metrics.count(tests=membership.shape[0] * values.shape[1])
+    if not membership.shape[0]:
+        return np.empty((0, values.shape[1]))
+
+    if n_jobs != 1:
+        return parallel.test_sparse_sharded(
+            values,
+            membership,
+            desc,
+            method,
+            n_permutations=n_permutations,
+            seed=seed,
+            n_jobs=n_jobs,
+            log=log,
+        )
+
+    if not desc:
+        values = -values
+
+    _, _, pvals = _test_ranked(
+        rankdata(values),
+        membership,
+        method,
+        n_permutations=n_permutations,
+        seed=seed,
+        log=log,
+    )
+    return pvals
+
+
+def _test_ranked(
+    ranked,
+    membership,
+    method="asymptotic",
+    n_permutations=10000,
+    seed=None,
+    log=False,
+):
+    """Test every term from the ranks of each column.
+
+    Parameters
+    ----------
+    ranked : numpy.ndarray
+        The ranks of the proteins in each column, from ``rankdata()``, with
+        the largest quantities ranked last.
+    membership : scipy.sparse.csr_matrix
+        The terms by proteins membership matrix.
+    method : str, {"asymptotic", "exact", "permutation"}, optional
+        How the p-values are calculated.
+    n_permutations : int, optional
+        The number of permutations for the "permutation" method.
+    seed : int or numpy.random.Generator, optional
+        The seed for the "permutation" method.
+    log : bool, optional
+        Return the natural logarithm of the p-values?
+
+    Returns
+    -------
+    u_stats : numpy.ndarray
+        The U statistic of each term in each column.
+    t_correction : numpy.ndarray
+        The tie correction of each column.
+    pvals : numpy.ndarray
+        The p-values for each term in each column, or their logarithms.
+
+    """
+    t_correction = tiecorrect(ranked)
+    rank_sums = membership @ ranked
+    n1 = np.diff(membership.indptr)[:, None]
+    if method != "permutation":
+        u_stats, pvals = ranksum_test(
+            rank_sums,
+            n1,
+            ranked.shape[0],
+            t_correction,
+            alternative="greater",
+            method=method,
+            log=log,
+        )
+        return u_stats, t_correction, pvals
+
+    pvals = permutation_test(
+        ranked,
+        membership.indptr,
+        membership.indices,
+        n_permutations=n_permutations,
+        seed=seed,
+        log=log,
+    )
+    return rank_sums - n1 * (n1 + 1) / 2, t_correction, pvals
+
+
+@metrics.instrument
+def _test_loop(
+    proteins, annot, desc, progress, method="asymptotic", log=False
+):
+    """Test each term with its own Mann-Whitney U test.
+
+    This is the reference implementation for ``_test_sparse()``.
+
+    Parameters
+    ----------
+    proteins : pandas.DataFrame
+        The protein quantities, with one row per protein.
+    annot : pandas.DataFrame
+        The annotations for the proteins.
+    desc : bool
+        Rank proteins in descending order?
+    progress : bool
+        Show a progress bar?
+    method : str, {"asymptotic", "exact"}, optional
+        How the p-values are calculated.
+    log : bool, optional
+        Return the natural logarithm of the p-values?
+
+    Returns
+    -------
+    terms : pandas.DataFrame
+        The tested terms.
+    pvals : numpy.ndarray
+        The p-values for each term in each column.
+
+    """
+    if method == "permutation":
+        raise ValueError("The permutation method requires the sparse engine.")
+
     if not desc:
         proteins = -proteins
 
+    terms = []
     results = []
-    grp_cols = ["go_id", "go_name", "aspect"]
-
-    LOGGER.info("Testing enrichment...")
     for term, accessions in tqdm(
-        annot.groupby(grp_cols), disable=not progress
+        annot.groupby(GRP_COLS, observed=True), disable=not progress
     ):
         in_term = proteins.index.isin(accessions["uniprot_accession"].unique())
         in_vals = proteins[in_term].to_numpy()
         out_vals = proteins[~in_term].to_numpy()
-        res = mannwhitneyu(in_vals, out_vals, alternative="greater")
+        res = mannwhitneyu(
+            in_vals, out_vals, alternative="greater", method=method, log=log
+        )
         if res is not None:
-            results.append(list(term) + list(res[1]))
+            terms.append(term)
+            results.append(res[1])
 
-    cols = ["GO ID", "GO Name", "GO Aspect"] + list(proteins.columns)
-    results = pd.DataFrame(results, columns=cols)
-    results.loc[:, proteins.columns] = results.loc[:, proteins.columns].apply(
-        adjust_pvals, raw=True
-    )
+    terms = pd.DataFrame(terms, columns=GRP_COLS)
+    pvals = np.array(results).reshape(len(terms), proteins.shape[1])
+    metrics.count(tests=pvals.size)
+    return terms, pvals
 
-    return results
 
+@metrics.instrument
+def adjust_pvals(pvals, method="bh", log=False):
+    """Compute FDR adjusted p-values.
 
-def adjust_pvals(pvals):
-    """Compute BH adjusted p-values.
-
-    Paramerters
-    -----------
+    Parameters
+    ----------
     pvals : numpy.ndarray
-        A 1D numpy array of p-values.
+        A 1D numpy array of p-values, or a 2D array that is adjusted one
+        column at a time.
+    method : str, {"bh", "by"}, optional
+        Use the Benjamini-Hochberg or the Benjamini-Yekutieli procedure.
+    log : bool, optional
+        Are the p-values natural logarithms? The adjusted p-values are then
+        logarithms too.
 
     Returns
     -------
@@ -157,4 +899,5 @@ def adjust_pvals(pvals):
         The FDR adjusted p-values.
 
     """
-    return multitest.fdrcorrection(pvals)[1]
+    metrics.count(tests=np.size(pvals))
+    return fdr_correction(pvals, method=method, log=log)
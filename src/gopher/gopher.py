@@ -1,29 +1,107 @@
 """The command line entry point for gopher-enrich."""
 
+import contextvars
+import glob
+import itertools
 import logging
+import sys
+import time
 from argparse import ArgumentParser
-
-from .enrichment import test_enrichment
-from .parsers import read_encyclopedia
+from collections import Counter, deque
+from pathlib import Path
 
 LOGGER = logging.getLogger(__name__)
 
 
-def parse_args():
+def parse_args(argv=None):
     """Get the command line arguments.
 
+    The subcommand must come before any other argument. Without one, "run"
+    is used, so ``gopher proteins.txt`` is the same as
+    ``gopher run proteins.txt``.
+
+    Parameters
+    ----------
+    argv : list of str, optional
+        The arguments to parse. By default, those given to the program.
+
     Returns
     -------
     Namespace
-        A namespace populated with the parsed arguments.
+        A namespace populated with the parsed arguments. Its "command" is
+        the subcommand.
 
     """
     desc = """
     gopher: Gene ontology enrichment analysis using protein expression. For
-     more details see TalusBio.github.io/gopher
+     more details see TalusBio.github.io/gopher. Run "gopher warmup" once
+     after installing to compile the statistical kernels ahead of time,
+     "gopher batch" to analyze many files at once, and "gopher prepare" to
+     build a data directory for offline use. Without a command, "run" is
+     used; use "gopher run" explicitly for a file named like a command.
     """
     parser = ArgumentParser(description=desc)
+    commands = parser.add_subparsers(dest="command", metavar="command")
+
+    run_parser = commands.add_parser(
+        "run",
+        help="Test one file of quantified proteins (the default).",
+        description="Test one file of quantified proteins.",
+    )
+    _add_run_arguments(run_parser)
+
+    batch_parser = commands.add_parser(
+        "batch",
+        help="Test many files, loading the GO annotations only once.",
+        description="""
+        Test many files of quantified proteins, loading the GO annotations
+         only once. The files are read concurrently and one output file is
+         written for each of them.
+        """,
+    )
+    _add_batch_arguments(batch_parser)
+
+    commands.add_parser(
+        "warmup",
+        help="Compile the statistical kernels ahead of time.",
+        description="""
+        Compile the statistical kernels and cache them on disk, so that later
+         runs of gopher do not need to.
+        """,
+    )
+
+    prepare_parser = commands.add_parser(
+        "prepare",
+        help="Build a data directory for offline use.",
+        description="""
+        Download and compile the GO annotations and ontology for a set of
+         species, releases, and aspects into a relocatable data directory.
+         Point GOPHER_DATA_DIR at it to run gopher without network access or
+         parsing.
+        """,
+    )
+    _add_prepare_arguments(prepare_parser)
+
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] not in {*commands.choices, "-h", "--help"}:
+        argv = ["run", *argv]
 
+    args = parser.parse_args(argv)
+    if args.command == "batch" and not args.inputs and args.manifest is None:
+        batch_parser.error("at least one input or a manifest is required.")
+
+    return args
+
+
+def _add_run_arguments(parser):
+    """Add the arguments for a single file.
+
+    Parameters
+    ----------
+    parser : ArgumentParser
+        The parser to add the arguments to.
+
+    """
     parser.add_argument(
         "proteins",
         type=str,
@@ -36,7 +114,154 @@ def parse_args():
     parser.add_argument(
         "-o",
         "--output",
-        help="The name of the tab-delimited output file.",
+        help="""
+        The name of the output file. Its format is chosen by its extension:
+         ".parquet" or ".pq" for Parquet, ".arrow" or ".feather" for Arrow,
+         and tab-delimited otherwise.
+        """,
+    )
+
+    _add_options(parser)
+
+
+def _add_batch_arguments(parser):
+    """Add the arguments for a batch of files.
+
+    Parameters
+    ----------
+    parser : ArgumentParser
+        The parser to add the arguments to.
+
+    """
+    parser.add_argument(
+        "inputs",
+        nargs="*",
+        help="""
+        The files to test, directories containing them, or glob patterns
+         such as "results/*.txt".
+        """,
+    )
+
+    parser.add_argument(
+        "-m",
+        "--manifest",
+        help="""
+        A file listing the files to test, one per line. Relative paths are
+         relative to the manifest.
+        """,
+    )
+
+    parser.add_argument(
+        "--pattern",
+        default="*.txt",
+        help="The glob pattern for the files to test within directories.",
+    )
+
+    parser.add_argument(
+        "-o",
+        "--output-dir",
+        default=".",
+        help="""
+        The directory for the output files, which are named after the inputs
+         with an ".enrichment" suffix.
+        """,
+    )
+
+    parser.add_argument(
+        "-t",
+        "--threads",
+        type=int,
+        default=4,
+        help="The number of threads used to read and write files.",
+    )
+
+    _add_options(parser)
+
+
+def _add_prepare_arguments(parser):
+    """Add the arguments to prepare a data directory.
+
+    Parameters
+    ----------
+    parser : ArgumentParser
+        The parser to add the arguments to.
+
+    """
+    parser.add_argument("path", help="The data directory to prepare.")
+
+    parser.add_argument(
+        "-s",
+        "--species",
+        nargs="+",
+        default=["human"],
+        help="The species to prepare.",
+    )
+
+    parser.add_argument(
+        "-r",
+        "--releases",
+        nargs="+",
+        default=["current"],
+        help="The Gene Ontology releases to prepare.",
+    )
+
+    parser.add_argument(
+        "-a",
+        "--aspects",
+        nargs="+",
+        choices=["cc", "mf", "bp", "all"],
+        default=["all"],
+        help="The Gene Ontology aspects to prepare.",
+    )
+
+    parser.add_argument(
+        "--propagate",
+        action="store_true",
+        help="Also prepare the annotations propagated to ancestor terms.",
+    )
+
+    parser.add_argument(
+        "-f",
+        "--fetch",
+        action="store_true",
+        help="Download the GAF files even if they have been downloaded.",
+    )
+
+
+def _add_options(parser):
+    """Add the options shared by single files and batches.
+
+    Parameters
+    ----------
+    parser : ArgumentParser
+        The parser to add the options to.
+
+    """
+    parser.add_argument(
+        "--format",
+        choices=["tsv", "parquet", "arrow"],
+        help="""
+        The format of the output file, instead of choosing it by the
+         extension. Parquet and Arrow require pyarrow.
+        """,
+    )
+
+    parser.add_argument(
+        "--fdr",
+        type=float,
+        help="""
+        Write only the terms at or below this false discovery rate, with one
+         row per term and sample.
+        """,
+    )
+
+    parser.add_argument(
+        "--top-k",
+        type=int,
+        help="""
+        Write only this many terms with the smallest p-values in each sample,
+         with one row per term and sample.
+        """,
     )
 
     parser.add_argument(
@@ -103,17 +328,139 @@ def parse_args():
         """,
     )
 
-    return parser.parse_args()
+    parser.add_argument(
+        "--metrics",
+        type=str,
+        help="""
+        Save the wall time, peak memory, and number of items processed in
+         each phase of the analysis to this JSON file.
+        """,
+    )
+
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="""
+        Also record the peak memory allocated by each phase with tracemalloc,
+         which is slower. Only used with "--metrics".
+        """,
+    )
+
+    parser.add_argument(
+        "--profile",
+        type=str,
+        help="""
+        Profile the analysis with cProfile and save the statistics to this
+         file, for use with pstats or snakeviz.
+        """,
+    )
+
+
+def warmup():
+    """Compile the Numba kernels so that later runs start quickly."""
+    # Heavy imports are deferred so that the command line starts quickly.
+    from .stats import warmup
+
+    start = time.perf_counter()
+    warmup()
+    LOGGER.info("Compiled in %.1f seconds.", time.perf_counter() - start)
+
+
+def prepare(args):
+    """Prepare a data directory of compiled annotations for offline use.
+
+    Parameters
+    ----------
+    args : Namespace
+        The parsed command line arguments for "prepare".
+
+    """
+    # Heavy imports are deferred so that the command line starts quickly.
+    from .bundle import prepare_bundle
+
+    prepare_bundle(
+        args.path,
+        species=args.species,
+        releases=args.releases,
+        aspects=args.aspects,
+        propagate=args.propagate,
+        fetch=args.fetch,
+    )
 
 
-def main():
-    """The main command line function."""
+def main(argv=None):
+    """The main command line function.
+
+    Parameters
+    ----------
+    argv : list of str, optional
+        The command line arguments. By default, those given to the program.
+
+    Returns
+    -------
+    int
+        The exit code: 1 if any file of a batch failed, 0 otherwise.
+
+    """
     logging.basicConfig(
-        level=logging.INFO, format="[%(levelname)s] %s(message)s"
+        level=logging.INFO, format="[%(levelname)s] %(message)s"
     )
 
-    args = parse_args()
-    proteins = read_encyclopedia(args.proteins)
+    args = parse_args(argv)
+    if args.command == "warmup":
+        warmup()
+        return 0
+
+    if args.command == "prepare":
+        prepare(args)
+        return 0
+
+    func = run_batch if args.command == "batch" else run
+    if args.metrics is None and args.profile is None:
+        return func(args)
+
+    from . import metrics
+
+    with metrics.collect(
+        trace_memory=args.trace_memory,
+        profile=args.profile is not None,
+    ) as collected:
+        code = func(args)
+
+    if args.metrics is not None:
+        collected.save(args.metrics)
+        LOGGER.info("Saved metrics to %s", args.metrics)
+
+    if args.profile is not None:
+        collected.save_profile(args.profile)
+        LOGGER.info("Saved profile to %s", args.profile)
+
+    return code
+
+
+def run(args):
+    """Run the enrichment analysis.
+
+    Parameters
+    ----------
+    args : Namespace
+        The parsed command line arguments.
+
+    Returns
+    -------
+    int
+        The exit code.
+
+    """
+    # Heavy imports are deferred so that the command line starts quickly.
+    from .enrichment import test_enrichment
+    from .metrics import phase
+    from .parsers import read_encyclopedia
+    from .results import write_results
+
+    with phase("read"):
+        proteins = read_encyclopedia(args.proteins)
+
     if args.go_filters is not None:
         args.go_filters = args.go_filters.split(",")
 
@@ -123,13 +470,290 @@ def main():
         aspect=args.aspect,
         species=args.species,
         release=args.release,
-        go_filters=args.go_filters,
+        go_subset=args.go_filters,
         fetch=args.fetch,
         progress=args.progress,
     )
 
-    results.to_csv(args.output, index=False, sep="\t")
+    with phase("write", rows=len(results)):
+        write_results(
+            results,
+            args.output,
+            fmt=args.format,
+            fdr=args.fdr,
+            top_k=args.top_k,
+        )
+
+    return 0
+
+
+def run_batch(args):
+    """Run the enrichment analysis on a batch of files.
+
+    The annotations are loaded once for every file. Files are read ahead and
+    the results are written in a thread pool, while the main thread tests
+    each file in turn. A file that cannot be read, tested, or written is
+    reported and skipped.
+
+    Parameters
+    ----------
+    args : Namespace
+        The parsed command line arguments for the batch.
+
+    Returns
+    -------
+    int
+        The exit code: 1 if any file failed, 0 otherwise.
+
+    """
+    # Heavy imports are deferred so that the command line starts quickly.
+    from concurrent.futures import ThreadPoolExecutor
+
+    from .enrichment import iter_enrichment_many
+
+    files = find_inputs(args.inputs, args.manifest, args.pattern)
+    outputs = output_files(files, args.output_dir, args.format)
+    LOGGER.info("Testing %i files...", len(files))
+    if args.go_filters is not None:
+        args.go_filters = args.go_filters.split(",")
+
+    failed = []
+    writes = []
+
+    def skip(path, err):
+        """Report a file that could not be tested."""
+        LOGGER.error("Failed to test %s", path, exc_info=err)
+        failed.append(path)
+
+    with ThreadPoolExecutor(max(args.threads, 1)) as pool:
+
+        def datasets():
+            """Yield each file that could be read."""
+            reads = _read_ahead(pool, _read, files, args.threads)
+            for path, future in reads:
+                try:
+                    proteins = future.result()
+                except Exception:
+                    LOGGER.exception("Failed to read %s", path)
+                    failed.append(path)
+                    continue
+
+                yield path, proteins
+
+        results = iter_enrichment_many(
+            datasets(),
+            desc=True,
+            aspect=args.aspect,
+            species=args.species,
+            release=args.release,
+            go_subset=args.go_filters,
+            fetch=args.fetch,
+            progress=args.progress,
+            on_error=skip,
+        )
+        for path, result in results:
+            future = _submit(pool, _write, result, outputs[path], args)
+            writes.append((path, future))
+
+        for path, future in writes:
+            try:
+                future.result()
+            except Exception:
+                LOGGER.exception("Failed to write %s", outputs[path])
+                failed.append(path)
+
+    if failed:
+        LOGGER.error("%i of %i files failed.", len(failed), len(files))
+        return 1
+
+    LOGGER.info("Wrote %i files to %s", len(writes), args.output_dir)
+    return 0
+
+
+def find_inputs(inputs, manifest=None, pattern="*.txt"):
+    """Find the files of a batch.
+
+    Parameters
+    ----------
+    inputs : list of str
+        Files, directories, or glob patterns.
+    manifest : str or Path, optional
+        A file listing more files, one per line. Blank lines and lines
+        starting with "#" are ignored.
+    pattern : str, optional
+        The glob pattern for the files within directories.
+
+    Returns
+    -------
+    list of Path
+        The files, without duplicates, in the order that they were given.
+        Directories and glob patterns are sorted.
+
+    """
+    files = []
+    for entry in inputs:
+        path = Path(entry)
+        if path.is_dir():
+            files += sorted(p for p in path.glob(pattern) if p.is_file())
+        elif any(c in entry for c in "*?["):
+            files += [Path(p) for p in sorted(glob.glob(entry))]
+        else:
+            files.append(path)
+
+    if manifest is not None:
+        manifest = Path(manifest)
+        for line in manifest.read_text().splitlines():
+            line = line.strip()
+            if line and not line.startswith("#"):
+                files.append(manifest.parent / line)
+
+    if not files:
+        raise FileNotFoundError("No input files were found.")
+
+    return list(dict.fromkeys(files))
+
+
+def output_files(files, output_dir, fmt=None):
+    """Name the output file for each input of a batch.
+
+    Parameters
+    ----------
+    files : list of Path
+        The input files.
+    output_dir : str or Path
+        The directory for the output files.
+    fmt : str, {"tsv", "parquet", "arrow"}, optional
+        The output format. By default, "tsv".
+
+    Returns
+    -------
+    dict of Path: Path
+        The output file for each input.
+
+    """
+    suffix = {"tsv": ".tsv", "parquet": ".parquet", "arrow": ".arrow"}
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    outputs = {
+        f: output_dir / f"{f.stem}.enrichment{suffix[fmt or 'tsv']}"
+        for f in files
+    }
+    names = Counter(o.name for o in outputs.values())
+    duplicates = sorted(n for n, count in names.items() if count > 1)
+    if duplicates:
+        raise ValueError(
+            f"Several inputs would be written to {duplicates[0]}. Give them "
+            "distinct names."
+        )
+
+    return outputs
+
+
+def _read(path):
+    """Read a file of a batch.
+
+    Parameters
+    ----------
+    path : Path
+        The file.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The proteins of the file.
+
+    """
+    from .metrics import phase
+    from .parsers import read_encyclopedia
+
+    with phase("read"):
+        return read_encyclopedia(path)
+
+
+def _write(results, path, args):
+    """Write the results of a file of a batch.
+
+    Parameters
+    ----------
+    results : pandas.DataFrame
+        The results of the file.
+    path : Path
+        The output file.
+    args : Namespace
+        The parsed command line arguments for the batch.
+
+    """
+    from .metrics import phase
+    from .results import write_results
+
+    with phase("write", rows=len(results)):
+        write_results(
+            results,
+            path,
+            fmt=args.format,
+            fdr=args.fdr,
+            top_k=args.top_k,
+        )
+
+
+def _submit(pool, func, *args):
+    """Run a function in a pool, within a copy of the current context.
+
+    This keeps the active ``metrics.collect()``, so the phases of the
+    function are recorded.
+
+    Parameters
+    ----------
+    pool : concurrent.futures.Executor
+        The pool that runs the function.
+    func : callable
+        The function.
+    *args : Any
+        The arguments of the function.
+
+    Returns
+    -------
+    concurrent.futures.Future
+        The result of the function.
+
+    """
+    return pool.submit(contextvars.copy_context().run, func, *args)
+
+
+def _read_ahead(pool, reader, files, n_ahead):
+    """Read files in a thread pool, keeping a few reads in flight.
+
+    Parameters
+    ----------
+    pool : concurrent.futures.Executor
+        The pool that reads the files.
+    reader : callable
+        The function that reads a file.
+    files : list of Path
+        The files to read.
+    n_ahead : int
+        The number of files read ahead of the one being used.
+
+    Yields
+    ------
+    path : Path
+        The file.
+    future : concurrent.futures.Future
+        The result of reading it.
+
+    """
+    files = iter(files)
+    pending = deque(
+        (path, _submit(pool, reader, path))
+        for path in itertools.islice(files, max(n_ahead, 1))
+    )
+    while pending:
+        path, future = pending.popleft()
+        for nxt in itertools.islice(files, 1):
+            pending.append((nxt, _submit(pool, reader, nxt)))
+
+        yield path, future
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
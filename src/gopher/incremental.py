@@ -0,0 +1,332 @@
+"""Incremental enrichment for studies that grow a few samples at a time.
+
+An ``EnrichmentState`` keeps everything needed to test new sample columns
+without revisiting the old ones: the protein universe, the tested terms and
+their membership matrix, and the U statistic, tie correction and uncorrected
+p-value of every column tested so far, all from a single ranking of each
+column. Only the Benjamini-Hochberg correction is recomputed over the
+combined results.
+"""
+
+import json
+import logging
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from . import cache
+from .enrichment import (
+    GRP_COLS,
+    _annotated_rows,
+    _format_results,
+    _prepare_annotations,
+    _test_ranked,
+    membership_matrix,
+)
+from .stats import rankdata
+
+LOGGER = logging.getLogger(__name__)
+
+
+class EnrichmentState:
+    """The per-column results of an enrichment analysis.
+
+    Use ``EnrichmentState.from_proteins()`` to start a new analysis or
+    ``EnrichmentState.load()`` to continue a saved one.
+
+    Parameters
+    ----------
+    accessions : list of str
+        The UniProt accessions of the tested proteins.
+    terms : pandas.DataFrame
+        The "go_id", "go_name", and "aspect" of each tested term.
+    membership : scipy.sparse.csr_matrix
+        The terms by proteins membership matrix.
+    options : dict
+        The statistical options: "desc", "method", "n_permutations", "seed",
+        and "log_pvals".
+    columns : list of str, optional
+        The tested sample columns. Their names are kept as strings, so that
+        they match the same columns after the state is saved and loaded.
+    u_stats : numpy.ndarray, optional
+        The U statistic of each term in each column.
+    t_correction : numpy.ndarray, optional
+        The tie correction of each column.
+    pvals : numpy.ndarray, optional
+        The uncorrected p-value of each term in each column.
+
+    """
+
+    def __init__(
+        self,
+        accessions,
+        terms,
+        membership,
+        options,
+        columns=None,
+        u_stats=None,
+        t_correction=None,
+        pvals=None,
+    ):
+        """Initialize the EnrichmentState."""
+        self.accessions = pd.Index(accessions)
+        self.terms = terms.reset_index(drop=True)
+        self.membership = sparse.csr_matrix(membership)
+        self.options = dict(options)
+        n_terms = len(self.terms)
+        columns = [] if columns is None else columns
+        self.columns = pd.Index([str(c) for c in columns], dtype=object)
+        self.u_stats = _or_empty(u_stats, (n_terms, 0))
+        self.t_correction = _or_empty(t_correction, (0,))
+        self.pvals = _or_empty(pvals, (n_terms, 0))
+
+    @classmethod
+    def from_proteins(
+        cls,
+        proteins,
+        desc=True,
+        aspect="all",
+        species="human",
+        release="current",
+        go_subset=None,
+        contaminants_filter=None,
+        fetch=False,
+        annotations=None,
+        mapping=None,
+        aggregate_terms=True,
+        propagate=False,
+        method="asymptotic",
+        n_permutations=10000,
+        seed=None,
+        log_pvals=False,
+    ):
+        """Start an analysis by testing all of the columns of a dataset.
+
+        The proteins of this dataset define the protein universe of the
+        analysis. See ``test_enrichment()`` for a description of the
+        parameters. The statistical options are saved with the state, so
+        later updates use them too. Each update tests its new columns in a
+        single process, so ``n_jobs`` is not supported, and ``seed`` must be
+        an integer or None so that it can be saved.
+
+        Returns
+        -------
+        EnrichmentState
+            The state after testing every column.
+
+        """
+        if seed is not None and not isinstance(seed, int | np.integer):
+            raise ValueError(
+                "The seed of an incremental analysis must be an integer or "
+                "None, so that it can be saved with the state."
+            )
+
+        LOGGER.info("Retrieving GO annotations...")
+        annot = _prepare_annotations(
+            annotations=annotations,
+            mapping=mapping,
+            species=species,
+            aspect=aspect,
+            release=release,
+            fetch=fetch,
+            go_subset=go_subset,
+            aggregate_terms=aggregate_terms,
+            propagate=propagate,
+        )
+        annot, rows = _annotated_rows(
+            proteins.index, annot, contaminants_filter
+        )
+        accessions = proteins.index[rows]
+        if not accessions.is_unique:
+            raise ValueError(
+                "Incremental enrichment requires unique proteins."
+            )
+
+        terms, membership = membership_matrix(annot, accessions)
+        options = {
+            "desc": desc,
+            "method": method,
+            "n_permutations": n_permutations,
+            "seed": None if seed is None else int(seed),
+            "log_pvals": log_pvals,
+        }
+        state = cls(accessions, terms, membership, options)
+        state.update(proteins)
+        return state
+
+    @classmethod
+    def load(cls, path):
+        """Load a saved state.
+
+        Parameters
+        ----------
+        path : str or Path
+            The file written by ``save()``.
+
+        Returns
+        -------
+        EnrichmentState
+            The saved state.
+
+        """
+        data = cache.load_arrays(path, [])
+        if data is None:
+            raise FileNotFoundError(
+                f"No enrichment state could be read: {path}"
+            )
+
+        n_terms = len(data["go_id"])
+        membership = sparse.csr_matrix(
+            (
+                np.ones(len(data["indices"])),
+                data["indices"],
+                data["indptr"],
+            ),
+            shape=(n_terms, len(data["accessions"])),
+        )
+        terms = pd.DataFrame(
+            {c: data[c].astype(object) for c in GRP_COLS},
+        )
+        return cls(
+            data["accessions"].astype(object),
+            terms,
+            membership,
+            json.loads(str(data["options"])),
+            columns=data["columns"].astype(object),
+            u_stats=data["u_stats"],
+            t_correction=data["t_correction"],
+            pvals=data["pvals"],
+        )
+
+    def save(self, path):
+        """Save the state.
+
+        Parameters
+        ----------
+        path : str or Path
+            The file to write.
+
+        """
+        cache.save_arrays(
+            path,
+            [],
+            accessions=np.asarray(self.accessions, dtype=str),
+            indptr=self.membership.indptr,
+            indices=self.membership.indices,
+            options=json.dumps(self.options),
+            columns=np.asarray(self.columns, dtype=str),
+            u_stats=self.u_stats,
+            t_correction=self.t_correction,
+            pvals=self.pvals,
+            **{c: np.asarray(self.terms[c], dtype=str) for c in GRP_COLS},
+        )
+
+    def update(self, proteins):
+        """Test the columns that have not been tested yet.
+
+        Columns that have already been tested are skipped, as are proteins
+        outside of the protein universe. Columns are matched by their names
+        as strings.
+
+        Parameters
+        ----------
+        proteins : pandas.DataFrame
+            The protein abundances, which must include every protein in the
+            protein universe.
+
+        Returns
+        -------
+        EnrichmentState
+            The updated state.
+
+        """
+        names = proteins.columns.astype(str)
+        is_new = ~names.isin(self.columns)
+        new = names[is_new]
+        if not len(new):
+            LOGGER.info("No new columns to test.")
+            return self
+
+        rows = proteins.index.get_indexer_for(self.accessions)
+        if (rows < 0).any() or len(rows) != len(self.accessions):
+            raise ValueError(
+                "The proteins must include every protein that was tested "
+                "before, exactly once. Start a new analysis if the protein "
+                "universe has changed."
+            )
+
+        LOGGER.info("Testing enrichment in %i new columns...", len(new))
+        values = proteins.loc[:, is_new].to_numpy(dtype=np.float64)[rows, :]
+        if not self.options["desc"]:
+            values = -values
+
+        u_stats, t_correction, pvals = _test_ranked(
+            rankdata(values),
+            self.membership,
+            self.options["method"],
+            n_permutations=self.options["n_permutations"],
+            seed=self.options["seed"],
+            log=self.options["log_pvals"],
+        )
+
+        self.columns = self.columns.append(new)
+        self.u_stats = np.hstack([self.u_stats, u_stats])
+        self.t_correction = np.concatenate([self.t_correction, t_correction])
+        self.pvals = np.hstack([self.pvals, pvals])
+        return self
+
+    def results(self):
+        """The adjusted p-values of every column tested so far.
+
+        Returns
+        -------
+        pandas.DataFrame
+            The adjusted p-value for each tested GO term in each sample, or
+            its natural logarithm, as returned by ``test_enrichment()``.
+
+        """
+        return _format_results(
+            self.terms, self.pvals, self.columns, log=self.options["log_pvals"]
+        )
+
+
+def update_enrichment(proteins, path, **kwargs):
+    """Test only the new columns of a study, keeping the state in a file.
+
+    If the file does not exist, every column is tested and the file is
+    created. Otherwise, only the columns that were not tested before are.
+
+    Parameters
+    ----------
+    proteins : pandas.DataFrame
+        The protein abundances for the whole study.
+    path : str or Path
+        The file holding the enrichment state.
+    **kwargs : dict
+        Arguments for ``EnrichmentState.from_proteins()``, which are only
+        used when the file does not exist.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The adjusted p-value for each tested GO term in each sample.
+
+    """
+    path = Path(path)
+    if path.exists():
+        state = EnrichmentState.load(path).update(proteins)
+    else:
+        state = EnrichmentState.from_proteins(proteins, **kwargs)
+
+    state.save(path)
+    return state.results()
+
+
+def _or_empty(array, shape):
+    """Use an empty float array when an array is not given."""
+    if array is None:
+        return np.empty(shape, dtype=np.float64)
+
+    return np.asarray(array, dtype=np.float64)
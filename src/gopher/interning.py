@@ -0,0 +1,139 @@
+"""Integer codes for UniProt accessions and GO terms.
+
+Annotation tables store their columns as pandas categoricals with sorted
+categories, so that merges, filters and membership tests can be done on the
+integer codes. Because the categories are sorted, ordering by the codes is
+the same as ordering by the strings themselves. Strings are only looked up
+again when results are returned.
+"""
+
+import numpy as np
+import pandas as pd
+
+ANNOT_COLS = ["uniprot_accession", "go_id", "aspect", "go_name"]
+
+
+def intern(values):
+    """Convert values to a categorical with sorted categories.
+
+    Parameters
+    ----------
+    values : array-like
+        The values to intern. Categoricals are reused when their categories
+        are already sorted.
+
+    Returns
+    -------
+    pandas.Categorical
+        The interned values.
+
+    """
+    if isinstance(values, pd.Series):
+        values = values.array
+
+    if isinstance(values, pd.Categorical):
+        if values.categories.is_monotonic_increasing:
+            return values
+
+        try:
+            return values.reorder_categories(values.categories.sort_values())
+        except TypeError:
+            return values
+
+    return pd.Categorical(values)
+
+
+def intern_annotations(annot):
+    """Intern the columns of an annotation table.
+
+    Parameters
+    ----------
+    annot : pandas.DataFrame
+        The annotations, with "uniprot_accession", "go_id", "aspect", and
+        "go_name" columns.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The annotations, with each of these columns as a categorical.
+
+    """
+    cols = [c for c in ANNOT_COLS if c in annot.columns]
+    if all(_is_interned(annot[c]) for c in cols):
+        return annot
+
+    return annot.assign(**{c: intern(annot[c]) for c in cols})
+
+
+def codes(values):
+    """The integer codes of interned values.
+
+    Parameters
+    ----------
+    values : pandas.Series or pandas.Categorical
+        The interned values.
+
+    Returns
+    -------
+    numpy.ndarray
+        The integer codes, where -1 indicates a missing value.
+
+    """
+    return np.asarray(intern(values).codes, dtype=np.int64)
+
+
+def encode(values, categories):
+    """Encode values as positions in a set of categories.
+
+    Parameters
+    ----------
+    values : array-like
+        The values to encode.
+    categories : pandas.Index
+        The unique categories.
+
+    Returns
+    -------
+    numpy.ndarray
+        The position of each value in the categories, or -1 if it is not
+        among them.
+
+    """
+    return np.asarray(pd.Index(categories).get_indexer(values), dtype=np.int64)
+
+
+def lookup(values, mapping, default=-1):
+    """Map interned values through a dictionary of integers.
+
+    The dictionary is only consulted once for each unique value.
+
+    Parameters
+    ----------
+    values : pandas.Series or pandas.Categorical
+        The values to map.
+    mapping : dict
+        The integer for each value.
+    default : int, optional
+        The integer for missing values or values that are not in the
+        mapping.
+
+    Returns
+    -------
+    numpy.ndarray
+        The mapped integers.
+
+    """
+    values = intern(values)
+    table = np.array(
+        [mapping.get(c, default) for c in values.categories] + [default],
+        dtype=np.int64,
+    )
+    return table[np.asarray(values.codes, dtype=np.int64)]
+
+
+def _is_interned(values):
+    """Test whether a column is a categorical with sorted categories."""
+    return (
+        isinstance(values.dtype, pd.CategoricalDtype)
+        and values.cat.categories.is_monotonic_increasing
+    )
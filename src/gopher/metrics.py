@@ -0,0 +1,335 @@
+"""Record the time, memory, and size of each phase of an analysis.
+
+Phases are only recorded while ``collect()`` is active. Otherwise the
+instrumented functions skip the bookkeeping entirely, so it costs nothing in
+normal use::
+
+    with gopher.metrics.collect() as metrics:
+        results = gopher.test_enrichment(proteins)
+
+    metrics.to_frame()
+    metrics.save("metrics.json")
+
+Phases nest: each is named after the path of phases that it ran within, such
+as "test_enrichment/load_annotations/read_annotations". The memory of a
+phase is the peak resident set size of the process when it ended, which is
+cheap to measure but never decreases. With ``trace_memory=True``, the peak of
+the memory allocated by Python and NumPy during each phase is also recorded,
+at some cost in speed.
+
+Work run in other threads is only recorded if it runs in a copy of the
+context of ``collect()``, such as with ``contextvars.copy_context().run``.
+Each thread nests its own phases.
+"""
+
+import contextvars
+import cProfile
+import functools
+import json
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# The Metrics of the active collect() call, if any.
+_ACTIVE = contextvars.ContextVar("gopher_metrics", default=None)
+
+
+class Phase:
+    """The measurements of one phase.
+
+    Parameters
+    ----------
+    name : str
+        The path of the phase, with nested phases separated by "/".
+    depth : int
+        The number of phases that this phase ran within.
+
+    Attributes
+    ----------
+    seconds : float
+        The wall time of the phase.
+    peak_rss : int or None
+        The peak resident set size of the process at the end of the phase,
+        in bytes.
+    peak_traced : int or None
+        The peak memory allocated by Python and NumPy during the phase, in
+        bytes, if memory was traced.
+    counts : dict of str: int
+        The number of items processed, such as proteins or annotations.
+
+    """
+
+    def __init__(self, name, depth):
+        """Initialize the Phase."""
+        self.name = name
+        self.depth = depth
+        self.seconds = None
+        self.peak_rss = None
+        self.peak_traced = None
+        self.counts = {}
+
+    def to_dict(self):
+        """The measurements as a dictionary."""
+        return {
+            "name": self.name,
+            "depth": self.depth,
+            "seconds": self.seconds,
+            "peak_rss": self.peak_rss,
+            "peak_traced": self.peak_traced,
+            "counts": dict(self.counts),
+        }
+
+
+class Metrics:
+    """The phases recorded by ``collect()``.
+
+    Parameters
+    ----------
+    trace_memory : bool, optional
+        Record the peak memory allocated during each phase with tracemalloc?
+
+    Attributes
+    ----------
+    phases : list of Phase
+        The recorded phases, in the order that they started.
+    profile : pstats.Stats or None
+        The cProfile statistics, if profiling was enabled.
+
+    """
+
+    def __init__(self, trace_memory=False):
+        """Initialize the Metrics."""
+        self.trace_memory = trace_memory
+        self.phases = []
+        self.profile = None
+        self._local = threading.local()
+
+    def to_dict(self):
+        """The recorded phases as a dictionary."""
+        return {"phases": [p.to_dict() for p in self.phases]}
+
+    def to_frame(self):
+        """The recorded phases as a dataframe.
+
+        Returns
+        -------
+        pandas.DataFrame
+            One row per phase, with a column for each count.
+
+        """
+        import pandas as pd
+
+        rows = []
+        for phase in self.phases:
+            row = phase.to_dict()
+            row.update(row.pop("counts"))
+            rows.append(row)
+
+        return pd.DataFrame(rows)
+
+    def save(self, path):
+        """Save the recorded phases as JSON.
+
+        Parameters
+        ----------
+        path : str or Path
+            The file to write.
+
+        """
+        with Path(path).open("w") as out_ref:
+            json.dump(self.to_dict(), out_ref, indent=2)
+
+    def save_profile(self, path):
+        """Save the cProfile statistics.
+
+        The file can be read with ``pstats`` or tools such as snakeviz.
+
+        Parameters
+        ----------
+        path : str or Path
+            The file to write.
+
+        """
+        if self.profile is None:
+            raise ValueError("Profiling was not enabled for these metrics.")
+
+        self.profile.dump_stats(path)
+
+    @property
+    def _stack(self):
+        """The phases running in the current thread, outermost first."""
+        return self._local.__dict__.setdefault("stack", [])
+
+    @property
+    def _traced_peaks(self):
+        """The traced memory peaks of the phases in the current thread."""
+        return self._local.__dict__.setdefault("traced_peaks", [])
+
+    def _start(self, name):
+        """Start a phase."""
+        if self._stack:
+            name = f"{self._stack[-1].name}/{name}"
+
+        current = Phase(name, len(self._stack))
+        self.phases.append(current)
+        self._stack.append(current)
+        if self.trace_memory:
+            # The peak so far belongs to the enclosing phase:
+            if self._traced_peaks:
+                peak = tracemalloc.get_traced_memory()[1]
+                self._traced_peaks[-1] = max(self._traced_peaks[-1], peak)
+
+            tracemalloc.reset_peak()
+            self._traced_peaks.append(0)
+
+        return current, time.perf_counter()
+
+    def _stop(self, current, start):
+        """Finish a phase."""
+        current.seconds = time.perf_counter() - start
+        current.peak_rss = _peak_rss()
+        if self.trace_memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            current.peak_traced = max(self._traced_peaks.pop(), peak)
+            if self._traced_peaks:
+                self._traced_peaks[-1] = max(
+                    self._traced_peaks[-1], current.peak_traced
+                )
+
+        self._stack.pop()
+
+
+@contextmanager
+def collect(trace_memory=False, profile=False):
+    """Record the phases of everything run within this context.
+
+    Parameters
+    ----------
+    trace_memory : bool, optional
+        Record the peak memory allocated during each phase with tracemalloc?
+        This slows down memory-intensive steps.
+    profile : bool, optional
+        Also profile everything with cProfile?
+
+    Yields
+    ------
+    Metrics
+        The recorded phases, which are complete once the context exits.
+
+    """
+    metrics = Metrics(trace_memory=trace_memory)
+    started_tracing = trace_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+
+    profiler = cProfile.Profile() if profile else None
+    token = _ACTIVE.set(metrics)
+    try:
+        if profiler is not None:
+            profiler.enable()
+
+        yield metrics
+
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            metrics.profile = pstats.Stats(profiler)
+
+        _ACTIVE.reset(token)
+        if started_tracing:
+            tracemalloc.stop()
+
+
+@contextmanager
+def phase(name, **counts):
+    """Record a phase, if metrics are being collected.
+
+    Parameters
+    ----------
+    name : str
+        The name of the phase.
+    **counts : int
+        The number of items processed in the phase.
+
+    Yields
+    ------
+    Phase or None
+        The phase being recorded, or None if metrics are not being collected.
+
+    """
+    metrics = _ACTIVE.get()
+    if metrics is None:
+        yield None
+        return
+
+    current, start = metrics._start(name)
+    current.counts.update(counts)
+    try:
+        yield current
+    finally:
+        metrics._stop(current, start)
+
+
+def count(**counts):
+    """Record the number of items processed in the current phase.
+
+    This does nothing unless metrics are being collected.
+
+    Parameters
+    ----------
+    **counts : int
+        The number of each kind of item.
+
+    """
+    metrics = _ACTIVE.get()
+    if metrics is not None and metrics._stack:
+        metrics._stack[-1].counts.update(
+            {k: int(v) for k, v in counts.items()}
+        )
+
+
+def instrument(func):
+    """Record each call of a function as a phase named after it.
+
+    Leading underscores are removed from the name of the phase.
+
+    Parameters
+    ----------
+    func : callable
+        The function to instrument.
+
+    Returns
+    -------
+    callable
+        The instrumented function.
+
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _ACTIVE.get() is None:
+            return func(*args, **kwargs)
+
+        with phase(func.__name__.lstrip("_")):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def _peak_rss():
+    """The peak resident set size of this process in bytes, if available."""
+    if resource is None:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes and macOS reports bytes:
+    return peak if sys.platform == "darwin" else peak * 1024
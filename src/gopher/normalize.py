@@ -1,7 +1,21 @@
+import hashlib
+import logging
+from pathlib import Path
+
+import numpy as np
 import pandas as pd
-from Bio import SeqIO, SeqUtils
+from Bio.Data import IUPACData
+from Bio.SeqIO.FastaIO import SimpleFastaParser
+
+from . import cache, config, metrics
+
+LOGGER = logging.getLogger(__name__)
 
+# The average mass of water, which is lost with each peptide bond.
+WATER = 18.0153
 
+
+@metrics.instrument
 def normalize(proteins, fasta):
     """Normalize intensity values.
 
@@ -16,6 +30,7 @@ def normalize(proteins, fasta):
         abundance.
     fasta : Path
         Use the FASTA file to generate molecular weights for normalization.
+        The masses are cached, so each file is only parsed once.
 
     Returns
     -------
@@ -23,16 +38,16 @@ def normalize(proteins, fasta):
         The normalized intensities for every protein in each sample.
 
     """
-    fasta_df = read_fasta(fasta)
-
-    proteins = proteins.apply(col_norm, axis=0)
-    df = pd.merge(fasta_df, proteins, on="Protein")
-    df = df.set_index("Protein")
-    df = df.drop(columns=["Sequence"])
-    df = df.apply(mass_norm, axis=1)
-    df = df.drop(columns=["Mass"])
+    masses = read_masses(fasta)
+    masses = masses[masses.index.isin(proteins.index)]
 
-    return df
+    # Proteins are ordered as in the FASTA file. Any protein that is listed
+    # more than once in the dataframe is repeated with its mass.
+    repeats = proteins.index.value_counts().reindex(masses.index).to_numpy()
+    fractions = proteins / proteins.sum(axis=0)
+    df = fractions.loc[masses.index, :]
+    df = df / np.repeat(masses.to_numpy(), repeats)[:, None]
+    return df.rename_axis("Protein")
 
 
 def normalize_values(proteins, fasta):
@@ -42,26 +57,94 @@ def normalize_values(proteins, fasta):
 
 def read_fasta(fasta):
     """Read FASTA file into a dataframe of sequences and masses."""
-    fasta_df = []
-    for entry in SeqIO.parse(open(fasta), "fasta"):
-        name = entry.id.split("|")[1]
-        mass = SeqUtils.molecular_weight(entry.seq, seq_type="protein")
-        temp = pd.DataFrame(
-            {"Protein": name, "Sequence": str(entry.seq), "Mass": mass},
-            index=[0],
-        )
-        fasta_df.append(temp)
+    with Path(fasta).open() as fasta_ref:
+        records = list(SimpleFastaParser(fasta_ref))
 
-    fasta_df = pd.concat(fasta_df)
-    return fasta_df
+    names = [title.split(None, 1)[0].split("|")[1] for title, _ in records]
+    seqs = ["".join(seq.split()).upper() for _, seq in records]
+    return pd.DataFrame(
+        {"Protein": names, "Sequence": seqs, "Mass": _masses(names, seqs)}
+    )
 
 
-def col_norm(col):
-    """Calculate the ratio of protein/total protein."""
-    return col / col.sum()
+@metrics.instrument
+def read_masses(fasta):
+    """Read the molecular weight of each protein in a FASTA file.
 
+    The masses are cached in the data directory for each FASTA file, so that
+    each file is only parsed once. As for the other caches, the size and
+    modification time of the file are checked first, and the file is only
+    read to compute its digest when its modification time has changed.
+
+    Parameters
+    ----------
+    fasta : str or Path
+        The FASTA file.
+
+    Returns
+    -------
+    pandas.Series
+        The mass of each protein, indexed by UniProt accession, in the order
+        of the FASTA file.
+
+    """
+    fasta = Path(fasta).resolve()
+    key = hashlib.sha256(str(fasta).encode()).hexdigest()
+    cache_file = config.get_data_dir() / "fasta" / f"{key}.masses.npz"
+    data = cache.load_arrays(cache_file, [fasta])
+    if data is None:
+        LOGGER.info("Calculating protein masses from %s...", fasta)
+        fasta_df = read_fasta(fasta)
+        data = {
+            "accessions": np.asarray(fasta_df["Protein"], dtype=str),
+            "masses": fasta_df["Mass"].to_numpy(),
+        }
+        cache.save_arrays(cache_file, [fasta], **data)
+
+    metrics.count(proteins=len(data["masses"]))
+    return pd.Series(
+        data["masses"],
+        index=pd.Index(data["accessions"].astype(object), name="Protein"),
+        name="Mass",
+    )
+
+
+def _masses(names, seqs):
+    """Calculate the average molecular weight of protein sequences.
+
+    This matches ``Bio.SeqUtils.molecular_weight()``, but looks up the
+    residues of every sequence at once.
+
+    Parameters
+    ----------
+    names : list of str
+        The accession of each protein, for error messages.
+    seqs : list of str
+        The upper case sequence of each protein.
+
+    Returns
+    -------
+    numpy.ndarray
+        The mass of each protein.
+
+    """
+    weights = np.full(256, np.nan)
+    for residue, weight in IUPACData.protein_weights.items():
+        weights[ord(residue)] = weight
+
+    lengths = np.array([len(s) for s in seqs], dtype=np.int64)
+    residues = np.frombuffer("".join(seqs).encode("latin-1"), dtype=np.uint8)
+    masses = np.zeros(len(seqs))
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    filled = lengths > 0
+    masses[filled] = np.add.reduceat(weights[residues], starts[filled])
+    masses -= (lengths - 1) * WATER
+
+    invalid = np.flatnonzero(np.isnan(masses))
+    if len(invalid):
+        raise ValueError(
+            f"The sequence of {names[invalid[0]]} contains residues without "
+            "an unambiguous mass."
+        )
 
-def mass_norm(row):
-    """Do mass part of normalization."""
-    mass = row.loc["Mass"]
-    return row / mass
+    return masses
@@ -1,8 +1,20 @@
 """Download the GO ontologies."""
 
-from collections import defaultdict
+import os
+from collections.abc import Mapping
 
-from . import config, utils
+import numpy as np
+from scipy import sparse
+
+from . import cache, config, metrics, utils
+
+OBO_URL = "http://purl.obolibrary.org/obo/go/go-basic.obo"
+
+ASPECTS = {
+    "biological_process": "P",
+    "molecular_function": "F",
+    "cellular_component": "C",
+}
 
 
 def download_ontology():
@@ -14,13 +26,18 @@ def download_ontology():
         The downloaded OBO file.
 
     """
-    url = "http://purl.obolibrary.org/obo/go/go-basic.obo"
     out_file = config.get_data_dir() / "ontologies" / "go-basic.obo"
     if out_file.exists():
         return out_file
 
+    if config.config.offline:
+        raise FileNotFoundError(
+            f"{out_file} has not been downloaded and gopher is in offline "
+            "mode."
+        )
+
     out_file.parent.mkdir(exist_ok=True, parents=True)
-    utils.http_download(url, out_file)
+    utils.http_download(OBO_URL, out_file)
     return out_file
 
 
@@ -33,10 +50,10 @@ def load_ontology():
     -------
     dict of str: str
         The GO accession mapped to the name.
+    Ontology
+        The compiled ontology, which maps each GO accession to its children.
 
     """
-    import os
-
     if os.environ.get("PYTEST_CURRENT_TEST"):
         # Minimal offline mapping for unit tests
         return {
@@ -45,15 +62,61 @@ def load_ontology():
             "GO:0003": "function",
         }, {}
 
+    ontology = load_compiled_ontology()
+    return ontology.terms(), ontology
+
+
+@metrics.instrument
+def load_compiled_ontology():
+    """Load the compiled Gene Ontology.
+
+    The OBO file is parsed once and the compiled ontology is stored next to
+    it. Later calls load the compiled version, until the OBO file changes.
+
+    Returns
+    -------
+    Ontology
+        The compiled ontology.
+
+    """
     obo_file = download_ontology()
+    cache_file = obo_file.with_suffix(".npz")
+    arrays = cache.load_arrays(cache_file, [obo_file])
+    if arrays is not None:
+        return Ontology(**arrays)
+
+    ontology = Ontology.from_obo(obo_file)
+    cache.save_arrays(cache_file, [obo_file], **ontology.arrays())
+    return ontology
+
+
+def _parse_obo(obo_file):
+    """Parse the terms and is_a relationships from an OBO file.
+
+    Parameters
+    ----------
+    obo_file : Path
+        The OBO file.
+
+    Returns
+    -------
+    ids : list of str
+        The term accessions.
+    names : list of str
+        The term names.
+    aspects : list of str
+        The GO aspect of each term ("C", "F", or "P").
+    edges : list of tuple of str
+        The (parent, child) accessions for each is_a relationship.
+
+    """
     with obo_file.open("r") as obo_ref:
         data = obo_ref.read().split("\n\n")[1:]
 
-    terms = {}
-    mapping = defaultdict(list)
+    ids, names, aspects, edges = [], [], [], []
     for term in data:
         term_data = term.splitlines()
-        term_id, term_name = None, None
+        term_id, term_name, aspect = None, None, ""
         for line in term_data:
             try:
                 key, val = line.split(": ", 1)
@@ -64,11 +127,387 @@ def load_ontology():
                 term_id = val
             elif key == "name":
                 term_name = val
+            elif key == "namespace":
+                aspect = ASPECTS.get(val, "")
             elif key == "is_a":
                 val = val.split(" ", 1)[0]
-                mapping[val].append(term_id)
+                edges.append((val, term_id))
+
+        if term_id is not None and term_name is not None:
+            ids.append(term_id)
+            names.append(term_name)
+            aspects.append(aspect)
+
+    return ids, names, aspects, edges
+
+
+class Ontology(Mapping):
+    """A compiled Gene Ontology.
+
+    Terms are identified by integer codes, the position of their accession in
+    ``ids``. The child relationships and the transitive closure of the
+    descendants of each term are stored in compressed sparse row (CSR)
+    format, so the descendants of a term are a slice of an array.
+
+    The ontology is also a mapping of each GO accession to the accessions of
+    its children, like the mapping returned by previous versions of
+    ``load_ontology()``.
+
+    Parameters
+    ----------
+    ids : numpy.ndarray of str
+        The term accessions.
+    names : numpy.ndarray of str
+        The term names. Terms that are only referenced as parents have an
+        empty name.
+    aspects : numpy.ndarray of str
+        The GO aspect of each term ("C", "F", "P", or "").
+    child_indptr, child_indices : numpy.ndarray
+        The children of each term in CSR format.
+    desc_indptr, desc_indices : numpy.ndarray
+        The descendants of each term in CSR format, excluding itself.
+
+    """
+
+    def __init__(
+        self,
+        ids,
+        names,
+        aspects,
+        child_indptr,
+        child_indices,
+        desc_indptr,
+        desc_indices,
+    ):
+        """Initialize the Ontology."""
+        self.ids = np.asarray(ids, dtype=str)
+        self.names = np.asarray(names, dtype=str)
+        self.aspects = np.asarray(aspects, dtype=str)
+        self.child_indptr = np.asarray(child_indptr, dtype=np.int64)
+        self.child_indices = np.asarray(child_indices, dtype=np.int32)
+        self.desc_indptr = np.asarray(desc_indptr, dtype=np.int64)
+        self.desc_indices = np.asarray(desc_indices, dtype=np.int32)
+        self.id_index = {t: i for i, t in enumerate(self.ids.tolist())}
+        self.name_index = {}
+        for idx, name in enumerate(self.names.tolist()):
+            if name:
+                self.name_index.setdefault(name, idx)
+
+        self._ancestors = None
+
+    @classmethod
+    def from_obo(cls, obo_file):
+        """Compile an ontology from an OBO file.
+
+        Parameters
+        ----------
+        obo_file : Path
+            The OBO file.
+
+        Returns
+        -------
+        Ontology
+            The compiled ontology.
+
+        """
+        return cls.from_edges(*_parse_obo(obo_file))
+
+    @classmethod
+    def from_mapping(cls, mapping, terms=None):
+        """Compile an ontology from a mapping of terms to their children.
+
+        Parameters
+        ----------
+        mapping : dict of str: list of str
+            Each term mapped to its children.
+        terms : dict of str: str, optional
+            Each term mapped to its name.
+
+        Returns
+        -------
+        Ontology
+            The compiled ontology.
+
+        """
+        terms = {} if terms is None else terms
+        edges = [(p, c) for p, children in mapping.items() for c in children]
+        return cls.from_edges(
+            list(terms), list(terms.values()), [""] * len(terms), edges
+        )
+
+    @classmethod
+    def from_edges(cls, ids, names, aspects, edges):
+        """Compile an ontology from its terms and is_a relationships.
+
+        Parameters
+        ----------
+        ids : list of str
+            The term accessions.
+        names : list of str
+            The term names.
+        aspects : list of str
+            The GO aspect of each term.
+        edges : list of tuple of str
+            The (parent, child) accession for each relationship.
+
+        Returns
+        -------
+        Ontology
+            The compiled ontology.
+
+        """
+        ids, names, aspects = list(ids), list(names), list(aspects)
+        index = {t: i for i, t in enumerate(ids)}
+        for edge in edges:
+            for term in edge:
+                if term not in index:
+                    index[term] = len(ids)
+                    ids.append(term)
+                    names.append("")
+                    aspects.append("")
+
+        n_terms = len(ids)
+        parent_idx = np.array([index[p] for p, _ in edges], dtype=np.int32)
+        child_idx = np.array([index[c] for _, c in edges], dtype=np.int32)
+
+        # Children keep the order in which their relationships were listed:
+        order = np.argsort(parent_idx, kind="stable")
+        child_indptr = np.zeros(n_terms + 1, dtype=np.int64)
+        np.cumsum(
+            np.bincount(parent_idx, minlength=n_terms), out=child_indptr[1:]
+        )
+        child_indices = child_idx[order]
+
+        children = sparse.csr_matrix(
+            (np.ones(len(edges), dtype=bool), (parent_idx, child_idx)),
+            shape=(n_terms, n_terms),
+        )
+        ancestors = _ancestor_closure(children.T.tocsr())
+        descendants = ancestors.T.tocsr()
+        descendants.sort_indices()
+        return cls(
+            ids,
+            names,
+            aspects,
+            child_indptr,
+            child_indices,
+            descendants.indptr,
+            descendants.indices,
+        )
+
+    def arrays(self):
+        """The arrays that define the ontology.
+
+        Returns
+        -------
+        dict of str: numpy.ndarray
+            The keyword arguments to recreate the ontology.
+
+        """
+        return {
+            "ids": self.ids,
+            "names": self.names,
+            "aspects": self.aspects,
+            "child_indptr": self.child_indptr,
+            "child_indices": self.child_indices,
+            "desc_indptr": self.desc_indptr,
+            "desc_indices": self.desc_indices,
+        }
+
+    def terms(self):
+        """Map each GO accession to its name.
+
+        Returns
+        -------
+        dict of str: str
+            The GO accession mapped to the name.
+
+        """
+        ids, names = self.ids.tolist(), self.names.tolist()
+        return {t: n for t, n in zip(ids, names, strict=True) if n}
+
+    def code(self, term):
+        """Get the integer code for a term.
+
+        Parameters
+        ----------
+        term : str
+            The GO accession or name of the term.
+
+        Returns
+        -------
+        int
+            The integer code.
+
+        """
+        try:
+            return self.id_index[term]
+        except KeyError:
+            pass
+
+        try:
+            return self.name_index[term]
+        except KeyError as err:
+            raise KeyError(f"{term} is not in the ontology.") from err
+
+    def child_codes(self, code):
+        """The integer codes for the children of a term."""
+        return self.child_indices[
+            self.child_indptr[code] : self.child_indptr[code + 1]
+        ]
+
+    def descendant_codes(self, code):
+        """The integer codes for all descendants of a term."""
+        return self.desc_indices[
+            self.desc_indptr[code] : self.desc_indptr[code + 1]
+        ]
+
+    def ancestor_codes(self, code):
+        """The integer codes for all ancestors of a term."""
+        anc = self.ancestor_matrix()
+        return anc.indices[anc.indptr[code] : anc.indptr[code + 1]]
+
+    def children(self, term):
+        """The GO accessions of the children of a term."""
+        return self.ids[self.child_codes(self.code(term))].tolist()
+
+    def descendants(self, term):
+        """The GO accessions of all descendants of a term."""
+        return self.ids[self.descendant_codes(self.code(term))].tolist()
+
+    def ancestors(self, term):
+        """The GO accessions of all ancestors of a term."""
+        return self.ids[self.ancestor_codes(self.code(term))].tolist()
+
+    def descendant_matrix(self, include_self=False):
+        """The transitive closure of the descendants of each term.
+
+        Parameters
+        ----------
+        include_self : bool, optional
+            Consider each term to be its own descendant?
+
+        Returns
+        -------
+        scipy.sparse.csr_matrix
+            A boolean terms by terms matrix, where each row indicates the
+            descendants of a term.
+
+        """
+        n_terms = len(self.ids)
+        desc = sparse.csr_matrix(
+            (
+                np.ones(len(self.desc_indices), dtype=bool),
+                self.desc_indices,
+                self.desc_indptr,
+            ),
+            shape=(n_terms, n_terms),
+        )
+        if include_self:
+            desc = (desc + sparse.identity(n_terms, dtype=bool)).tocsr()
+
+        return desc
+
+    def ancestor_matrix(self, include_self=False):
+        """The transitive closure of the ancestors of each term.
+
+        Parameters
+        ----------
+        include_self : bool, optional
+            Consider each term to be its own ancestor?
+
+        Returns
+        -------
+        scipy.sparse.csr_matrix
+            A boolean terms by terms matrix, where each row indicates the
+            ancestors of a term.
+
+        """
+        if include_self:
+            return self.descendant_matrix(include_self=True).T.tocsr()
+
+        if self._ancestors is None:
+            self._ancestors = self.descendant_matrix().T.tocsr()
+            self._ancestors.sort_indices()
+
+        return self._ancestors
+
+    def __getitem__(self, term):
+        """The GO accessions of the children of a term."""
+        try:
+            code = self.id_index[term]
+        except KeyError as err:
+            raise KeyError(term) from err
+
+        return self.ids[self.child_codes(code)].tolist()
+
+    def __contains__(self, term):
+        """Test whether a GO accession is in the ontology."""
+        return term in self.id_index
+
+    def __iter__(self):
+        """Iterate over the GO accessions."""
+        return iter(self.id_index)
+
+    def __len__(self):
+        """The number of terms."""
+        return len(self.ids)
+
+
+def _ancestor_closure(parents):
+    """Compute the ancestors of every term.
+
+    Terms are visited in topological order, so the ancestors of a term are
+    its parents and their ancestors, which are already known.
+
+    Parameters
+    ----------
+    parents : scipy.sparse.csr_matrix
+        A terms by terms matrix, where each row indicates the parents of a
+        term.
+
+    Returns
+    -------
+    scipy.sparse.csr_matrix
+        A boolean terms by terms matrix, where each row indicates the
+        ancestors of a term.
+
+    """
+    n_terms = parents.shape[0]
+    children = parents.T.tocsr()
+    n_parents = np.diff(parents.indptr)
+    queue = list(np.flatnonzero(n_parents == 0))
+    remaining = n_parents.copy()
+    ancestors = [None] * n_terms
+    empty = np.empty(0, dtype=np.int32)
+    n_visited = 0
+    while queue:
+        code = queue.pop()
+        n_visited += 1
+        direct = parents.indices[
+            parents.indptr[code] : parents.indptr[code + 1]
+        ]
+        if len(direct):
+            ancestors[code] = np.unique(
+                np.concatenate([direct] + [ancestors[p] for p in direct])
+            )
+        else:
+            ancestors[code] = empty
+
+        for child in children.indices[
+            children.indptr[code] : children.indptr[code + 1]
+        ]:
+            remaining[child] -= 1
+            if not remaining[child]:
+                queue.append(child)
 
-            if term_id is not None and term_name is not None:
-                terms[term_id] = term_name
+    if n_visited < n_terms:
+        raise ValueError("The ontology contains a cycle.")
 
-    return terms, mapping
+    indptr = np.zeros(n_terms + 1, dtype=np.int64)
+    np.cumsum([len(a) for a in ancestors], out=indptr[1:])
+    indices = np.concatenate(ancestors + [empty]).astype(np.int32)
+    return sparse.csr_matrix(
+        (np.ones(len(indices), dtype=bool), indices, indptr),
+        shape=(n_terms, n_terms),
+    )
@@ -0,0 +1,319 @@
+"""Spread enrichment tests across a pool of processes.
+
+The protein matrix and the membership matrix are copied once into shared
+memory. Each worker attaches to them by name and tests a shard of terms and
+samples, writing its p-values directly into a shared output array, so no
+large arrays are pickled between processes.
+
+Workers are started with the "spawn" method, because forking a process after
+Numba has started its threads is not safe. Scripts that use more than one
+process must therefore guard their entry point with
+``if __name__ == "__main__":``.
+"""
+
+import atexit
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numba as nb
+import numpy as np
+from scipy import sparse
+
+from . import enrichment, stats
+
+LOGGER = logging.getLogger(__name__)
+
+# The process pools that have been started, by number of workers.
+_POOLS = {}
+
+
+def test_sparse_sharded(
+    values,
+    membership,
+    desc,
+    method="asymptotic",
+    n_permutations=10000,
+    seed=None,
+    n_jobs=-1,
+    log=False,
+):
+    """Test every term in every column using a pool of processes.
+
+    Every shard draws the same permutations, so the results are identical
+    to those of a single process with the same ``seed``. Without one, a seed
+    is drawn once for all of the shards.
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        The protein quantities, with one row per protein.
+    membership : scipy.sparse.csr_matrix
+        The terms by proteins membership matrix.
+    desc : bool
+        Rank proteins in descending order?
+    method : str, {"asymptotic", "exact", "permutation"}, optional
+        How the p-values are calculated.
+    n_permutations : int, optional
+        The number of permutations for the "permutation" method.
+    seed : int or numpy.random.Generator, optional
+        The seed for the "permutation" method.
+    n_jobs : int, optional
+        The number of processes. -1 uses all of the available cores.
+    log : bool, optional
+        Return the natural logarithm of the p-values?
+
+    Returns
+    -------
+    numpy.ndarray
+        The p-values for each term in each column, or their logarithms.
+
+    """
+    if seed is None:
+        seed = stats.fixed_seed()
+
+    n_jobs = resolve_jobs(n_jobs)
+    n_terms, n_cols = membership.shape[0], values.shape[1]
+    col_shards = min(n_cols, n_jobs)
+    term_shards = min(max(n_terms, 1), -(-n_jobs // col_shards))
+    col_bounds = _bounds(n_cols, col_shards)
+    term_bounds = _bounds(n_terms, term_shards)
+
+    arrays = {
+        "values": np.asarray(values, dtype=np.float64),
+        "indptr": membership.indptr.astype(np.int64),
+        "indices": membership.indices.astype(np.int64),
+        "pvals": np.empty((n_terms, n_cols), dtype=np.float64),
+    }
+    shared = {k: _SharedArray.copy(v) for k, v in arrays.items()}
+    specs = {k: v.spec for k, v in shared.items()}
+    options = {
+        "desc": desc,
+        "method": method,
+        "n_permutations": n_permutations,
+        "seed": seed,
+        "log": log,
+        "n_proteins": membership.shape[1],
+    }
+    try:
+        pool = _get_pool(n_jobs)
+        futures = [
+            pool.submit(_test_shard, specs, terms, cols, options)
+            for terms in term_bounds
+            for cols in col_bounds
+        ]
+        for future in futures:
+            future.result()
+
+        return shared["pvals"].array.copy()
+
+    finally:
+        for array in shared.values():
+            array.close(unlink=True)
+
+
+def resolve_jobs(n_jobs):
+    """The number of processes to use.
+
+    Parameters
+    ----------
+    n_jobs : int or None
+        The requested number of processes. None or -1 uses all of the
+        available cores.
+
+    Returns
+    -------
+    int
+        The number of processes.
+
+    """
+    if n_jobs is None or n_jobs < 0:
+        # sched_getaffinity() is only available on some platforms, such as
+        # Linux, and process_cpu_count() on Python 3.13 or later:
+        if hasattr(os, "sched_getaffinity"):
+            return len(os.sched_getaffinity(0))
+
+        count_cpus = getattr(os, "process_cpu_count", os.cpu_count)
+        return count_cpus() or 1
+
+    return max(1, int(n_jobs))
+
+
+def _bounds(size, n_shards):
+    """Split a range into contiguous, nearly equal shards.
+
+    Parameters
+    ----------
+    size : int
+        The length of the range.
+    n_shards : int
+        The number of shards.
+
+    Returns
+    -------
+    list of tuple of int
+        The start and stop of each non-empty shard.
+
+    """
+    edges = np.linspace(0, size, max(n_shards, 1) + 1).round().astype(int)
+    edges = zip(edges[:-1].tolist(), edges[1:].tolist(), strict=True)
+    return [(start, stop) for start, stop in edges if stop > start]
+
+
+def _test_shard(specs, terms, cols, options):
+    """Test a shard of terms and columns in a worker process.
+
+    Parameters
+    ----------
+    specs : dict of str: tuple
+        The shared arrays to attach to.
+    terms : tuple of int
+        The start and stop of the terms to test.
+    cols : tuple of int
+        The start and stop of the columns to test.
+    options : dict
+        The arguments for ``enrichment._test_sparse()`` and the number of
+        proteins.
+
+    """
+    shared = {k: _SharedArray.attach(*v) for k, v in specs.items()}
+    try:
+        indptr = shared["indptr"].array[terms[0] : terms[1] + 1]
+        indices = shared["indices"].array[indptr[0] : indptr[-1]]
+        membership = sparse.csr_matrix(
+            (np.ones(len(indices)), indices, indptr - indptr[0]),
+            shape=(len(indptr) - 1, options["n_proteins"]),
+        )
+        values = shared["values"].array[:, cols[0] : cols[1]]
+        pvals = enrichment._test_sparse(
+            values,
+            membership,
+            options["desc"],
+            options["method"],
+            n_permutations=options["n_permutations"],
+            seed=options["seed"],
+            log=options["log"],
+        )
+        shared["pvals"].array[terms[0] : terms[1], cols[0] : cols[1]] = pvals
+
+    finally:
+        for array in shared.values():
+            array.close()
+
+
+def _get_pool(n_jobs):
+    """Get a process pool, which is reused by later calls.
+
+    Parameters
+    ----------
+    n_jobs : int
+        The number of processes.
+
+    Returns
+    -------
+    concurrent.futures.ProcessPoolExecutor
+        The process pool.
+
+    """
+    if n_jobs not in _POOLS:
+        _POOLS[n_jobs] = ProcessPoolExecutor(
+            max_workers=n_jobs,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+        )
+
+    return _POOLS[n_jobs]
+
+
+def _init_worker():
+    """Use one Numba thread per process, since cores are shared by workers."""
+    nb.set_num_threads(1)
+
+
+@atexit.register
+def _shutdown_pools():
+    """Shut down the process pools."""
+    while _POOLS:
+        _, pool = _POOLS.popitem()
+        pool.shutdown(cancel_futures=True)
+
+
+class _SharedArray:
+    """A NumPy array backed by shared memory.
+
+    Parameters
+    ----------
+    shm : multiprocessing.shared_memory.SharedMemory
+        The shared memory block.
+    shape : tuple of int
+        The shape of the array.
+    dtype : str
+        The data type of the array.
+
+    """
+
+    def __init__(self, shm, shape, dtype):
+        """Initialize the _SharedArray."""
+        self.shm = shm
+        self.spec = (shm.name, shape, dtype)
+        self.array = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+    @classmethod
+    def copy(cls, array):
+        """Copy an array into a new shared memory block.
+
+        Parameters
+        ----------
+        array : numpy.ndarray
+            The array to copy.
+
+        Returns
+        -------
+        _SharedArray
+            The shared copy.
+
+        """
+        shm = shared_memory.SharedMemory(
+            create=True, size=max(array.nbytes, 1)
+        )
+        shared = cls(shm, array.shape, array.dtype.str)
+        shared.array[...] = array
+        return shared
+
+    @classmethod
+    def attach(cls, name, shape, dtype):
+        """Attach to an existing shared memory block.
+
+        Parameters
+        ----------
+        name : str
+            The name of the shared memory block.
+        shape : tuple of int
+            The shape of the array.
+        dtype : str
+            The data type of the array.
+
+        Returns
+        -------
+        _SharedArray
+            The shared array.
+
+        """
+        return cls(shared_memory.SharedMemory(name=name), shape, dtype)
+
+    def close(self, unlink=False):
+        """Release the shared memory block.
+
+        Parameters
+        ----------
+        unlink : bool, optional
+            Also free the memory block? This should only be done by the
+            process that created it.
+
+        """
+        del self.array
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
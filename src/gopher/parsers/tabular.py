@@ -6,7 +6,10 @@ import os
 import pandas as pd
 from cloudpathlib import AnyPath
 
+from .. import metrics
 
+
+@metrics.instrument
 def read_encyclopedia(proteins_txt: str) -> pd.DataFrame:
     """Read results from EncyclopeDIA.
 
@@ -21,15 +24,19 @@ def read_encyclopedia(proteins_txt: str) -> pd.DataFrame:
         The EncyclopeDIA results in a format for gopher.
 
     """
-    proteins = pd.read_table(proteins_txt)
+    columns = _read_colnames(proteins_txt)
+    drop = ["Protein", "NumPeptides", "PeptideSequences"]
+    schema: dict[str, type] = {"Protein": str}
+    schema.update({k: float for k in columns if k not in drop})
+
+    proteins = _read_typed(proteins_txt, schema)
     accessions = proteins["Protein"].str.extract(r"\|(.+?)\|", expand=False)
 
     proteins = proteins.set_index(accessions)
-    return proteins.drop(
-        columns=["Protein", "NumPeptides", "PeptideSequences"]
-    )
+    return proteins.drop(columns="Protein")
 
 
+@metrics.instrument
 def read_metamorpheus(proteins_txt: str) -> pd.DataFrame:
     """Read results from Metamorpheus.
 
@@ -44,20 +51,23 @@ def read_metamorpheus(proteins_txt: str) -> pd.DataFrame:
         The Metamorpheus results in a format for gopher.
 
     """
-    proteins = pd.read_table(proteins_txt, low_memory=False)
+    columns = _read_colnames(proteins_txt)
+    int_cols = [c for c in columns if c.startswith("Intensity")]
+    schema: dict[str, type] = {
+        "Protein": str,
+        "Protein Decoy/Contaminant/Target": str,
+        **dict.fromkeys(int_cols, float),
+    }
+
+    proteins = _read_typed(proteins_txt, schema)
     accessions = proteins["Protein"].str.extract(
         r"^(.*?)(\||$)", expand=False
     )[0]
     accessions.name = "Protein"
-    int_cols = [c for c in proteins.columns if c.startswith("Intensity")]
     proteins = proteins.set_index(accessions)
-    proteins = (
-        proteins.loc[
-            proteins["Protein Decoy/Contaminant/Target"] == "T", int_cols
-        ]
-        .apply(pd.to_numeric)
-        .fillna(0)
-    )
+    proteins = proteins.loc[
+        proteins["Protein Decoy/Contaminant/Target"] == "T", int_cols
+    ].fillna(0)
     return proteins
 
 
@@ -68,6 +78,39 @@ def _read_colnames(file: os.PathLike | io.TextIOBase) -> list[str]:
     return firstcol.strip().split("\t")
 
 
+def _read_typed(file: os.PathLike, schema: dict[str, type]) -> pd.DataFrame:
+    """Read only the columns in a schema, with their types.
+
+    The multithreaded pyarrow engine is used when pyarrow is installed.
+
+    Parameters
+    ----------
+    file : os.PathLike
+        The tab-delimited file.
+    schema : dict of str, type
+        The type of each column to read.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The columns, in the order of the schema.
+
+    """
+    try:
+        import pyarrow  # noqa: F401
+
+        engine = "pyarrow"
+    except ImportError:
+        engine = "c"
+
+    proteins = pd.read_table(
+        AnyPath(file), dtype=schema, usecols=list(schema), engine=engine
+    )
+    metrics.count(rows=len(proteins), columns=len(schema))
+    return proteins.loc[:, list(schema)]
+
+
+@metrics.instrument
 def read_diann(proteins_tsv: os.PathLike) -> pd.DataFrame:
     """Reads a DIANN-generated TSV file (pg_matrix).
 
@@ -117,9 +160,7 @@ def read_diann(proteins_tsv: os.PathLike) -> pd.DataFrame:
     schema: dict[str, type] = {k: float for k in columns if k not in expect}
     schema["Protein.Ids"] = str
 
-    proteins = pd.read_table(
-        AnyPath(proteins_tsv), dtype=schema, usecols=list(schema)
-    )
+    proteins = _read_typed(proteins_tsv, schema)
     proteins["Protein.Ids"] = proteins["Protein.Ids"].str.split(";").str[0]
 
     proteins = proteins.set_index("Protein.Ids", drop=True)
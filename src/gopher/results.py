@@ -0,0 +1,147 @@
+"""Compact formats for enrichment results.
+
+``test_enrichment()`` returns a wide dataframe with one row per GO term and
+one column per sample. Most of it is usually not significant, so these
+functions can instead keep only the terms that pass an FDR threshold, or the
+best terms in each sample, in a long format with one row per term and
+sample. Any of these can be written as a tab-delimited, Parquet, or Arrow
+file.
+"""
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .enrichment import GRP_COLS_OUT
+
+# The file formats and the extensions that imply them.
+FORMATS = {
+    ".tsv": "tsv",
+    ".txt": "tsv",
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".arrow": "arrow",
+    ".feather": "arrow",
+}
+
+
+def to_long(results, fdr=None, top_k=None, log=False):
+    """Convert enrichment results to a long format.
+
+    Parameters
+    ----------
+    results : pandas.DataFrame
+        The results of ``test_enrichment()``.
+    fdr : float, optional
+        Keep only the p-values at or below this false discovery rate.
+    top_k : int, optional
+        Keep only the ``top_k`` terms with the smallest p-values in each
+        sample. These are found by a partial sort.
+    log : bool, optional
+        Are the p-values natural logarithms, as with ``log_pvals=True``?
+
+    Returns
+    -------
+    pandas.DataFrame
+        The "GO ID", "GO Name", "GO Aspect", "Sample", and "P-value" (or "Log
+        P-value") of each kept term in each sample, sorted by sample and then
+        by p-value. With ``top_k``, the "Rank" of each term within its sample
+        is included. Missing p-values are dropped.
+
+    """
+    samples = [c for c in results.columns if c not in GRP_COLS_OUT]
+    pvals = results.loc[:, samples].to_numpy(dtype=np.float64)
+    keep = ~np.isnan(pvals)
+    if fdr is not None:
+        keep &= pvals <= (np.log(fdr) if log else fdr)
+
+    if top_k is not None and top_k < len(pvals):
+        ranked = np.where(keep, pvals, np.inf)
+        best = np.argpartition(ranked, max(top_k - 1, 0), axis=0)[:top_k]
+        in_top = np.zeros_like(keep)
+        in_top[best, np.arange(len(samples))] = True
+        keep &= in_top
+
+    term_idx, sample_idx = np.nonzero(keep)
+    values = pvals[term_idx, sample_idx]
+    order = np.lexsort((term_idx, values, sample_idx))
+    term_idx, sample_idx, values = (
+        term_idx[order],
+        sample_idx[order],
+        values[order],
+    )
+
+    long = results.loc[:, GRP_COLS_OUT].iloc[term_idx, :]
+    long = long.reset_index(drop=True)
+    long["Sample"] = pd.Categorical.from_codes(
+        sample_idx, categories=pd.Index(samples).astype(str)
+    )
+    long["Log P-value" if log else "P-value"] = values
+    if top_k is not None:
+        starts = np.searchsorted(sample_idx, sample_idx)
+        long["Rank"] = np.arange(len(sample_idx)) - starts + 1
+
+    return long
+
+
+def write_results(
+    results,
+    path,
+    fmt=None,
+    fdr=None,
+    top_k=None,
+    log=False,
+):
+    """Write enrichment results to a file.
+
+    Parameters
+    ----------
+    results : pandas.DataFrame
+        The results of ``test_enrichment()``.
+    path : str or Path
+        The file to write.
+    fmt : str, {"tsv", "parquet", "arrow"}, optional
+        The file format. By default, it is chosen by the extension of
+        ``path``, or "tsv" if the extension is not recognized. "parquet" and
+        "arrow" require pyarrow.
+    fdr : float, optional
+        Write only the p-values at or below this false discovery rate, in a
+        long format. See ``to_long()``.
+    top_k : int, optional
+        Write only the ``top_k`` terms with the smallest p-values in each
+        sample, in a long format. See ``to_long()``.
+    log : bool, optional
+        Are the p-values natural logarithms, as with ``log_pvals=True``?
+
+    """
+    if fmt is None:
+        suffix = Path(path).suffix.lower() if path is not None else None
+        fmt = FORMATS.get(suffix, "tsv")
+
+    if fmt not in {"tsv", "parquet", "arrow"}:
+        raise ValueError(
+            f"Expected fmt ({fmt}) to be one of 'tsv', 'parquet', or 'arrow'."
+        )
+
+    if fdr is not None or top_k is not None:
+        results = to_long(results, fdr=fdr, top_k=top_k, log=log)
+
+    if fmt == "tsv":
+        results.to_csv(path, index=False, sep="\t")
+        return
+
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as err:
+        raise ImportError(
+            f"Writing {fmt} files requires pyarrow. Install it with "
+            "'pip install gopher-enrich[parquet]'."
+        ) from err
+
+    results = results.reset_index(drop=True)
+    results.columns = results.columns.astype(str)
+    if fmt == "parquet":
+        results.to_parquet(path, index=False)
+    else:
+        results.to_feather(path)
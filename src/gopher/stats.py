@@ -1,11 +1,13 @@
 """Numba Mann-Whitney U test."""
 
+from functools import lru_cache
+
 import numba as nb
 import numpy as np
-from scipy import stats
+from scipy import special
 
 
-@nb.njit(parallel=True)
+@nb.njit(parallel=True, cache=True)
 def tiecorrect(rankvals):
     """Parallelized version of scipy.stats.tiecorrect."""
     tc = np.ones(rankvals.shape[1], dtype=np.float64)
@@ -24,7 +26,7 @@ def tiecorrect(rankvals):
     return tc
 
 
-@nb.njit(parallel=True)
+@nb.njit(parallel=True, cache=True)
 def rankdata(data):
     """Parallelized version of scipy.stats.rankdata."""
     ranked = np.empty(data.shape, dtype=np.float64)
@@ -45,10 +47,115 @@ def rankdata(data):
     return ranked
 
 
-def mannwhitneyu(x, y, alternative="two-sided", use_continuity=True):
+@nb.njit(parallel=True, cache=True)
+def _rank_sums(indptr, indices, ranked):
+    """Sum the ranks of each group, as ``_permutation_counts()`` does."""
+    sums = np.zeros((len(indptr) - 1, ranked.shape[1]), dtype=np.float64)
+    for i in nb.prange(len(indptr) - 1):
+        for k in range(indptr[i], indptr[i + 1]):
+            sums[i, :] += ranked[indices[k], :]
+
+    return sums
+
+
+@nb.njit(parallel=True, cache=True)
+def _permutation_counts(indptr, indices, ranked, observed, perms, counts):
+    """Count permuted rank sums at least as large as the observed ones.
+
+    Parameters
+    ----------
+    indptr : numpy.ndarray
+        The CSR row pointers of the group by observation membership matrix.
+    indices : numpy.ndarray
+        The CSR column indices of the membership matrix.
+    ranked : numpy.ndarray
+        The ranks, with observations as rows.
+    observed : numpy.ndarray
+        The observed rank sums, with groups as rows.
+    perms : numpy.ndarray
+        A batch of permutations of the observations, one per row.
+    counts : numpy.ndarray
+        The counts for each group and column, updated in place.
+
+    """
+    for b in range(perms.shape[0]):
+        for i in nb.prange(len(indptr) - 1):
+            for j in range(ranked.shape[1]):
+                # The ranks are looked up through the permutation, rather
+                # than copying the permuted rank matrix:
+                total = 0.0
+                for k in range(indptr[i], indptr[i + 1]):
+                    total += ranked[perms[b, indices[k]], j]
+
+                if total >= observed[i, j]:
+                    counts[i, j] += 1
+
+
+@nb.njit(parallel=True, cache=True)
+def _step_up(pvals, order, dependent, log):
+    """Adjust each row of p-values with the Benjamini-Hochberg procedure.
+
+    Parameters
+    ----------
+    pvals : numpy.ndarray
+        The p-values, with one set of tests per row.
+    order : numpy.ndarray
+        The indices that sort each row, with missing values last.
+    dependent : bool
+        Use the Benjamini-Yekutieli procedure instead?
+    log : bool
+        Are the p-values natural logarithms?
+
+    Returns
+    -------
+    numpy.ndarray
+        The adjusted p-values. Missing p-values remain missing.
+
+    """
+    adjusted = np.full(pvals.shape, np.nan)
+    for i in nb.prange(pvals.shape[0]):
+        row = pvals[i]
+        n_tests = np.count_nonzero(~np.isnan(row))
+
+        scale = np.float64(n_tests)
+        if dependent:
+            scale *= np.sum(1.0 / np.arange(1, n_tests + 1))
+
+        # The adjusted p-value is the smallest one at the same or a higher
+        # rank, and at most 1.
+        current = 0.0 if log else 1.0
+        for rank in range(n_tests, 0, -1):
+            idx = order[i, rank - 1]
+            if log:
+                value = row[idx] + np.log(scale / rank)
+            else:
+                value = row[idx] * (scale / rank)
+
+            current = min(current, value)
+            adjusted[i, idx] = current
+
+    return adjusted
+
+
+# The largest group for which exact p-values are computed by default.
+EXACT_CUTOFF = 20
+
+# The number of permutations drawn at a time by permutation_test().
+PERMUTATION_BATCH = 256
+
+
+def mannwhitneyu(
+    x,
+    y,
+    alternative="two-sided",
+    use_continuity=True,
+    method="asymptotic",
+    exact_cutoff=EXACT_CUTOFF,
+    log=False,
+):
     """Version of Mann-Whitney U-test that runs in parallel on 2d arrays.
 
-    This is the asymptotic algo only.
+    See ``ranksum_test()`` for the available methods.
     """
     x = np.asarray(x)
     y = np.asarray(y)
@@ -61,12 +168,82 @@ def mannwhitneyu(x, y, alternative="two-sided", use_continuity=True):
     ranked = rankdata(np.concatenate((x, y)))
     rankx = ranked[0:n1, :]  # get the x-ranks
     r = np.sum(rankx, axis=0)
-    u1 = n1 * n2 + (n1 * (n1 + 1)) / 2.0 - r  # calc U for x
-    u2 = n1 * n2 - u1  # remainder is U for y
 
     # check for ties in the rankings
     t_correction = tiecorrect(ranked)
 
+    return ranksum_test(
+        r,
+        n1,
+        n1 + n2,
+        t_correction,
+        alternative=alternative,
+        use_continuity=use_continuity,
+        method=method,
+        exact_cutoff=exact_cutoff,
+        log=log,
+    )
+
+
+def ranksum_test(
+    rank_sums,
+    n1,
+    n,
+    t_correction,
+    alternative="two-sided",
+    use_continuity=True,
+    method="asymptotic",
+    exact_cutoff=EXACT_CUTOFF,
+    log=False,
+):
+    """Mann-Whitney U-test from precomputed rank sums.
+
+    Ranks only need to be computed once for a column, so many groups can be
+    tested against the same ranking by summing the ranks of their members.
+    All arguments are broadcast against each other.
+
+    The exact method is only used for groups with at most ``exact_cutoff``
+    members in columns without ties; the normal approximation is used for
+    everything else. The null distribution of U is computed once for each
+    pair of group sizes and reused.
+
+    Parameters
+    ----------
+    rank_sums : numpy.ndarray
+        The sum of the ranks for the members of each group.
+    n1 : int or numpy.ndarray
+        The number of members in each group.
+    n : int
+        The total number of ranked observations.
+    t_correction : numpy.ndarray
+        The tie correction factor for each column, from ``tiecorrect()``.
+    alternative : str, {"two-sided", "greater", "less"}, optional
+        The alternative hypothesis.
+    use_continuity : bool, optional
+        Apply a continuity correction? This only affects the asymptotic
+        p-values.
+    method : str, {"asymptotic", "exact"}, optional
+        How the p-values are calculated.
+    exact_cutoff : int, optional
+        The largest group for which exact p-values are calculated.
+    log : bool, optional
+        Return the natural logarithm of the p-values? These are computed
+        from the log survival function, so they remain finite and ordered
+        for very strong differences, where the p-values underflow to 0.
+
+    Returns
+    -------
+    u_val : numpy.ndarray
+        The U statistics.
+    p : numpy.ndarray
+        The p-values, or their logarithms.
+
+    """
+    n1 = np.asarray(n1, dtype=np.float64)
+    n2 = n - n1
+    u1 = n1 * n2 + (n1 * (n1 + 1)) / 2.0 - rank_sums  # calc U for x
+    u2 = n1 * n2 - u1  # remainder is U for y
+
     # if *everything* is identical we'll raise an error, not otherwise
     if np.all(t_correction == 0):
         raise ValueError("All numbers are identical")
@@ -87,8 +264,232 @@ def mannwhitneyu(x, y, alternative="two-sided", use_continuity=True):
     with np.errstate(divide="ignore", invalid="ignore"):
         z = (u_val - meanrank) / sd
 
-    p = stats.norm.sf(z)
-    p *= f
-    p = np.clip(p, 0, 1)
+    if log:
+        p = special.log_ndtr(-z) + np.log(f)
+    else:
+        # The survival function of the normal distribution:
+        p = special.ndtr(-z) * f
+
+    if method == "exact":
+        # A group that holds every observation has only one possible U:
+        exact = (n1 <= exact_cutoff) & (t_correction == 1) & (n2 > 0)
+        exact = np.broadcast_to(exact, p.shape)
+        if exact.any():
+            n2 = np.broadcast_to(n2, p.shape)
+            n1 = np.broadcast_to(n1, p.shape)
+            u_val = np.broadcast_to(u_val, p.shape)
+            for size in np.unique(n1[exact]):
+                group = exact & (n1 == size)
+                sf = exact_sf(int(size), int(n2[group][0]))
+                idx = np.rint(u_val[group]).astype(np.int64)
+                exact_p = f * sf[np.clip(idx, 0, len(sf) - 1)]
+                if log:
+                    with np.errstate(divide="ignore"):
+                        exact_p = np.log(exact_p)
 
+                p[group] = exact_p
+
+    elif method != "asymptotic":
+        raise ValueError(
+            f"Expected method ({method}) to be one of 'asymptotic' or 'exact'."
+        )
+
+    p = np.clip(p, -np.inf if log else 0, 0 if log else 1)
     return u_val, p
+
+
+@lru_cache(maxsize=256)
+def exact_sf(n1, n2):
+    """The exact null distribution of the Mann-Whitney U statistic.
+
+    The number of ways to obtain each U is a coefficient of the Gaussian
+    binomial coefficient, which is built up one member of the smaller group
+    at a time. Every intermediate polynomial has non-negative coefficients,
+    and they are kept normalized so that large groups do not overflow.
+
+    Parameters
+    ----------
+    n1 : int
+        The number of members in the first group.
+    n2 : int
+        The number of members in the second group.
+
+    Returns
+    -------
+    numpy.ndarray
+        The probability that U is greater than or equal to each value from 0
+        to ``n1 * n2``. The array is read-only, because it is shared between
+        calls.
+
+    """
+    n1, n2 = sorted((n1, n2))
+    pmf = np.zeros(n1 * n2 + 1, dtype=np.float64)
+    pmf[0] = 1.0
+    for i in range(1, n1 + 1):
+        # Multiply by (1 - q^(n2 + i)):
+        shift = n2 + i
+        pmf[shift:] -= pmf[:-shift].copy()
+
+        # Divide by (1 - q^i), a cumulative sum over every i-th coefficient:
+        size = -(-len(pmf) // i) * i
+        padded = np.zeros(size)
+        padded[: len(pmf)] = pmf
+        pmf = padded.reshape(-1, i).cumsum(axis=0).ravel()[: len(pmf)]
+
+        # Keep the total probability at 1:
+        pmf *= i / shift
+
+    # The distribution is symmetric. Rounding errors from the subtractions
+    # accumulate in the upper half, so mirror the lower half onto it to keep
+    # small p-values accurate.
+    half = len(pmf) // 2
+    if half:
+        pmf[-half:] = pmf[:half][::-1]
+
+    np.clip(pmf, 0, None, out=pmf)
+    sf = np.cumsum(pmf[::-1])[::-1]
+    sf /= sf[0]
+    sf.flags.writeable = False
+    return sf
+
+
+def permutation_test(
+    ranked,
+    indptr,
+    indices,
+    n_permutations=10000,
+    seed=None,
+    batch_size=PERMUTATION_BATCH,
+    log=False,
+):
+    """One-sided rank sum test against a label permutation null.
+
+    The observations are shuffled between groups, using the same
+    permutation for every column, and the rank sum of each group is
+    recomputed. Ties are handled naturally because the ranks themselves are
+    permuted. The p-value is the fraction of permutations with a rank sum at
+    least as large as the observed one, counting the observed labels as one
+    of the permutations.
+
+    Parameters
+    ----------
+    ranked : numpy.ndarray
+        The ranks from ``rankdata()``, with observations as rows.
+    indptr : numpy.ndarray
+        The CSR row pointers of the group by observation membership matrix.
+    indices : numpy.ndarray
+        The CSR column indices of the membership matrix.
+    n_permutations : int, optional
+        The number of permutations.
+    seed : int or numpy.random.Generator, optional
+        The seed for the random permutations.
+    batch_size : int, optional
+        The number of permutations to draw at a time.
+    log : bool, optional
+        Return the natural logarithm of the p-values?
+
+    Returns
+    -------
+    numpy.ndarray
+        The p-value of each group in each column, testing whether its ranks
+        are greater than expected, or its logarithm.
+
+    """
+    ranked = np.ascontiguousarray(ranked, dtype=np.float64)
+    indptr = np.asarray(indptr, dtype=np.int64)
+    indices = np.asarray(indices, dtype=np.int64)
+    rng = np.random.default_rng(seed)
+
+    observed = _rank_sums(indptr, indices, ranked)
+    counts = np.zeros(observed.shape, dtype=np.int64)
+    identity = np.arange(ranked.shape[0], dtype=np.int64)
+    for start in range(0, n_permutations, batch_size):
+        size = min(batch_size, n_permutations - start)
+        perms = rng.permuted(np.tile(identity, (size, 1)), axis=1)
+        _permutation_counts(indptr, indices, ranked, observed, perms, counts)
+
+    if log:
+        return np.log(counts + 1) - np.log(n_permutations + 1)
+
+    return (counts + 1) / (n_permutations + 1)
+
+
+def fixed_seed(seed=None):
+    """Draw a seed that repeats the same permutations each time it is used.
+
+    Passing the same ``seed`` to several calls of ``permutation_test()``
+    only draws the same permutations if it is an integer. Without one, each
+    call draws new permutations, and a generator continues where the last
+    call stopped.
+
+    Parameters
+    ----------
+    seed : int or numpy.random.Generator, optional
+        The seed or random number generator to draw from.
+
+    Returns
+    -------
+    int
+        ``seed`` itself if it is an integer, or a seed drawn from it.
+
+    """
+    if isinstance(seed, int | np.integer):
+        return int(seed)
+
+    return int(np.random.default_rng(seed).integers(2**63))
+
+
+def fdr_correction(pvals, method="bh", log=False):
+    """Adjust p-values for the false discovery rate in each column.
+
+    All of the columns are sorted at once and then adjusted in parallel by
+    a compiled kernel, so correcting thousands of columns is cheap. Missing
+    p-values are ignored and remain missing.
+
+    Parameters
+    ----------
+    pvals : numpy.ndarray
+        A 1D array of p-values, or a 2D array with one set of p-values in
+        each column.
+    method : str, {"bh", "by"}, optional
+        The Benjamini-Hochberg ("bh") procedure, or the Benjamini-Yekutieli
+        ("by") procedure, which is also valid for dependent tests.
+    log : bool, optional
+        Are the p-values natural logarithms? If so, the adjustment is done
+        in log space and the adjusted p-values are also logarithms.
+
+    Returns
+    -------
+    numpy.ndarray
+        The adjusted p-values, with the same shape as ``pvals``.
+
+    """
+    if method not in {"bh", "by"}:
+        raise ValueError(
+            f"Expected method ({method}) to be one of 'bh' or 'by'."
+        )
+
+    pvals = np.asarray(pvals, dtype=np.float64)
+    flat = pvals.ndim == 1
+
+    # Each set of p-values is sorted as a contiguous row of the transpose,
+    # which NumPy does much faster than Numba.
+    pvals = np.ascontiguousarray(pvals[None, :] if flat else pvals.T)
+    order = np.argsort(pvals, axis=1)
+    adjusted = _step_up(pvals, order, method == "by", log)
+    return adjusted[0] if flat else adjusted.T
+
+
+def warmup():
+    """Compile the Numba kernels.
+
+    The compiled kernels are cached on disk, so later processes can load
+    them instead of compiling them again.
+    """
+    values = np.arange(6, dtype=np.float64).reshape(3, 2)
+    indptr = np.array([0, 1, 3], dtype=np.int64)
+    indices = np.array([0, 1, 2], dtype=np.int64)
+    ranked = rankdata(values)
+    tiecorrect(ranked)
+    permutation_test(ranked, indptr, indices, n_permutations=1, seed=0)
+    fdr_correction(values)
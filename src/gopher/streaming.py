@@ -0,0 +1,408 @@
+"""Out-of-core enrichment for matrices with many samples.
+
+Columns of the protein matrix are read and tested in chunks, so peak memory
+depends on the chunk size rather than the number of samples.
+"""
+
+import logging
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from tqdm.auto import tqdm
+
+from . import stats
+from .enrichment import (
+    _annotated_rows,
+    _format_results,
+    _prepare_annotations,
+    _test_sparse,
+    membership_matrix,
+)
+
+LOGGER = logging.getLogger(__name__)
+
+# The number of float64 arrays held per protein and per term for each column
+# of a chunk: the values, their ranks and a temporary copy for the proteins;
+# the rank sums, U statistics and p-values for the terms.
+_ARRAYS_PER_PROTEIN = 3
+_ARRAYS_PER_TERM = 3
+
+
+def test_enrichment_chunked(
+    proteins,
+    index=None,
+    columns=None,
+    memory_limit=2**30,
+    desc=True,
+    aspect="all",
+    species="human",
+    release="current",
+    go_subset=None,
+    contaminants_filter=None,
+    fetch=False,
+    progress=False,
+    annotations=None,
+    mapping=None,
+    aggregate_terms=True,
+    propagate=False,
+    method="asymptotic",
+    n_permutations=10000,
+    seed=None,
+    n_jobs=1,
+    log_pvals=False,
+):
+    """Test for the enrichment of GO terms, a chunk of columns at a time.
+
+    This gives the same results as ``test_enrichment()``, but the protein
+    matrix is never fully loaded into memory. The Benjamini-Hochberg
+    correction is applied once all of the chunks have been tested.
+
+    Parameters
+    ----------
+    proteins : numpy.ndarray, str, Path, or pandas.DataFrame
+        The protein abundances. This may be a 2D NumPy array or memmap with
+        proteins as rows and samples as columns, the path to a Parquet file,
+        or a dataframe.
+    index : list of str or str, optional
+        For arrays, the UniProt accession of each row. For Parquet files, the
+        column containing the UniProt accessions if it is not stored as the
+        pandas index.
+    columns : list of str, optional
+        For arrays, the name of each column. For Parquet files, the columns
+        to test. By default, all columns are tested.
+    memory_limit : int, optional
+        The approximate number of bytes that may be used for each chunk.
+    desc : bool, optional
+        Rank proteins in descending order?
+    aspect : str, {"cc", "mf", "bp", "all"}, optional
+        The Gene Ontology aspect to use.
+    species : str, {"human", "yeast", ...}, optional.
+        The species for which to retrieve GO annotations.
+    release : str, optional
+        The Gene Ontology release version.
+    go_subset: list of str, optional
+        The go terms of interest.
+    contaminants_filter: List[str], optional
+        A list of uniprot accessions for common contaminants to filter out.
+    fetch : bool, optional
+        Download the GO annotations even if they have been downloaded before?
+    progress : bool, optional
+        Show a progress bar over the chunks?
+    annotations: pandas.DataFrame, optional
+        A custom annotations dataframe.
+    mapping: defaultdict, optional
+        A custom mapping of the GO term relationships.
+    aggregate_terms : bool, optional
+        Aggregate the terms and do the tree search.
+    propagate : bool, optional
+        Propagate the annotations to all ancestor terms.
+    method : str, {"asymptotic", "exact", "permutation"}, optional
+        How the p-values are calculated.
+    n_permutations : int, optional
+        The number of permutations for the "permutation" method.
+    seed : int or numpy.random.Generator, optional
+        The seed for the "permutation" method. One seed is drawn from it, or
+        at random without one, for every chunk to use the same permutations,
+        so the results do not depend on the chunk size.
+    n_jobs : int, optional
+        The number of processes used to test each chunk. -1 uses all of the
+        available cores.
+    log_pvals : bool, optional
+        Return the natural logarithm of the adjusted p-values?
+
+    Returns
+    -------
+    pandas.DataFrame
+        The adjusted p-value for each tested GO term in each sample.
+
+    """
+    chunks = iter_enrichment_chunks(
+        proteins,
+        index=index,
+        columns=columns,
+        memory_limit=memory_limit,
+        desc=desc,
+        aspect=aspect,
+        species=species,
+        release=release,
+        go_subset=go_subset,
+        contaminants_filter=contaminants_filter,
+        fetch=fetch,
+        progress=progress,
+        annotations=annotations,
+        mapping=mapping,
+        aggregate_terms=aggregate_terms,
+        propagate=propagate,
+        method=method,
+        n_permutations=n_permutations,
+        seed=seed,
+        n_jobs=n_jobs,
+        log_pvals=log_pvals,
+    )
+
+    terms = None
+    pvals = []
+    for chunk in chunks:
+        if terms is None:
+            terms = chunk.iloc[:, :3].set_axis(
+                ["go_id", "go_name", "aspect"], axis=1
+            )
+
+        pvals.append(chunk.iloc[:, 3:])
+
+    pvals = pd.concat(pvals, axis=1)
+    return _format_results(
+        terms, pvals.to_numpy(), pvals.columns, log=log_pvals
+    )
+
+
+def iter_enrichment_chunks(
+    proteins,
+    index=None,
+    columns=None,
+    memory_limit=2**30,
+    desc=True,
+    aspect="all",
+    species="human",
+    release="current",
+    go_subset=None,
+    contaminants_filter=None,
+    fetch=False,
+    progress=False,
+    annotations=None,
+    mapping=None,
+    aggregate_terms=True,
+    propagate=False,
+    method="asymptotic",
+    n_permutations=10000,
+    seed=None,
+    n_jobs=1,
+    log_pvals=False,
+):
+    """Test for the enrichment of GO terms, yielding each chunk of columns.
+
+    The yielded p-values are not corrected for multiple hypothesis testing.
+    See ``test_enrichment_chunked()`` for a description of the parameters.
+
+    Yields
+    ------
+    pandas.DataFrame
+        The uncorrected p-value for each tested GO term in each sample of
+        the chunk, or its natural logarithm.
+
+    """
+    source = _open_source(proteins, index, columns)
+    seed = stats.fixed_seed(seed)
+
+    LOGGER.info("Retrieving GO annotations...")
+    annot = _prepare_annotations(
+        annotations=annotations,
+        mapping=mapping,
+        species=species,
+        aspect=aspect,
+        release=release,
+        fetch=fetch,
+        go_subset=go_subset,
+        aggregate_terms=aggregate_terms,
+        propagate=propagate,
+    )
+
+    annot, rows = _annotated_rows(source.index, annot, contaminants_filter)
+    terms, membership = membership_matrix(annot, source.index[rows])
+    chunk_size = _chunk_size(len(rows), len(terms), memory_limit)
+    n_chunks = -(-len(source.columns) // chunk_size)
+    LOGGER.info(
+        "Testing enrichment in %i chunks of %i columns...",
+        n_chunks,
+        chunk_size,
+    )
+
+    for start in tqdm(
+        range(0, len(source.columns), chunk_size),
+        total=n_chunks,
+        disable=not progress,
+    ):
+        cols = source.columns[start : start + chunk_size]
+        values = source.read(start, start + len(cols), rows)
+        pvals = _test_sparse(
+            values,
+            membership,
+            desc,
+            method,
+            n_permutations=n_permutations,
+            seed=seed,
+            n_jobs=n_jobs,
+            log=log_pvals,
+        )
+        yield _format_results(terms, pvals, cols, adjust=False)
+
+
+def _chunk_size(n_proteins, n_terms, memory_limit):
+    """The number of columns that fit within the memory limit.
+
+    Parameters
+    ----------
+    n_proteins : int
+        The number of tested proteins.
+    n_terms : int
+        The number of tested terms.
+    memory_limit : int
+        The approximate number of bytes available for each chunk.
+
+    Returns
+    -------
+    int
+        The number of columns in each chunk.
+
+    """
+    per_column = 8 * (
+        _ARRAYS_PER_PROTEIN * n_proteins + _ARRAYS_PER_TERM * n_terms
+    )
+    return max(1, int(memory_limit // max(per_column, 1)))
+
+
+class _Source:
+    """A protein matrix that can be read a chunk of columns at a time.
+
+    Parameters
+    ----------
+    index : pandas.Index
+        The UniProt accession of each row.
+    columns : pandas.Index
+        The name of each column.
+    reader : callable
+        A function that accepts the start and stop positions of a range of
+        columns and returns their values as a 2D array.
+
+    """
+
+    def __init__(self, index, columns, reader):
+        """Initialize the _Source."""
+        self.index = pd.Index(index)
+        self.columns = pd.Index(columns)
+        self._reader = reader
+
+    def read(self, start, stop, rows):
+        """Read a chunk of columns.
+
+        Parameters
+        ----------
+        start : int
+            The first column to read.
+        stop : int
+            The column after the last one to read.
+        rows : numpy.ndarray
+            The rows to keep.
+
+        Returns
+        -------
+        numpy.ndarray
+            The values, with proteins as rows and samples as columns.
+
+        """
+        values = self._reader(start, stop)
+        return np.asarray(values, dtype=np.float64)[rows, :]
+
+
+def _open_source(proteins, index=None, columns=None):
+    """Wrap the protein matrix so that it can be read in chunks.
+
+    Parameters
+    ----------
+    proteins : numpy.ndarray, str, Path, or pandas.DataFrame
+        The protein abundances.
+    index : list of str or str, optional
+        The accessions, or the column containing them for Parquet files.
+    columns : list of str, optional
+        The column names, or the columns to read for Parquet files.
+
+    Returns
+    -------
+    _Source
+        The protein matrix.
+
+    """
+    if isinstance(proteins, pd.DataFrame):
+        return _Source(
+            proteins.index,
+            proteins.columns,
+            lambda start, stop: proteins.iloc[:, start:stop].to_numpy(),
+        )
+
+    if isinstance(proteins, str | Path):
+        return _open_parquet(proteins, index, columns)
+
+    if not isinstance(proteins, np.ndarray):
+        proteins = np.asarray(proteins)
+
+    if proteins.ndim != 2:
+        raise ValueError("Expected a 2D array of protein abundances.")
+
+    if index is None or len(index) != proteins.shape[0]:
+        raise ValueError("'index' must contain an accession for each row.")
+
+    if columns is None:
+        columns = [f"Sample {i + 1}" for i in range(proteins.shape[1])]
+    elif len(columns) != proteins.shape[1]:
+        raise ValueError("'columns' must contain a name for each column.")
+
+    return _Source(index, columns, lambda start, stop: proteins[:, start:stop])
+
+
+def _open_parquet(path, index=None, columns=None):
+    """Open a Parquet file so that it can be read in chunks.
+
+    Parameters
+    ----------
+    path : str or Path
+        The Parquet file.
+    index : str, optional
+        The column containing the UniProt accessions.
+    columns : list of str, optional
+        The columns to read.
+
+    Returns
+    -------
+    _Source
+        The protein matrix.
+
+    """
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as err:
+        raise ImportError(
+            "Reading Parquet files requires pyarrow. Install it with "
+            "'pip install gopher-enrich[parquet]'."
+        ) from err
+
+    pq_file = pq.ParquetFile(path)
+    names = pq_file.schema_arrow.names
+    if index is None:
+        meta = pq_file.schema_arrow.pandas_metadata or {}
+        index_cols = [
+            c for c in meta.get("index_columns", []) if isinstance(c, str)
+        ]
+        if not index_cols:
+            raise ValueError(
+                f"{path} has no stored index; specify the accession column "
+                "with 'index'."
+            )
+
+        index = index_cols[0]
+        skip = index_cols
+    else:
+        skip = [index]
+
+    if columns is None:
+        columns = [c for c in names if c not in skip]
+
+    accessions = pq_file.read(columns=[index]).column(0).to_pylist()
+
+    def reader(start, stop):
+        table = pq_file.read(columns=list(columns[start:stop]))
+        return np.column_stack(
+            [c.to_numpy(zero_copy_only=False) for c in table.columns]
+        )
+
+    return _Source(accessions, columns, reader)
@@ -0,0 +1,490 @@
+"""Deterministic synthetic Gene Ontology data for benchmarks and tests.
+
+The generated ontology is a DAG below the three real GO roots, in which
+each term has one or more parents of the same aspect. Annotations favor a
+few popular terms, as real annotations do, and the proteome has UniProt-like
+accessions and sequences so that it can be used for normalization. Each
+component is drawn from its own stream of the seed, so changing the number
+of samples does not change the ontology or the annotations.
+
+``SyntheticDataset.write()`` lays the files out as a gopher data directory,
+so the complete pipeline can be run offline against them.
+"""
+
+import gzip
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .annotations import SPECIES
+from .ontologies import ASPECTS
+
+# The real roots of each aspect:
+ROOTS = {
+    "P": ("GO:0008150", "biological_process"),
+    "F": ("GO:0003674", "molecular_function"),
+    "C": ("GO:0005575", "cellular_component"),
+}
+
+# The approximate frequency of each amino acid in the UniProt proteome.
+AMINO_ACIDS = {
+    "A": 8.25,
+    "C": 1.38,
+    "D": 5.46,
+    "E": 6.72,
+    "F": 3.86,
+    "G": 7.07,
+    "H": 2.27,
+    "I": 5.91,
+    "K": 5.80,
+    "L": 9.65,
+    "M": 2.41,
+    "N": 4.06,
+    "P": 4.74,
+    "Q": 3.93,
+    "R": 5.53,
+    "S": 6.63,
+    "T": 5.35,
+    "V": 6.86,
+    "W": 1.10,
+    "Y": 2.92,
+}
+
+_ALPHANUMERIC = np.array(list("0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"))
+
+
+class SyntheticDataset:
+    """A synthetic ontology, proteome, annotations, and abundances.
+
+    Use ``SyntheticDataset.generate()`` to create a dataset.
+
+    Parameters
+    ----------
+    terms : pandas.DataFrame
+        The "go_id", "go_name", and "aspect" of each term.
+    edges : pandas.DataFrame
+        The "parent" and "child" of each is_a relationship.
+    proteome : pandas.DataFrame
+        The "Protein" accession and "Sequence" of each protein.
+    annotations : pandas.DataFrame
+        The "uniprot_accession", "go_id", "aspect", and "go_name" of each
+        annotation.
+    proteins : pandas.DataFrame
+        The abundance of each protein in each sample.
+    enriched : list of str
+        The GO terms whose proteins are more abundant in every other sample.
+
+    """
+
+    def __init__(
+        self, terms, edges, proteome, annotations, proteins, enriched
+    ):
+        """Initialize the SyntheticDataset."""
+        self.terms = terms
+        self.edges = edges
+        self.proteome = proteome
+        self.annotations = annotations
+        self.proteins = proteins
+        self.enriched = enriched
+
+    @classmethod
+    def generate(
+        cls,
+        n_proteins=2000,
+        n_terms=1000,
+        n_samples=4,
+        per_protein=10,
+        n_enriched=5,
+        fold=8.0,
+        seed=0,
+    ):
+        """Generate a dataset.
+
+        Parameters
+        ----------
+        n_proteins : int, optional
+            The number of proteins.
+        n_terms : int, optional
+            The number of GO terms, including the three roots.
+        n_samples : int, optional
+            The number of samples.
+        per_protein : int, optional
+            The average number of annotations for each protein.
+        n_enriched : int, optional
+            The number of terms whose proteins are made more abundant.
+        fold : float, optional
+            The fold change for the proteins of the enriched terms.
+        seed : int, optional
+            The seed for the random number generators.
+
+        Returns
+        -------
+        SyntheticDataset
+            The generated dataset.
+
+        """
+        streams = np.random.SeedSequence(seed).spawn(4)
+        terms, edges = generate_ontology(n_terms, seed=streams[0])
+        proteome = generate_proteome(n_proteins, seed=streams[1])
+        annot = generate_annotations(
+            proteome["Protein"], terms, per_protein, seed=streams[2]
+        )
+        proteins, enriched = generate_abundances(
+            proteome["Protein"],
+            n_samples,
+            annot=annot,
+            n_enriched=n_enriched,
+            fold=fold,
+            seed=streams[3],
+        )
+        return cls(terms, edges, proteome, annot, proteins, enriched)
+
+    def write(self, path, species="human", release="2000-01-01"):
+        """Write the dataset as a gopher data directory.
+
+        Set the data directory to ``path`` with ``gopher.set_data_dir()``
+        and use ``gopher.set_offline()`` to use the synthetic files in place
+        of the real ones.
+
+        Parameters
+        ----------
+        path : str or Path
+            The data directory to create.
+        species : str, {"human", "yeast"}, optional
+            The species to write the GAF file for.
+        release : str, optional
+            The GO release to write the GAF file for.
+
+        Returns
+        -------
+        dict of str: Path
+            The "obo", "gaf", and "fasta" files.
+
+        """
+        path = Path(path)
+        stem = SPECIES.get(species.lower(), species.lower())
+        files = {
+            "obo": path / "ontologies" / "go-basic.obo",
+            "gaf": path / "annotations" / release / f"{stem}.gaf.gz",
+            "fasta": path / "fasta" / "proteome.fasta",
+        }
+        for fname in files.values():
+            fname.parent.mkdir(parents=True, exist_ok=True)
+
+        write_obo(self.terms, self.edges, files["obo"])
+        write_gaf(self.annotations, files["gaf"])
+        write_fasta(self.proteome, files["fasta"])
+        return files
+
+
+def generate_ontology(n_terms, max_parents=3, seed=None):
+    """Generate a GO-like DAG.
+
+    Each term after the roots is assigned an aspect and between one and
+    ``max_parents`` parents among the earlier terms of that aspect. Most
+    terms have a single parent.
+
+    Parameters
+    ----------
+    n_terms : int
+        The number of terms, including the three roots.
+    max_parents : int, optional
+        The largest number of parents for a term.
+    seed : int or numpy.random.SeedSequence, optional
+        The seed for the random number generator.
+
+    Returns
+    -------
+    terms : pandas.DataFrame
+        The "go_id", "go_name", and "aspect" of each term.
+    edges : pandas.DataFrame
+        The "parent" and "child" of each is_a relationship.
+
+    """
+    rng = np.random.default_rng(seed)
+    n_terms = max(n_terms, len(ROOTS))
+    aspects = np.concatenate(
+        [
+            list(ROOTS),
+            rng.choice(
+                list(ROOTS), size=n_terms - len(ROOTS), p=[0.6, 0.25, 0.15]
+            ),
+        ]
+    )
+
+    ids = [root_id for root_id, _ in ROOTS.values()]
+    ids += [f"GO:{1000000 + i:07d}" for i in range(len(ROOTS), n_terms)]
+    ids = np.array(ids)
+    names = [name for _, name in ROOTS.values()]
+    names += [f"synthetic term {i}" for i in range(len(ROOTS), n_terms)]
+
+    # Group the terms by aspect, in order, so that the earlier terms of an
+    # aspect are a prefix of its group. Each root is first in its group.
+    order = np.argsort(aspects, kind="stable")
+    starts = np.searchsorted(aspects[order], aspects)
+    position = np.empty(n_terms, dtype=np.int64)
+    position[order] = np.arange(n_terms) - starts[order]
+
+    child = np.arange(len(ROOTS), n_terms)
+    n_parents = rng.geometric(0.6, size=(len(child), 1))
+    draws = rng.random((len(child), max_parents))
+    earlier = (draws * position[child, None]).astype(np.int64)
+    parent = order[starts[child, None] + earlier]
+    keep = np.arange(max_parents) < n_parents
+    edges = pd.DataFrame(
+        {
+            "parent": ids[parent[keep]],
+            "child": ids[np.broadcast_to(child[:, None], keep.shape)[keep]],
+        }
+    ).drop_duplicates(ignore_index=True)
+
+    terms = pd.DataFrame({"go_id": ids, "go_name": names, "aspect": aspects})
+    return terms, edges
+
+
+def generate_proteome(n_proteins, seed=None):
+    """Generate protein accessions and sequences.
+
+    Parameters
+    ----------
+    n_proteins : int
+        The number of proteins.
+    seed : int or numpy.random.SeedSequence, optional
+        The seed for the random number generator.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The "Protein" accession and "Sequence" of each protein.
+
+    """
+    rng = np.random.default_rng(seed)
+    lengths = np.maximum(rng.lognormal(6, 0.6, size=n_proteins), 50)
+    lengths = lengths.astype(np.int64)
+    ends = np.cumsum(lengths)
+    freqs = np.cumsum(list(AMINO_ACIDS.values()))
+    residues = np.frombuffer("".join(AMINO_ACIDS).encode(), dtype=np.uint8)
+    draws = rng.random(lengths.sum()) * freqs[-1]
+    residues = residues[np.searchsorted(freqs, draws, side="right")]
+    residues = residues.tobytes().decode()
+    seqs = [
+        residues[start:end]
+        for start, end in zip(ends - lengths, ends, strict=True)
+    ]
+    return pd.DataFrame(
+        {
+            "Protein": _accessions(n_proteins),
+            "Sequence": seqs,
+        }
+    )
+
+
+def generate_annotations(accessions, terms, per_protein=10, seed=None):
+    """Annotate proteins with GO terms.
+
+    Term popularity follows Zipf's law, so a few terms are annotated to many
+    proteins and most terms to only a few. The roots are never annotated.
+
+    Parameters
+    ----------
+    accessions : list of str
+        The protein accessions.
+    terms : pandas.DataFrame
+        The terms from ``generate_ontology()``.
+    per_protein : int, optional
+        The average number of annotations for each protein.
+    seed : int or numpy.random.SeedSequence, optional
+        The seed for the random number generator.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The "uniprot_accession", "go_id", "aspect", and "go_name" of each
+        annotation.
+
+    """
+    rng = np.random.default_rng(seed)
+    accessions = np.asarray(accessions)
+    candidates = terms.iloc[len(ROOTS) :, :].reset_index(drop=True)
+    if not len(candidates):
+        return pd.DataFrame(columns=["uniprot_accession", *terms.columns])
+
+    weights = 1 / np.arange(1, len(candidates) + 1)
+    weights = rng.permutation(weights / weights.sum())
+    counts = rng.poisson(max(per_protein - 1, 0), size=len(accessions)) + 1
+    picks = rng.choice(len(candidates), size=counts.sum(), p=weights)
+    annot = candidates.iloc[picks, :].reset_index(drop=True)
+    annot.insert(0, "uniprot_accession", np.repeat(accessions, counts))
+    annot = annot.loc[:, ["uniprot_accession", "go_id", "aspect", "go_name"]]
+    return annot.drop_duplicates(ignore_index=True)
+
+
+def generate_abundances(
+    accessions, n_samples, annot=None, n_enriched=5, fold=8.0, seed=None
+):
+    """Generate log-normal protein abundances.
+
+    The proteins of ``n_enriched`` terms, chosen among those with 10 to 500
+    proteins, are ``fold`` times more abundant in every other sample.
+
+    Parameters
+    ----------
+    accessions : list of str
+        The protein accessions.
+    n_samples : int
+        The number of samples.
+    annot : pandas.DataFrame, optional
+        The annotations from ``generate_annotations()``.
+    n_enriched : int, optional
+        The number of enriched terms.
+    fold : float, optional
+        The fold change for the proteins of the enriched terms.
+    seed : int or numpy.random.SeedSequence, optional
+        The seed for the random number generator.
+
+    Returns
+    -------
+    proteins : pandas.DataFrame
+        The abundance of each protein in each sample.
+    enriched : list of str
+        The enriched GO terms.
+
+    """
+    rng = np.random.default_rng(seed)
+    accessions = pd.Index(accessions)
+    base = rng.lognormal(14, 1.5, size=(len(accessions), 1))
+    noise = rng.lognormal(0, 0.3, size=(len(accessions), n_samples))
+    values = base * noise
+
+    enriched = []
+    if annot is not None and n_enriched:
+        sizes = annot["go_id"].value_counts()
+        eligible = np.sort(sizes.index[(sizes >= 10) & (sizes <= 500)])
+        n_enriched = min(n_enriched, len(eligible))
+        enriched = rng.choice(eligible, size=n_enriched, replace=False)
+        enriched = sorted(enriched.tolist())
+        members = annot.loc[annot["go_id"].isin(enriched), "uniprot_accession"]
+        rows = accessions.isin(members)
+        values[np.ix_(rows, np.arange(0, n_samples, 2))] *= fold
+
+    proteins = pd.DataFrame(
+        values,
+        index=accessions.rename("Protein"),
+        columns=[f"Sample {i + 1}" for i in range(n_samples)],
+    )
+    return proteins, enriched
+
+
+def write_obo(terms, edges, path):
+    """Write an ontology to an OBO file.
+
+    Parameters
+    ----------
+    terms : pandas.DataFrame
+        The terms from ``generate_ontology()``.
+    edges : pandas.DataFrame
+        The is_a relationships from ``generate_ontology()``.
+    path : str or Path
+        The OBO file to write.
+
+    """
+    namespaces = {v: k for k, v in ASPECTS.items()}
+    names = dict(zip(terms["go_id"], terms["go_name"], strict=True))
+    parents = edges.groupby("child", sort=False)["parent"].agg(list)
+    blocks = ["format-version: 1.2\nontology: go/synthetic"]
+    for go_id, go_name, aspect in terms.itertuples(index=False):
+        lines = [
+            "[Term]",
+            f"id: {go_id}",
+            f"name: {go_name}",
+            f"namespace: {namespaces[aspect]}",
+        ]
+        lines += [f"is_a: {p} ! {names[p]}" for p in parents.get(go_id, [])]
+        blocks.append("\n".join(lines))
+
+    Path(path).write_text("\n\n".join(blocks) + "\n")
+
+
+def write_gaf(annot, path):
+    """Write annotations to a gzipped GAF 2.2 file.
+
+    Parameters
+    ----------
+    annot : pandas.DataFrame
+        The annotations from ``generate_annotations()``.
+    path : str or Path
+        The GAF file to write.
+
+    """
+    accessions = annot["uniprot_accession"].astype(str)
+    gaf = pd.DataFrame(
+        {
+            "db": "UniProtKB",
+            "uniprot_accession": accessions,
+            "db_object_symbol": accessions,
+            "qualifier": "enables",
+            "go_id": annot["go_id"],
+            "db_reference": "GO_REF:0000000",
+            "evidence_code": "IEA",
+            "with_or_from": "",
+            "aspect": annot["aspect"],
+            "db_object_name": "synthetic protein",
+            "db_object_synonym": "",
+            "db_object_type": "protein",
+            "taxon": "taxon:9606",
+            "date": "20000101",
+            "assigned_by": "gopher",
+            "annotation_extension": "",
+            "gene_product_form_id": "",
+        }
+    )
+    with gzip.open(path, "wt", compresslevel=1) as gaf_ref:
+        gaf_ref.write("!gaf-version: 2.2\n")
+        gaf.to_csv(gaf_ref, sep="\t", header=False, index=False)
+
+
+def write_fasta(proteome, path):
+    """Write a proteome to a FASTA file with UniProt-style headers.
+
+    Parameters
+    ----------
+    proteome : pandas.DataFrame
+        The proteome from ``generate_proteome()``.
+    path : str or Path
+        The FASTA file to write.
+
+    """
+    with Path(path).open("w") as fasta_ref:
+        for accession, seq in proteome.itertuples(index=False):
+            fasta_ref.write(
+                f">sp|{accession}|{accession}_SYNTH Synthetic protein\n"
+            )
+            for start in range(0, len(seq), 60):
+                fasta_ref.write(seq[start : start + 60] + "\n")
+
+
+def _accessions(n_proteins):
+    """Generate unique accessions in the UniProt format.
+
+    Parameters
+    ----------
+    n_proteins : int
+        The number of accessions.
+
+    Returns
+    -------
+    list of str
+        Accessions matching ``[OPQ][0-9][A-Z0-9]{3}[0-9]``.
+
+    """
+    idx = np.arange(n_proteins)
+    prefix = np.array(list("OPQ"))[idx % 3]
+    idx //= 3
+    first = (idx % 10).astype(str)
+    idx //= 10
+    last = (idx % 10).astype(str)
+    idx //= 10
+    middle = [_ALPHANUMERIC[(idx // 36**k) % 36] for k in (2, 1, 0)]
+    parts = [prefix, first, *middle, last]
+    return ["".join(p) for p in zip(*parts, strict=True)]
@@ -3,7 +3,11 @@ from collections import defaultdict
 
 import pandas as pd
 
+from . import metrics
+from .ontologies import Ontology
 
+
+@metrics.instrument
 def tree_search(mapping, go_subset, annot):
     """Incorporates the tree search to get all children from parent node.
 
@@ -43,9 +47,9 @@ def new_tree_map(mapping, subset):
 
     Parameters
     ----------
-    mapping : dict
+    mapping : dict or Ontology
         A dictionary with the mapping of the terms of interest as keys and
-        children terms as values.
+        children terms as values, or a compiled ontology.
     subset : list
         List of terms of interest as their GO IDs.
 
@@ -57,15 +61,25 @@ def new_tree_map(mapping, subset):
 
     """
     subset_mapping = defaultdict(list)
+    if isinstance(mapping, Ontology):
+        # The descendants are precomputed for a compiled ontology:
+        for item in subset:
+            subset_mapping[item] = (
+                mapping.descendants(item) if item in mapping else []
+            )
+
+        return subset_mapping
+
     # For every term, get all the children of that node
+    memo = {}
     for item in subset:
-        result = map(item, mapping)
+        result = map(item, mapping, memo)
         subset_mapping[item] = result
     # Return the new mapping
     return subset_mapping
 
 
-def map(term, mapping):
+def map(term, mapping, memo=None):
     """Recursively get all children nodes from the specified parent term.
 
     Parameters
@@ -75,13 +89,23 @@ def map(term, mapping):
     mapping : dict
         A dictionary with the mapping of the terms of interest as keys and
         children terms as values.
+    memo : dict, optional
+        The previously found children of each term, which is updated in
+        place. Share it between calls to avoid walking the same branches
+        again.
 
     Returns
     -------
     list
-        List of all terms that relate to the term of interest.
+        List of all terms that relate to the term of interest, in the order
+        they are first found.
 
     """
+    if memo is None:
+        memo = {}
+    elif term in memo:
+        return copy.copy(memo[term])
+
     # Base case: if there are no children of the current term, return
     if term not in mapping.keys():
         return []
@@ -90,9 +114,13 @@ def map(term, mapping):
     result = copy.copy(children)
     # Iterate through each child, get their children, and add them to the list
     for child in children:
-        res = map(child, mapping)
+        res = map(child, mapping, memo)
         if res:
             result += res
+
+    # Terms reachable through several paths are only listed once:
+    result = list(dict.fromkeys(result))
+    memo[term] = copy.copy(result)
     # Return the list of child nodes
     return result
 
@@ -115,18 +143,20 @@ def update_tree(mapping, annot):
         The dataframe with the new annotations of the mapping incorporated.
 
     """
-    # For every term in the new mapping, get the list of children and the go
-    # name.
-    for key in mapping.keys():
-        children = mapping[key]
-        name = annot.loc[annot["go_id"] == key].iloc[0]["go_name"]
-        # For every child, get annotations for that child. Change the id and
-        # name to match the parent.
-        for value in children:
-            new = annot.loc[annot["go_id"] == value]
-            new["go_id"] = key
-            new["go_name"] = name
-            annot = pd.concat([annot, new], ignore_index=True)
+    # Explode the mapping into one row per parent and descendant, then join
+    # it to the annotations of the descendants to relabel them as the parent.
+    pairs = pd.DataFrame(
+        [(key, value) for key, values in mapping.items() for value in values],
+        columns=["parent", "go_id"],
+        dtype=object,
+    )
+    names = annot.drop_duplicates("go_id").set_index("go_id")["go_name"]
+    new = pairs.merge(annot, on="go_id", how="inner")
+    new["go_id"] = new["parent"]
+    new["go_name"] = new["parent"].map(names)
+    new = new.loc[:, annot.columns]
+
     # Drop duplicate rows and return the updated annotation dataframe
+    annot = pd.concat([annot, new], ignore_index=True)
     annot = annot.drop_duplicates()
     return annot
@@ -1,38 +1,273 @@
 """Utility functions."""
 
-import socket
+import json
+import logging
+import os
 from pathlib import Path
 
 import requests
 
+from . import cache, metrics
 
-def http_download(url, path):
+LOGGER = logging.getLogger(__name__)
+
+# The number of bytes written at a time by http_download():
+CHUNK_SIZE = 2**20
+
+
+@metrics.instrument
+def http_download(
+    url,
+    path,
+    chunk_size=None,
+    sha256=None,
+    resume=True,
+    conditional=True,
+    timeout=60,
+):
     """Download a file using GET.
 
+    The file is first written to a ".part" file next to ``path``, which is
+    renamed to ``path`` once it is complete, so ``path`` is never left
+    partially written. If a download fails, the next one resumes from the
+    end of the partial file with an HTTP range request, as long as the file
+    on the server has not changed. Responses that the server compressed with
+    a Content-Encoding are decoded as they are written, so their size cannot
+    be checked and they are downloaded again from the start instead.
+
+    The ETag and Last-Modified headers of each download are saved in a
+    ".download.json" file next to ``path``. If ``path`` already exists, they
+    are sent with the request so that the server only returns the file if it
+    has changed.
+
     Parameters
     ----------
     url : str
         The URL of the file to download.
     path : Path
         The downloaded file path.
+    chunk_size : int, optional
+        The number of bytes to write at a time. By default, ``CHUNK_SIZE``.
+    sha256 : str, optional
+        The expected SHA-256 digest of the file, as a hexadecimal string. The
+        file is only hashed if it is given.
+    resume : bool, optional
+        Resume a previous partial download?
+    conditional : bool, optional
+        Skip the download if ``path`` exists and has not changed on the
+        server?
+    timeout : float, optional
+        The number of seconds to wait for the server to connect or send data.
+
+    Returns
+    -------
+    bool
+        False if ``path`` was already up to date, True otherwise.
 
     """
     path = Path(path)
-    with requests.get(url, stream=True) as res:
+    part_file = path.with_name(path.name + ".part")
+    meta_file = path.with_name(path.name + ".download.json")
+    meta = _read_meta(meta_file)
+    if chunk_size is None:
+        chunk_size = CHUNK_SIZE
+
+    headers = {}
+    if conditional and path.exists():
+        headers.update(_validators(meta.get("complete")))
+
+    if resume and part_file.exists():
+        headers.update(_resume_headers(part_file, meta.get("partial")))
+
+    with requests.get(
+        url, headers=headers, stream=True, timeout=timeout
+    ) as res:
+        if res.status_code == 304:
+            LOGGER.info("%s is up to date.", path)
+            part_file.unlink(missing_ok=True)
+            return False
+
+        if res.status_code == 416:
+            # The partial file cannot be resumed, so start again:
+            part_file.unlink()
+            res.close()
+            return http_download(
+                url,
+                path,
+                chunk_size=chunk_size,
+                sha256=sha256,
+                resume=False,
+                conditional=conditional,
+                timeout=timeout,
+            )
+
         res.raise_for_status()
-        try:
-            with path.open("wb") as out_ref:
-                for chunk in res.iter_content(chunk_size=8192):
-                    out_ref.write(chunk)
-
-        except (
-            TimeoutError,
-            ConnectionRefusedError,
-            ConnectionResetError,
-            socket.gaierror,
-            socket.herror,
-            EOFError,
-            OSError,
-        ) as err:
-            path.unlink()
-            raise err
+        validators = {
+            "etag": res.headers.get("ETag"),
+            "last_modified": res.headers.get("Last-Modified"),
+        }
+        if res.status_code == 206:
+            LOGGER.info("Resuming the download of %s", url)
+            mode = "ab"
+        else:
+            mode = "wb"
+
+        expected = _expected_size(res)
+        meta["partial"] = None if _is_encoded(res) else validators
+        _write_meta(meta_file, meta)
+        with part_file.open(mode) as out_ref:
+            for chunk in res.iter_content(chunk_size=chunk_size):
+                out_ref.write(chunk)
+
+    size = part_file.stat().st_size
+    if expected is not None and size != expected:
+        raise OSError(
+            f"The download of {url} ended at {size} of {expected} bytes. "
+            "Download it again to resume."
+        )
+
+    if sha256 is not None:
+        validators["sha256"] = _verify(part_file, url, sha256, chunk_size)
+
+    os.replace(part_file, path)
+    _write_meta(meta_file, {"complete": validators})
+    return True
+
+
+def _verify(part_file, url, sha256, chunk_size):
+    """Check the SHA-256 digest of a download.
+
+    Parameters
+    ----------
+    part_file : Path
+        The downloaded file, which is deleted if its digest does not match.
+    url : str
+        The URL of the file.
+    sha256 : str
+        The expected SHA-256 digest of the file, as a hexadecimal string.
+    chunk_size : int
+        The number of bytes to read at a time.
+
+    Returns
+    -------
+    str
+        The SHA-256 digest of the file.
+
+    """
+    digest = cache.file_digest(part_file, chunk_size)
+    if digest != sha256.lower():
+        part_file.unlink()
+        raise ValueError(
+            f"The SHA-256 digest of {url} ({digest}) does not match the "
+            f"expected digest ({sha256})."
+        )
+
+    return digest
+
+
+def _resume_headers(part_file, meta):
+    """Build the headers to resume a partial download.
+
+    Parameters
+    ----------
+    part_file : Path
+        The partial file.
+    meta : dict or None
+        The saved "etag" and "last_modified" of the partial file.
+
+    Returns
+    -------
+    dict of str: str
+        The Range and If-Range headers, or nothing if the download cannot be
+        resumed safely.
+
+    """
+    offset = part_file.stat().st_size
+    if_range = _validators(meta, range_request=True)
+    if not offset or not if_range:
+        return {}
+
+    return {"Range": f"bytes={offset}-", **if_range}
+
+
+def _validators(meta, range_request=False):
+    """Build the headers for a conditional request.
+
+    Parameters
+    ----------
+    meta : dict or None
+        The saved "etag" and "last_modified" of the file.
+    range_request : bool, optional
+        Build the If-Range header for a range request, instead of the
+        headers that skip an unchanged file?
+
+    Returns
+    -------
+    dict of str: str
+        The headers. Only one validator is used, preferring the ETag.
+
+    """
+    meta = meta or {}
+    if meta.get("etag"):
+        header = "If-Range" if range_request else "If-None-Match"
+        return {header: meta["etag"]}
+
+    if meta.get("last_modified"):
+        header = "If-Range" if range_request else "If-Modified-Since"
+        return {header: meta["last_modified"]}
+
+    return {}
+
+
+def _expected_size(res):
+    """The size of the complete file, if it can be checked.
+
+    Parameters
+    ----------
+    res : requests.Response
+        The response of the download.
+
+    Returns
+    -------
+    int or None
+        The size of the complete file in bytes, or None if the response does
+        not give it.
+
+    """
+    # The sizes of a compressed response count the compressed bytes, but
+    # requests decodes them before they are written:
+    if _is_encoded(res):
+        return None
+
+    if res.status_code == 206:
+        return _content_range_total(res.headers)
+
+    size = res.headers.get("Content-Length")
+    return None if size is None else int(size)
+
+
+def _is_encoded(res):
+    """Test whether a response was compressed with a Content-Encoding."""
+    return res.headers.get("Content-Encoding", "identity") != "identity"
+
+
+def _content_range_total(headers):
+    """The total size of a file from the Content-Range of a response."""
+    total = headers.get("Content-Range", "").rpartition("/")[2]
+    return int(total) if total.isdigit() else None
+
+
+def _read_meta(meta_file):
+    """Read the saved headers of a download."""
+    try:
+        with meta_file.open() as meta_ref:
+            return json.load(meta_ref)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_meta(meta_file, meta):
+    """Save the headers of a download."""
+    meta_file.parent.mkdir(parents=True, exist_ok=True)
+    with meta_file.open("w") as meta_ref:
+        json.dump(meta, meta_ref)
@@ -1,12 +1,18 @@
 """Fixtures used for testing."""
 
+import gzip
+import hashlib
 import random
 import string
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 import numpy as np
 import pandas as pd
 import pytest
 
+from gopher import config
+
 
 @pytest.fixture
 def generate_proteins():
@@ -104,3 +110,92 @@ def generate_fake_proteins():
         "Sample 3": sample3,
     }
     return pd.DataFrame(data)
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """Use a temporary gopher data directory."""
+    path = tmp_path / "gopher_data"
+    path.mkdir()
+    monkeypatch.setattr(config.config, "_path", path)
+    return path
+
+
+@pytest.fixture
+def http_server():
+    """Serve files from a local HTTP server.
+
+    Add files by assigning bytes to ``server.files[path]``. The path of each
+    request is recorded in ``server.requests`` and its headers in
+    ``server.headers``. Files are served with an ETag, and range and
+    conditional requests are supported. Assign a number of bytes to
+    ``server.truncate[path]`` to close the connection after sending them.
+    Add a path to ``server.gzip`` to send it with a gzip Content-Encoding.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):  # noqa: N802
+            self.server.requests.append(self.path)
+            self.server.headers.append(dict(self.headers))
+            body = self.server.files.get(self.path)
+            if body is None:
+                self.send_error(404)
+                return
+
+            etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            start = 0
+            byte_range = self.headers.get("Range")
+            if_range = self.headers.get("If-Range")
+            if byte_range and if_range in (None, etag):
+                start = int(byte_range.split("=")[1].rstrip("-"))
+                if start >= len(body):
+                    self.send_error(416)
+                    return
+
+                self.send_response(206)
+                self.send_header(
+                    "Content-Range",
+                    f"bytes {start}-{len(body) - 1}/{len(body)}",
+                )
+            else:
+                self.send_response(200)
+
+            if self.path in self.server.gzip:
+                body = gzip.compress(body[start:])
+                start = 0
+                self.send_header("Content-Encoding", "gzip")
+
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", str(len(body) - start))
+            self.end_headers()
+            end = len(body)
+            if self.path in self.server.truncate:
+                end = start + self.server.truncate.pop(self.path)
+                self.close_connection = True
+
+            self.wfile.write(body[start:end])
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.files = {}
+    server.requests = []
+    server.headers = []
+    server.truncate = {}
+    server.gzip = set()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
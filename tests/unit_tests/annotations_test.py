@@ -1,11 +1,13 @@
 """Test that the annotations functions are working correctly."""
 
+import logging
+import os
 import re
 
 import pandas as pd
 import pytest
 
-from gopher import annotations
+from gopher import annotations, cache, config
 
 
 def test_different_species():
@@ -40,3 +42,134 @@ def test_generate_annotations():
     full, _ = annotations.load_annotations(species="human")
     final = pd.concat([result, full])
     assert len(final) == len(full) + len(result)
+
+
+GAF = [
+    "!gaf-version: 2.2",
+    "UniProtKB\tP10809\tHSPD1\tenables\tGO:0001\tref\tIDA\t\tC\tname\t\t"
+    "protein\ttaxon:9606\t20200101\tUniProt\t\t",
+    "UniProtKB\tP10809\tHSPD1\tenables\tGO:0001\tref\tIEA\t\tC\tname\t\t"
+    "protein\ttaxon:9606\t20200101\tUniProt\t\t",
+    "UniProtKB\tP35527\tKRT9\tenables\tGO:0002\tref\tIDA\t\tP\tname\t\t"
+    "protein\ttaxon:9606\t20200101\tUniProt\t\t",
+    "ComplexPortal\tCPX-1\tCPX\tpart_of\tGO:0003\tref\tIDA\t\tF\tname\t\t"
+    "protein\ttaxon:9606\t20200101\tUniProt\t\tUniProtKB:Q9UMS4",
+]
+
+
+def test_read_annotations_cache(tmp_path, monkeypatch):
+    """Test that parsed annotations are cached and invalidated."""
+    gaf = tmp_path / "goa_test.gaf"
+    gaf.write_text("\n".join(GAF) + "\n")
+    cache_file = tmp_path / "goa_test.all.annot.npz"
+    terms = {"GO:0001": "cytoplasm", "GO:0002": "nucleus"}
+
+    parsed = annotations.read_annotations(
+        gaf, None, terms, cache_file=cache_file
+    )
+    assert cache_file.exists()
+    assert parsed["uniprot_accession"].tolist() == [
+        "P10809",
+        "P35527",
+        "Q9UMS4",
+    ]
+    assert pd.isna(parsed["go_name"].iloc[2])
+
+    # The cache should be used without parsing the GAF again:
+    with monkeypatch.context() as mp:
+        mp.setattr(pd, "read_table", None)
+        cached = annotations.read_annotations(
+            gaf, None, terms, cache_file=cache_file
+        )
+
+    pd.testing.assert_frame_equal(cached, parsed)
+
+    # A new modification time only checks the digest once per process:
+    stat = gaf.stat()
+    os.utime(gaf, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    digests = []
+    file_digest = cache.file_digest
+    with monkeypatch.context() as mp:
+        mp.setattr(pd, "read_table", None)
+        mp.setattr(
+            cache,
+            "file_digest",
+            lambda *args: digests.append(args) or file_digest(*args),
+        )
+        for _ in range(3):
+            cached = annotations.read_annotations(
+                gaf, None, terms, cache_file=cache_file
+            )
+
+    pd.testing.assert_frame_equal(cached, parsed)
+    assert len(digests) == 1
+
+    # Changing the GAF should invalidate the cache:
+    gaf.write_text("\n".join(GAF[:2]) + "\n")
+    updated = annotations.read_annotations(
+        gaf, None, terms, cache_file=cache_file
+    )
+    assert updated["uniprot_accession"].tolist() == ["P10809"]
+
+
+@pytest.fixture
+def go_server(http_server, data_dir, monkeypatch):
+    """Serve a fake current GO release."""
+    http_server.files["/metadata/release-date.json"] = (
+        b'{"date": "2024-01-17"}'
+    )
+    http_server.files["/annotations/goa_test.gaf.gz"] = b"annotations"
+    monkeypatch.setattr(annotations, "CURRENT_URL", http_server.url)
+    return http_server
+
+
+def test_release_is_cached(go_server):
+    """Test that repeated downloads do not touch the network."""
+    out_file = annotations.download_annotations("goa_test")
+    assert out_file.parent.name == "2024-01-17"
+    assert out_file.read_bytes() == b"annotations"
+    assert len(go_server.requests) == 2
+
+    assert annotations.download_annotations("goa_test") == out_file
+    assert len(go_server.requests) == 2
+
+
+def test_release_ttl(go_server, monkeypatch):
+    """Test that the current release is checked again after the TTL."""
+    annotations.resolve_release()
+    monkeypatch.setattr(config.config, "release_ttl", 0)
+    annotations.resolve_release()
+
+    assert go_server.requests == ["/metadata/release-date.json"] * 2
+
+
+def test_offline(go_server, data_dir, caplog):
+    """Test that offline mode uses the newest local release."""
+    with pytest.raises(FileNotFoundError):
+        annotations.download_annotations("goa_test", offline=True)
+
+    for release in ["2023-01-01", "2023-06-01"]:
+        (data_dir / "annotations" / release).mkdir(parents=True)
+        (data_dir / "annotations" / release / "goa_test.gaf.gz").touch()
+
+    (data_dir / "annotations" / "2023-12-01").mkdir()
+    out_file = annotations.download_annotations("goa_test", offline=True)
+    assert out_file.parent.name == "2023-06-01"
+    assert not go_server.requests
+
+    # A file cannot be fetched again in offline mode:
+    with caplog.at_level(logging.WARNING):
+        refetched = annotations.download_annotations(
+            "goa_test", fetch=True, offline=True
+        )
+
+    assert refetched == out_file
+    assert "offline mode" in caplog.text
+    assert not go_server.requests
+
+
+def test_unreachable_release(go_server, data_dir):
+    """Test that a failed release lookup falls back to a local release."""
+    del go_server.files["/metadata/release-date.json"]
+    (data_dir / "annotations" / "2023-01-01").mkdir(parents=True)
+    assert annotations.resolve_release() == "2023-01-01"
@@ -0,0 +1,80 @@
+"""Test the offline bundles prepared by gopher prepare."""
+
+import shutil
+
+import pandas as pd
+import pytest
+
+from gopher import annotations, bundle, config, ontologies, synthetic, utils
+from gopher import gopher as cli
+
+
+@pytest.fixture
+def go_server(http_server, data_dir, tmp_path, monkeypatch):
+    """Serve a synthetic current GO release."""
+    dataset = synthetic.SyntheticDataset.generate(
+        n_proteins=200, n_terms=50, n_samples=2, seed=3
+    )
+    files = dataset.write(tmp_path / "source")
+    http_server.files["/metadata/release-date.json"] = (
+        b'{"date": "2024-01-17"}'
+    )
+    http_server.files["/annotations/goa_human.gaf.gz"] = files[
+        "gaf"
+    ].read_bytes()
+    http_server.files["/go-basic.obo"] = files["obo"].read_bytes()
+    monkeypatch.setattr(annotations, "CURRENT_URL", http_server.url)
+    monkeypatch.setattr(
+        ontologies, "OBO_URL", http_server.url + "go-basic.obo"
+    )
+    return http_server
+
+
+def test_prepare(go_server, data_dir, tmp_path, monkeypatch):
+    """Test that a relocated bundle is used without network or parsing."""
+    # The unit tests otherwise replace the annotations with a dummy set:
+    monkeypatch.delenv("PYTEST_CURRENT_TEST")
+    path = tmp_path / "bundle"
+    cli.main(["prepare", str(path), "-a", "all", "cc"])
+    assert config.get_data_dir() == data_dir
+
+    manifest = bundle.read_manifest(path)
+    assert [(e["release"], e["aspect"]) for e in manifest["annotations"]] == [
+        ("2024-01-17", "all"),
+        ("2024-01-17", "cc"),
+    ]
+    assert "annotations/2024-01-17/goa_human.gaf.gz" in manifest["files"]
+    assert "annotations/2024-01-17/goa_human.cc.annot.npz" in manifest["files"]
+    assert "ontologies/go-basic.npz" in manifest["files"]
+    expected = annotations.read_annotations(
+        path / "annotations" / "2024-01-17" / "goa_human.gaf.gz",
+        aspect="C",
+        terms=ontologies.Ontology.from_obo(
+            path / "ontologies" / "go-basic.obo"
+        ).terms(),
+    )
+
+    # Extend the bundle with another aspect:
+    cli.main(["prepare", str(path), "-a", "bp"])
+    manifest = bundle.read_manifest(path)
+    assert len(manifest["annotations"]) == 3
+    assert len(go_server.requests) == 3
+
+    moved = tmp_path / "shared"
+    shutil.copytree(path, moved)
+    monkeypatch.setattr(config.config, "_path", moved)
+    assert config.config.offline
+
+    def fail(*args, **kwargs):
+        raise AssertionError("gopher tried to download or parse a file.")
+
+    monkeypatch.setattr(annotations.requests, "get", fail)
+    monkeypatch.setattr(utils, "http_download", fail)
+    monkeypatch.setattr(ontologies, "_parse_obo", fail)
+    monkeypatch.setattr(pd, "read_table", fail)
+    annot, _ = annotations.load_annotations("human", aspect="cc")
+    pd.testing.assert_frame_equal(annot, expected)
+
+    # Offline mode can still be disabled explicitly:
+    monkeypatch.setattr(config.config, "_offline", False)
+    assert not config.config.offline
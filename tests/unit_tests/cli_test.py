@@ -0,0 +1,154 @@
+"""Test the command line interface and package startup."""
+
+import ast
+import logging
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import gopher
+from gopher import gopher as cli
+
+
+def test_lazy_imports():
+    """Test that importing gopher does not import its heavy dependencies."""
+    code = (
+        "import sys, gopher; "
+        "heavy = {'pandas', 'numba', 'scipy', 'statsmodels', 'requests'}; "
+        "print(sorted(heavy & set(sys.modules)))"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert out.stdout.strip() == "[]"
+
+
+def test_lazy_attributes():
+    """Test that the public API and submodules are still available."""
+    assert callable(gopher.test_enrichment)
+    assert callable(gopher.stats.rankdata)
+    assert "test_enrichment" in dir(gopher)
+
+
+def test_static_exports():
+    """Test that static analysis tools see the same API as the lazy imports."""
+    tree = ast.parse(Path(gopher.__file__).read_text())
+    block = next(
+        node
+        for node in tree.body
+        if isinstance(node, ast.If)
+        and ast.unparse(node.test) == "TYPE_CHECKING"
+    )
+    imported = {
+        alias.name: node.module for node in block.body for alias in node.names
+    }
+    assert imported == gopher._EXPORTS
+
+
+def test_warmup(caplog):
+    """Test that the warm-up command compiles the kernels."""
+    caplog.set_level(logging.INFO)
+    cli.main(["warmup"])
+    assert "Compiled" in caplog.text
+
+
+def _write_proteins(path, values):
+    """Write an EncyclopeDIA protein file."""
+    rows = ["Protein\tNumPeptides\tPeptideSequences\tA\tB"]
+    accessions = ["P10809", "P35527", "Q9UMS4", "P35637"]
+    for acc, val in zip(accessions, values, strict=True):
+        rows.append(f"sp|{acc}|X_HUMAN\t1\tPEPTIDE\t{val}\t{5 - val}")
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text("\n".join(rows) + "\n")
+
+
+def test_batch(tmp_path, caplog):
+    """Test that a batch writes one output for each input."""
+    runs = tmp_path / "runs"
+    for i in range(4):
+        _write_proteins(runs / f"run{i}.txt", [1, 2, 3, 4][i:] + [1] * i)
+
+    extra = tmp_path / "extra" / "other.txt"
+    _write_proteins(extra, [4, 3, 2, 1])
+    manifest = tmp_path / "manifest.txt"
+    manifest.write_text("# More runs\n\nextra/other.txt\n")
+    (runs / "notes.md").write_text("not a result")
+
+    out_dir = tmp_path / "out"
+    code = cli.main(
+        [
+            "batch",
+            str(runs),
+            str(runs / "run0.txt"),
+            "-m",
+            str(manifest),
+            "-o",
+            str(out_dir),
+            "-t",
+            "2",
+        ]
+    )
+    assert code == 0
+    written = sorted(p.name for p in out_dir.iterdir())
+    assert written == [
+        "other.enrichment.tsv",
+        *[f"run{i}.enrichment.tsv" for i in range(4)],
+    ]
+
+    expected = gopher.test_enrichment(gopher.read_encyclopedia(extra))
+    observed = pd.read_table(out_dir / "other.enrichment.tsv")
+    np.testing.assert_allclose(
+        observed[["A", "B"]].to_numpy(), expected[["A", "B"]].to_numpy()
+    )
+
+    # A glob, with one unreadable file and one that cannot be tested:
+    (runs / "run9.txt").write_text("Protein\tA\nsp|P10809|X\tnot a number\n")
+    _write_proteins(runs / "run1b.txt", [2, 2, 2, 2])
+    caplog.set_level(logging.INFO)
+    code = cli.main(
+        ["batch", str(runs / "run*.txt"), "-o", str(out_dir), "--top-k", "1"]
+    )
+    assert code == 1
+    assert "Failed to read" in caplog.text
+    assert "Failed to test" in caplog.text
+    assert "All numbers are identical" in caplog.text
+    assert "2 of 6 files failed" in caplog.text
+    assert not (out_dir / "run1b.enrichment.tsv").exists()
+    top = pd.read_table(out_dir / "run3.enrichment.tsv")
+    assert top["Rank"].tolist() == [1, 1]
+
+
+def test_commands(tmp_path, monkeypatch):
+    """Test that files named like commands can still be tested."""
+    assert cli.parse_args(["proteins.txt"]).command == "run"
+    args = cli.parse_args(["-o", "out.txt", "proteins.txt"])
+    assert (args.command, args.proteins) == ("run", "proteins.txt")
+    assert cli.parse_args(["batch", "a.txt"]).inputs == ["a.txt"]
+    args = cli.parse_args(["run", "batch"])
+    assert (args.command, args.proteins) == ("run", "batch")
+
+    monkeypatch.chdir(tmp_path)
+    _write_proteins(tmp_path / "batch", [1, 2, 3, 4])
+    assert cli.main(["run", "batch", "-o", "out.txt"]) == 0
+    assert (tmp_path / "out.txt").exists()
+
+
+def test_find_inputs(tmp_path):
+    """Test that inputs are found and named without collisions."""
+    with pytest.raises(FileNotFoundError):
+        cli.find_inputs([str(tmp_path / "*.txt")])
+
+    files = [tmp_path / "a" / "x.txt", tmp_path / "b" / "x.txt"]
+    with pytest.raises(ValueError):
+        cli.output_files(files, tmp_path / "out")
+
+    outputs = cli.output_files(files[:1], tmp_path / "out", "parquet")
+    assert outputs[files[0]].name == "x.enrichment.parquet"
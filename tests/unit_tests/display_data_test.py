@@ -1,4 +1,7 @@
+import numpy as np
 import pandas as pd
+import pytest
+from scipy import stats
 
 from gopher import display_data
 
@@ -27,3 +30,97 @@ def test_roc(generate_proteins):
     df.set_index("Protein", inplace=True)
     result = display_data.roc(df, "cytoplasm")
     assert result is not None
+
+
+def test_rank_membership(generate_proteins):
+    """Check the ranks and term memberships of many terms at once."""
+    df = generate_proteins.set_index("Protein")
+    ranks, membership = display_data.rank_membership(df)
+    assert ranks.shape == df.shape
+    np.testing.assert_array_equal(
+        ranks["Sample 1"], stats.rankdata(df["Sample 1"])
+    )
+    assert membership.index.equals(df.index)
+    assert (membership.dtypes == pd.SparseDtype(bool, False)).all()
+    # The dummy annotations give GO:0002 two names, so each is a column:
+    go_ids = ["GO:0001", "GO:0002", "GO:0002", "GO:0003"]
+    assert membership.columns.get_level_values("go_id").tolist() == go_ids
+    assert membership.columns.is_unique
+    assert membership[("GO:0001", "cytoplasm")].sum() == 2
+    assert membership.loc["P10809", ("GO:0001", "cytoplasm")]
+
+    _, subset = display_data.rank_membership(df, ["cytoplasm", "GO:0003"])
+    assert subset.columns.get_level_values(0).tolist() == [
+        "GO:0001",
+        "GO:0003",
+    ]
+
+
+def test_term_auc(generate_proteins):
+    """Check that the AUCs match those of the Mann-Whitney U test."""
+    df = generate_proteins.set_index("Protein")
+    aucs = display_data.term_auc(df)
+    _, membership = display_data.rank_membership(df)
+    assert (
+        aucs["GO ID"].tolist()
+        == membership.columns.get_level_values(0).tolist()
+    )
+    for term, members in enumerate(membership.sparse.to_dense().to_numpy().T):
+        for sample in df.columns:
+            u_stat, _ = stats.mannwhitneyu(
+                df.loc[members, sample], df.loc[~members, sample]
+            )
+            expected = u_stat / (members.sum() * (~members).sum())
+            assert aucs.loc[term, sample] == pytest.approx(expected)
+
+
+def test_session(generate_proteins, monkeypatch):
+    """Check that a session answers every helper without reloading."""
+    df = generate_proteins.set_index("Protein")
+    session = display_data.AnnotationSession.load(df)
+    assert set(session.accessions) <= set(df.index)
+    assert session.term_proteins("cytoplasm").tolist() == ["P10809", "P35637"]
+    assert session.term_proteins("GO:0001").tolist() == ["P10809", "P35637"]
+    assert session.term_proteins("unknown").empty
+    terms = session.protein_terms("Q9NV31")
+    assert terms["go_name"].tolist() == ["heterochromatin"]
+    assert session.protein_terms("unknown").empty
+
+    expected = {
+        "annotations": display_data.get_annotations(df),
+        "rankings": display_data.get_rankings(df.copy(), "cytoplasm"),
+        "auc": display_data.term_auc(df, ["cytoplasm", "GO:0002"]),
+        "ranks": display_data.rank_membership(df),
+    }
+
+    def fail(*args, **kwargs):
+        raise AssertionError("The annotations were loaded again.")
+
+    monkeypatch.setattr(display_data, "load_annotations", fail)
+    annot = display_data.get_annotations(df, session=session)
+    pd.testing.assert_frame_equal(
+        annot.astype(str), expected["annotations"].astype(str)
+    )
+    mapped = display_data.map_proteins(list(df.index), session=session)
+    assert len(mapped) == len(annot)
+
+    rankings = display_data.get_rankings(
+        df.copy(), "cytoplasm", session=session
+    )
+    pd.testing.assert_frame_equal(rankings, expected["rankings"])
+
+    aucs = display_data.term_auc(df, ["cytoplasm", "GO:0002"], session=session)
+    pd.testing.assert_frame_equal(aucs, expected["auc"])
+
+    ranks, membership = display_data.rank_membership(df, session=session)
+    pd.testing.assert_frame_equal(ranks, expected["ranks"][0])
+    pd.testing.assert_frame_equal(membership, expected["ranks"][1])
+
+    # Proteins outside of the session are not annotated:
+    _, membership = display_data.rank_membership(
+        df.iloc[::-1].rename(index={"P10809": "X00000"}), session=session
+    )
+    assert not membership.loc["X00000"].any()
+    assert membership.loc["P35637", ("GO:0001", "cytoplasm")]
+
+    assert display_data.roc(df.copy(), "cytoplasm", session=session)
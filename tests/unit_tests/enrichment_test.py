@@ -4,6 +4,7 @@ import random
 
 import numpy as np
 import pandas as pd
+import pytest
 from scipy import stats
 
 import gopher
@@ -137,3 +138,224 @@ def test_mannwhitneyu_big():
     sp = np.round(res_scipy[1], 10)
     num = np.round(res_numba[1], 10)
     np.testing.assert_allclose(sp, num)
+
+
+def test_sparse_engine_matches_loop(generate_fake_proteins):
+    """Test that the sparse engine matches the per-term reference loop."""
+    rng = np.random.default_rng(42)
+    prot = generate_fake_proteins.set_index("Protein")
+    annot = pd.DataFrame(
+        {
+            "uniprot_accession": rng.integers(0, 26, size=100),
+            "go_id": rng.choice(list("abcdefgh"), size=100),
+            "aspect": "C",
+        }
+    )
+    annot["go_name"] = annot["go_id"].str.upper()
+    for desc in [True, False]:
+        sparse = enrichment.test_enrichment(
+            prot, annotations=annot, desc=desc, engine="sparse"
+        )
+        loop = enrichment.test_enrichment(
+            prot, annotations=annot, desc=desc, engine="loop"
+        )
+        pd.testing.assert_frame_equal(sparse, loop)
+
+
+def test_mannwhitneyu_exact():
+    """Test that exact p-values match SciPy for small groups without ties."""
+    rng = np.random.default_rng(3)
+    list1 = rng.normal(0.5, size=(6, 4))
+    list2 = rng.normal(size=(40, 4))
+    for alt in ["two-sided", "greater", "less"]:
+        res_scipy = stats.mannwhitneyu(
+            list1, list2, alternative=alt, method="exact"
+        )
+        res_numba = gopher.stats.mannwhitneyu(
+            list1, list2, alternative=alt, method="exact"
+        )
+        np.testing.assert_allclose(res_scipy[1], res_numba[1], rtol=1e-10)
+
+    # Larger groups fall back to the asymptotic test:
+    res_asym = gopher.stats.mannwhitneyu(list2, list1)
+    res_exact = gopher.stats.mannwhitneyu(
+        list2, list1, method="exact", exact_cutoff=10
+    )
+    np.testing.assert_array_equal(res_asym[1], res_exact[1])
+
+
+def test_exact_null_tails():
+    """Test that the cached null distribution is accurate in its tails."""
+    sf = gopher.stats.exact_sf(5, 30)
+    assert len(sf) == 5 * 30 + 1
+    assert sf[0] == 1
+    np.testing.assert_allclose(sf[-1], 1 / 324632, rtol=1e-12)
+    assert gopher.stats.exact_sf(5, 30) is sf
+    np.testing.assert_array_equal(gopher.stats.exact_sf(3, 0), [1.0])
+
+
+def test_exact_term_with_every_protein():
+    """Test exact p-values for a term that annotates every protein."""
+    rng = np.random.default_rng(8)
+    accessions = [f"P{i}" for i in range(10)]
+    prot = pd.DataFrame(rng.normal(size=(10, 2)), index=accessions)
+    annot = pd.DataFrame(
+        {
+            "uniprot_accession": accessions + accessions[:3],
+            "go_id": ["a"] * 10 + ["b"] * 3,
+            "aspect": "C",
+        }
+    )
+    annot["go_name"] = annot["go_id"].str.upper()
+    results = [
+        enrichment.test_enrichment(
+            prot, annotations=annot, engine=engine, method="exact"
+        )
+        for engine in ["sparse", "loop"]
+    ]
+    pd.testing.assert_frame_equal(*results)
+    np.testing.assert_array_equal(results[0].iloc[0, 3:], [1.0, 1.0])
+
+
+def test_exact_enrichment_matches_loop(generate_fake_proteins):
+    """Test the exact p-values with both engines."""
+    rng = np.random.default_rng(7)
+    prot = generate_fake_proteins.set_index("Protein")
+    prot = prot + rng.normal(scale=1e-3, size=prot.shape)
+    annot = pd.DataFrame(
+        {
+            "uniprot_accession": rng.integers(0, 26, size=60),
+            "go_id": rng.choice(list("abcdef"), size=60),
+            "aspect": "C",
+        }
+    )
+    annot["go_name"] = annot["go_id"].str.upper()
+    sparse = enrichment.test_enrichment(
+        prot, annotations=annot, engine="sparse", method="exact"
+    )
+    loop = enrichment.test_enrichment(
+        prot, annotations=annot, engine="loop", method="exact"
+    )
+    asym = enrichment.test_enrichment(prot, annotations=annot)
+    pd.testing.assert_frame_equal(sparse, loop)
+    assert not np.allclose(sparse.iloc[:, 3:], asym.iloc[:, 3:])
+
+
+def test_permutation_enrichment():
+    """Test that permutation p-values agree with the asymptotic test."""
+    rng = np.random.default_rng(11)
+    accessions = [f"P{i}" for i in range(300)]
+    prot = pd.DataFrame(rng.normal(size=(300, 3)), index=accessions)
+    prot.iloc[:30, 0] += 1
+    annot = pd.DataFrame(
+        {
+            "uniprot_accession": accessions[:30] + accessions[100:160],
+            "go_id": ["a"] * 30 + ["b"] * 60,
+            "aspect": "C",
+        }
+    )
+    annot["go_name"] = annot["go_id"].str.upper()
+    asym = enrichment.test_enrichment(prot, annotations=annot)
+    perm = enrichment.test_enrichment(
+        prot,
+        annotations=annot,
+        method="permutation",
+        n_permutations=4000,
+        seed=1,
+    )
+    again = enrichment.test_enrichment(
+        prot,
+        annotations=annot,
+        method="permutation",
+        n_permutations=4000,
+        seed=1,
+    )
+    pd.testing.assert_frame_equal(perm, again)
+    np.testing.assert_allclose(
+        perm.iloc[:, 3:].to_numpy(), asym.iloc[:, 3:].to_numpy(), atol=0.03
+    )
+    assert perm.iloc[0, 3] < 1e-3
+
+    with pytest.raises(ValueError):
+        enrichment.test_enrichment(
+            prot, annotations=annot, method="permutation", engine="loop"
+        )
+
+
+def _naive_fdr(pvals, dependent=False):
+    """A reference Benjamini-Hochberg correction for one set of tests."""
+    order = np.argsort(pvals)
+    n_tests = len(pvals)
+    scale = n_tests * (
+        np.sum(1 / np.arange(1, n_tests + 1)) if dependent else 1
+    )
+    adjusted = np.empty(n_tests)
+    current = 1.0
+    for rank in range(n_tests, 0, -1):
+        current = min(current, pvals[order[rank - 1]] * scale / rank)
+        adjusted[order[rank - 1]] = current
+
+    return adjusted
+
+
+def test_fdr_correction():
+    """Test the FDR correction of many columns at once."""
+    rng = np.random.default_rng(5)
+    pvals = rng.uniform(size=(200, 6)) ** 3
+    pvals[rng.uniform(size=pvals.shape) < 0.2] = pvals[0, 0]
+    for method in ["bh", "by"]:
+        adjusted = gopher.stats.fdr_correction(pvals, method=method)
+        expected = np.column_stack(
+            [_naive_fdr(p, dependent=method == "by") for p in pvals.T]
+        )
+        np.testing.assert_allclose(adjusted, expected, rtol=1e-12)
+
+        logged = gopher.stats.fdr_correction(
+            np.log(pvals), method=method, log=True
+        )
+        np.testing.assert_allclose(np.exp(logged), expected, rtol=1e-12)
+
+    # 1D arrays and missing values:
+    pvals[5, 0] = np.nan
+    adjusted = enrichment.adjust_pvals(pvals[:, 0])
+    assert np.isnan(adjusted[5])
+    np.testing.assert_allclose(
+        np.delete(adjusted, 5), _naive_fdr(np.delete(pvals[:, 0], 5))
+    )
+
+    with pytest.raises(ValueError):
+        gopher.stats.fdr_correction(pvals, method="holm")
+
+
+def test_log_pvals(generate_fake_proteins):
+    """Test that log p-values keep the order of very strong enrichments."""
+    accessions = [f"P{i}" for i in range(5000)]
+    prot = pd.DataFrame({"x": np.arange(5000.0)[::-1]}, index=accessions)
+    annot = pd.DataFrame(
+        {
+            "uniprot_accession": accessions[:600] + accessions,
+            "go_id": ["a"] * 600 + ["b"] * 5000,
+            "aspect": "C",
+        }
+    )
+    annot["go_name"] = annot["go_id"].str.upper()
+
+    linear = enrichment.test_enrichment(prot, annotations=annot)
+    logged = enrichment.test_enrichment(
+        prot, annotations=annot, log_pvals=True
+    )
+    assert linear["x"].iloc[0] == 0
+    assert -np.inf < logged["x"].iloc[0] < np.log(1e-300)
+    assert logged["x"].iloc[1] == 0
+
+    # Both engines and weaker enrichments agree with the linear p-values:
+    prot = generate_fake_proteins.set_index("Protein")
+    annot = annot.assign(uniprot_accession=np.resize(prot.index, len(annot)))
+    linear = enrichment.test_enrichment(prot, annotations=annot)
+    for engine in ["sparse", "loop"]:
+        logged = enrichment.test_enrichment(
+            prot, annotations=annot, engine=engine, log_pvals=True
+        )
+        np.testing.assert_allclose(
+            np.exp(logged.iloc[:, 3:]), linear.iloc[:, 3:], rtol=1e-10
+        )
@@ -1,6 +1,6 @@
 import pandas as pd
 
-from gopher import enrichment, graph_search
+from gopher import annotations, enrichment, graph_search, ontologies
 
 
 def test_graph_mapping(generate_mapping):
@@ -58,3 +58,67 @@ def test_enrichment_graph_search(generate_proteins):
         df, go_subset=terms, aggregate_terms=True
     )
     assert not result_orig.equals(result_graph_search)
+
+
+def test_graph_mapping_shared_children(generate_mapping):
+    """Ensure terms reachable through several paths are listed once."""
+    mapped = graph_search.new_map(generate_mapping, ["x"])
+    assert mapped == {"x": ["y", "z", "l", "m", "n"]}
+
+
+def test_propagation_matches_graph_search(
+    generate_annotations, generate_mapping
+):
+    """Ensure full propagation agrees with the subset graph search."""
+    annot = generate_annotations
+    mapping = generate_mapping
+    subset = ["a", "i", "x", "y", "z"]
+    propagated = annotations.propagate_annotations(annot, mapping)
+    searched = graph_search.graph_search(mapping, subset, annot)
+    cols = ["uniprot_accession", "go_id", "go_name"]
+    for term in subset:
+        expected = searched.loc[searched["go_id"] == term, cols]
+        result = propagated.loc[propagated["go_id"] == term, cols]
+        assert set(map(tuple, result.values)) == set(
+            map(tuple, expected.values)
+        )
+
+    assert len(propagated) > len(annot)
+
+
+def test_enrichment_propagation(generate_proteins):
+    """Check enrichment with propagated annotations."""
+    df = generate_proteins
+    df.set_index("Protein", inplace=True)
+    result = enrichment.test_enrichment(df, propagate=True)
+    assert "GO:0001" in result["GO ID"].values
+
+
+def test_propagation_within_aspect():
+    """Ensure ancestors from another aspect are not propagated."""
+    ontology = ontologies.Ontology.from_edges(
+        ["GO:1", "GO:2", "GO:3", "GO:4"],
+        ["root", "complex", "process", "part"],
+        ["C", "C", "P", "C"],
+        [("GO:1", "GO:2"), ("GO:3", "GO:2"), ("GO:2", "GO:4")],
+    )
+    annot = pd.DataFrame(
+        {
+            "uniprot_accession": ["P1", "P2"],
+            "go_id": ["GO:4", "GO:3"],
+            "aspect": ["C", "P"],
+            "go_name": ["part", "process"],
+        }
+    )
+    propagated = annotations.propagate_annotations(annot, ontology)
+    result = set(
+        zip(propagated["uniprot_accession"], propagated["go_id"], strict=True)
+    )
+    assert result == {
+        ("P1", "GO:4"),
+        ("P1", "GO:2"),
+        ("P1", "GO:1"),
+        ("P2", "GO:3"),
+    }
+    p1_aspects = propagated.loc[propagated["uniprot_accession"] == "P1"]
+    assert set(p1_aspects["aspect"]) == {"C"}
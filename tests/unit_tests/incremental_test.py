@@ -0,0 +1,103 @@
+"""Test incremental enrichment as new columns are added."""
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+
+from gopher import enrichment, incremental
+
+
+@pytest.fixture
+def study():
+    """Create a study and annotations."""
+    rng = np.random.default_rng(4)
+    accessions = [f"P{i:03d}" for i in range(60)]
+    proteins = pd.DataFrame(
+        rng.normal(size=(60, 6)),
+        index=accessions,
+        columns=[f"Run {i}" for i in range(6)],
+    )
+    annot = pd.DataFrame(
+        {
+            "uniprot_accession": rng.choice(accessions[:55], size=250),
+            "go_id": rng.choice(list("abcdefg"), size=250),
+            "aspect": "C",
+        }
+    )
+    annot["go_name"] = annot["go_id"].str.upper()
+    return proteins, annot
+
+
+def test_incremental_matches_full(study, tmp_path):
+    """Test that adding columns matches testing the whole study."""
+    proteins, annot = study
+    path = tmp_path / "state.npz"
+    expected = enrichment.test_enrichment(proteins, annotations=annot)
+
+    first = incremental.update_enrichment(
+        proteins.iloc[:, :4], path, annotations=annot
+    )
+    pd.testing.assert_frame_equal(first, expected.iloc[:, :7])
+
+    # New runs may list the proteins in a different order:
+    result = incremental.update_enrichment(
+        proteins.iloc[::-1, :], path, annotations=annot
+    )
+    pd.testing.assert_frame_equal(result, expected)
+
+    state = incremental.EnrichmentState.load(path)
+    assert list(state.columns) == list(proteins.columns)
+    assert state.u_stats.shape == (len(expected), 6)
+    assert state.t_correction.shape == (6,)
+
+
+def test_incremental_missing_proteins(study):
+    """Test that the protein universe cannot shrink."""
+    proteins, annot = study
+    state = incremental.EnrichmentState.from_proteins(
+        proteins.iloc[:, :2], annotations=annot
+    )
+    with pytest.raises(ValueError):
+        state.update(proteins.iloc[5:, :])
+
+
+def test_incremental_options(study, tmp_path):
+    """Test that saved options are used by later updates."""
+    proteins, annot = study
+    path = tmp_path / "state.npz"
+    expected = enrichment.test_enrichment(
+        proteins, annotations=annot, log_pvals=True
+    )
+    incremental.update_enrichment(
+        proteins.iloc[:, :3], path, annotations=annot, log_pvals=True
+    )
+    result = incremental.update_enrichment(proteins, path)
+    pd.testing.assert_frame_equal(result, expected)
+
+    # The U statistics come from the same ranking as the p-values:
+    state = incremental.EnrichmentState.load(path)
+    values = proteins.loc[state.accessions, "Run 5"].to_numpy()
+    members = state.membership[0, :].toarray().ravel().astype(bool)
+    u_stat = stats.mannwhitneyu(values[members], values[~members])[0]
+    np.testing.assert_allclose(state.u_stats[0, 5], u_stat)
+
+
+def test_incremental_column_names(study, tmp_path):
+    """Test that columns that are not strings match after a reload."""
+    proteins, annot = study
+    proteins.columns = range(6)
+    path = tmp_path / "state.npz"
+    expected = enrichment.test_enrichment(proteins, annotations=annot)
+    incremental.update_enrichment(
+        proteins.iloc[:, :4], path, annotations=annot
+    )
+    result = incremental.update_enrichment(proteins, path)
+    assert list(result.columns[3:]) == [str(i) for i in range(6)]
+    np.testing.assert_allclose(result.iloc[:, 3:], expected.iloc[:, 3:])
+
+    # A random number generator cannot be saved with the state:
+    with pytest.raises(ValueError, match="seed"):
+        incremental.EnrichmentState.from_proteins(
+            proteins, annotations=annot, seed=np.random.default_rng(1)
+        )
@@ -0,0 +1,47 @@
+"""Test the integer codes for accessions and GO terms."""
+
+import numpy as np
+import pandas as pd
+
+from gopher import enrichment, interning
+
+
+def test_intern_sorted():
+    """Test that the categories are sorted, so codes sort like strings."""
+    values = interning.intern(["P2", "P10", np.nan, "P1", "P2"])
+    assert list(values.categories) == ["P1", "P10", "P2"]
+    codes = interning.codes(values)
+    np.testing.assert_array_equal(codes, [2, 1, -1, 0, 2])
+
+    unsorted = pd.Categorical(["b", "a"], categories=["b", "a"])
+    assert list(interning.intern(unsorted).categories) == ["a", "b"]
+
+
+def test_lookup():
+    """Test mapping interned values through a dictionary."""
+    values = pd.Series(["GO:2", "GO:1", None, "GO:3", "GO:1"])
+    mapped = interning.lookup(values, {"GO:1": 10, "GO:2": 20})
+    np.testing.assert_array_equal(mapped, [20, 10, -1, -1, 10])
+
+
+def test_interned_enrichment():
+    """Test that interned and plain annotations give the same results."""
+    rng = np.random.default_rng(1)
+    accessions = [f"P{i}" for i in range(60)]
+    annot = pd.DataFrame(
+        {
+            "uniprot_accession": rng.choice(accessions + ["Z1"], 300),
+            "go_id": rng.choice(["GO:1", "GO:2", "GO:3", "GO:4"], 300),
+            "aspect": "C",
+        }
+    )
+    annot["go_name"] = annot["go_id"].str.replace("GO:", "term ")
+    proteins = pd.DataFrame(
+        rng.normal(size=(60, 2)), index=accessions, columns=["a", "b"]
+    )
+
+    expected = enrichment.test_enrichment(proteins, annotations=annot)
+    interned = interning.intern_annotations(annot)
+    assert isinstance(interned["go_id"].dtype, pd.CategoricalDtype)
+    result = enrichment.test_enrichment(proteins, annotations=interned)
+    pd.testing.assert_frame_equal(result, expected)
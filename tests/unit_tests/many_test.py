@@ -0,0 +1,92 @@
+"""Test running many datasets against one set of annotations."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from gopher import enrichment
+
+
+@pytest.fixture
+def datasets():
+    """Create datasets with overlapping proteins and random annotations."""
+    rng = np.random.default_rng(5)
+    accessions = [f"P{i:03d}" for i in range(80)]
+    annot = pd.DataFrame(
+        {
+            "uniprot_accession": rng.choice(accessions[:70], size=300),
+            "go_id": rng.choice(list("abcdefghij"), size=300),
+            "aspect": "C",
+        }
+    )
+    annot["go_name"] = annot["go_id"].str.upper()
+
+    data = []
+    for size in [80, 40, 40, 25]:
+        index = rng.choice(accessions, size=size, replace=False)
+        data.append(pd.DataFrame(rng.normal(size=(size, 3)), index=index))
+
+    data.append(data[1].copy())  # The same proteins as another dataset.
+    return data, annot
+
+
+def test_many_matches_single(datasets):
+    """Test that each result matches test_enrichment()."""
+    data, annot = datasets
+    results = enrichment.test_enrichment_many(
+        data, annotations=annot, contaminants_filter=["P001"]
+    )
+    assert len(results) == len(data)
+    for proteins, result in zip(data, results, strict=True):
+        expected = enrichment.test_enrichment(
+            proteins, annotations=annot, contaminants_filter=["P001"]
+        )
+        pd.testing.assert_frame_equal(result, expected)
+
+
+def test_many_dict_and_files(datasets, tmp_path):
+    """Test keyed datasets and datasets read from files."""
+    data, annot = datasets
+    path = tmp_path / "proteins.txt"
+    data[0].to_csv(path, sep="\t")
+
+    def reader(fname):
+        return pd.read_table(fname, index_col=0).set_axis(
+            data[0].columns, axis=1
+        )
+
+    results = enrichment.test_enrichment_many(
+        {"memory": data[0], "file": path}, reader=reader, annotations=annot
+    )
+    assert list(results) == ["memory", "file"]
+    pd.testing.assert_frame_equal(results["memory"], results["file"])
+
+
+def test_index_keeps_last_subset(datasets):
+    """Test that only the membership subset of the last dataset is kept."""
+    data, annot = datasets
+    index = enrichment._AnnotationIndex(annot)
+    first = index.select(data[1].index)[2]
+    assert index.select(data[4].index)[2] is first
+
+    last = [index.select(p.index)[2] for p in data][-1]
+    assert index._last[2] is last
+    assert index.select(data[1].index)[2] is not first
+
+
+def test_iter_skips_failures(datasets):
+    """Test that datasets that fail are reported and skipped."""
+    data, annot = datasets
+    constant = data[0].copy()
+    constant.loc[:, :] = 1.0
+    failed = []
+    results = enrichment.iter_enrichment_many(
+        [("a", data[0]), ("b", constant), ("c", data[1])],
+        annotations=annot,
+        on_error=lambda key, err: failed.append((key, str(err))),
+    )
+    assert [key for key, _ in results] == ["a", "c"]
+    assert failed == [("b", "All numbers are identical")]
+
+    with pytest.raises(ValueError):
+        list(enrichment.test_enrichment_many([constant], annotations=annot))
@@ -0,0 +1,191 @@
+"""Test the per-phase metrics."""
+
+import contextvars
+import json
+import pstats
+import threading
+
+import numpy as np
+import pytest
+
+from gopher import enrichment, metrics
+from gopher import gopher as cli
+
+
+@metrics.instrument
+def _allocate(n_items):
+    """Allocate an array and count its items."""
+    metrics.count(items=n_items)
+    return np.ones(n_items)
+
+
+def test_nested_phases():
+    """Test that phases nest and record their counts."""
+    with metrics.collect() as collected:
+        with metrics.phase("outer", proteins=3):
+            _allocate(10)
+            _allocate(20)
+
+    names = [p.name for p in collected.phases]
+    assert names == ["outer", "outer/allocate", "outer/allocate"]
+    assert [p.depth for p in collected.phases] == [0, 1, 1]
+    assert collected.phases[0].counts == {"proteins": 3}
+    assert [p.counts["items"] for p in collected.phases[1:]] == [10, 20]
+    for phase in collected.phases:
+        assert phase.seconds >= 0
+        assert phase.peak_traced is None
+
+    assert collected.phases[0].seconds >= collected.phases[1].seconds
+
+    df = collected.to_frame()
+    assert df["name"].tolist() == names
+    assert df["items"].tolist()[1:] == [10, 20]
+
+
+def test_threads():
+    """Test that phases in other threads are recorded and nested alone."""
+    with metrics.collect() as collected:
+        with metrics.phase("outer"):
+            context = contextvars.copy_context()
+            thread = threading.Thread(target=context.run, args=(_allocate, 5))
+            thread.start()
+            thread.join()
+
+    names = [(p.name, p.depth) for p in collected.phases]
+    assert names == [("outer", 0), ("allocate", 0)]
+    assert collected.phases[1].counts == {"items": 5}
+
+
+def test_inactive():
+    """Test that nothing is recorded outside of collect()."""
+    with metrics.phase("outer") as phase:
+        assert phase is None
+        assert _allocate(5).shape == (5,)
+        metrics.count(items=5)
+
+    with metrics.collect() as collected:
+        pass
+
+    assert collected.phases == []
+
+
+def test_trace_memory():
+    """Test that the allocations of each phase are traced."""
+    n_items = 1_000_000
+    with metrics.collect(trace_memory=True) as collected:
+        with metrics.phase("outer"):
+            _allocate(n_items)
+
+    outer, inner = collected.phases
+    assert inner.peak_traced >= n_items * 8
+    assert outer.peak_traced >= inner.peak_traced
+
+
+def test_save(tmp_path):
+    """Test that the metrics and profile are saved."""
+    with metrics.collect() as collected:
+        _allocate(10)
+
+    with pytest.raises(ValueError):
+        collected.save_profile(tmp_path / "none.prof")
+
+    collected.save(tmp_path / "metrics.json")
+    with (tmp_path / "metrics.json").open() as json_ref:
+        saved = json.load(json_ref)
+
+    assert saved == collected.to_dict()
+    assert saved["phases"][0]["counts"] == {"items": 10}
+
+    with metrics.collect(profile=True) as collected:
+        _allocate(10)
+
+    collected.save_profile(tmp_path / "out.prof")
+    stats = pstats.Stats(str(tmp_path / "out.prof"))
+    assert any(func[2] == "_allocate" for func in stats.stats)
+
+
+def test_enrichment_phases(generate_proteins):
+    """Test that the phases of test_enrichment are recorded."""
+    proteins = generate_proteins.set_index("Protein")
+    with metrics.collect() as collected:
+        enrichment.test_enrichment(proteins)
+
+    phases = {p.name: p for p in collected.phases}
+    n_proteins, n_samples = proteins.shape
+    assert phases["test_enrichment"].counts == {
+        "proteins": n_proteins,
+        "samples": n_samples,
+    }
+    assert "test_enrichment/prepare_annotations/load_annotations" in phases
+    assert "test_enrichment/adjust_pvals" in phases
+    sparse = phases["test_enrichment/test_sparse"]
+    matrix = phases["test_enrichment/membership_matrix"]
+    assert sparse.counts["tests"] == n_samples * matrix.counts["terms"]
+
+
+def test_cli(tmp_path):
+    """Test that the command line saves metrics and a profile."""
+    proteins = tmp_path / "proteins.txt"
+    rows = ["Protein\tNumPeptides\tPeptideSequences\tA\tB"]
+    for i, acc in enumerate(["P10809", "P35527", "Q9UMS4", "P35637"]):
+        rows.append(f"sp|{acc}|X_HUMAN\t1\tPEPTIDE\t{i + 1}.0\t{4 - i}.0")
+
+    proteins.write_text("\n".join(rows) + "\n")
+    out_file = tmp_path / "results.txt"
+    metrics_file = tmp_path / "metrics.json"
+    profile_file = tmp_path / "out.prof"
+    cli.main(
+        [
+            str(proteins),
+            "-o",
+            str(out_file),
+            "--metrics",
+            str(metrics_file),
+            "--profile",
+            str(profile_file),
+        ]
+    )
+
+    assert out_file.exists()
+    assert profile_file.exists()
+    with metrics_file.open() as json_ref:
+        phases = {p["name"]: p for p in json.load(json_ref)["phases"]}
+
+    assert phases["read/read_encyclopedia"]["counts"] == {
+        "rows": 4,
+        "columns": 3,
+    }
+    assert phases["read/read_encyclopedia"]["depth"] == 1
+    assert phases["test_enrichment"]["counts"]["proteins"] == 4
+    assert phases["write"]["counts"]["rows"] > 0
+
+
+def test_cli_batch(tmp_path):
+    """Test that the reads and writes of a batch are recorded."""
+    rows = ["Protein\tNumPeptides\tPeptideSequences\tA\tB"]
+    for i, acc in enumerate(["P10809", "P35527", "Q9UMS4", "P35637"]):
+        rows.append(f"sp|{acc}|X_HUMAN\t1\tPEPTIDE\t{i + 1}.0\t{4 - i}.0")
+
+    for name in ["a.txt", "b.txt"]:
+        (tmp_path / name).write_text("\n".join(rows) + "\n")
+
+    metrics_file = tmp_path / "metrics.json"
+    code = cli.main(
+        [
+            "batch",
+            str(tmp_path / "*.txt"),
+            "-o",
+            str(tmp_path / "out"),
+            "--metrics",
+            str(metrics_file),
+        ]
+    )
+    assert code == 0
+    with metrics_file.open() as json_ref:
+        phases = json.load(json_ref)["phases"]
+
+    names = [p["name"] for p in phases]
+    assert names.count("read") == 2
+    assert names.count("read/read_encyclopedia") == 2
+    assert names.count("write") == 2
+    assert all(p["counts"]["rows"] > 0 for p in phases if p["name"] == "write")
@@ -10,7 +10,7 @@ CURRPATH = Path(__file__).parent
 
 
 @pytest.fixture
-def real_data(tmp_path):
+def real_data(data_dir):
     """Test using small files."""
     fasta_df = CURRPATH / "../data/small-yeast.fasta"
     quant = pd.read_csv(CURRPATH / "../data/yeast_small.csv")
@@ -42,3 +42,36 @@ def test_normalize_one_prot(real_data):
     # Get the calculation from the function and compare the results
     result = normalize.normalize_values(single_prot_quant, fasta).values
     np.testing.assert_array_equal(result, manual_result)
+
+
+def test_masses_are_cached(real_data, data_dir, monkeypatch):
+    """Check that the FASTA masses are cached without rereading the file."""
+    quant, fasta = real_data
+    first = normalize.normalize(quant, fasta)
+    cached = list((data_dir / "fasta").glob("*.masses.npz"))
+    assert len(cached) == 1
+
+    def fail(*args, **kwargs):
+        raise AssertionError("The FASTA file was read again.")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(normalize.cache, "file_digest", fail)
+        patch.setattr(normalize, "read_fasta", fail)
+        masses = normalize.read_masses(fasta)
+
+    fasta_df = normalize.read_fasta(fasta)
+    np.testing.assert_allclose(masses.to_numpy(), fasta_df["Mass"])
+    pd.testing.assert_frame_equal(normalize.normalize(quant, fasta), first)
+
+
+def test_mass_matches_biopython(real_data):
+    """Check the vectorized masses against Biopython."""
+    from Bio import SeqUtils
+
+    _, fasta = real_data
+    fasta_df = normalize.read_fasta(fasta)
+    expected = [
+        SeqUtils.molecular_weight(s, seq_type="protein")
+        for s in fasta_df["Sequence"]
+    ]
+    np.testing.assert_allclose(fasta_df["Mass"], expected)
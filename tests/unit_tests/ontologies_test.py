@@ -0,0 +1,92 @@
+"""Test the compiled Gene Ontology."""
+
+import pytest
+
+from gopher import graph_search, ontologies
+
+OBO = """format-version: 1.2
+
+[Term]
+id: GO:0000001
+name: root
+namespace: cellular_component
+
+[Term]
+id: GO:0000002
+name: left
+namespace: cellular_component
+is_a: GO:0000001 ! root
+
+[Term]
+id: GO:0000003
+name: right
+namespace: cellular_component
+is_a: GO:0000001 ! root
+
+[Term]
+id: GO:0000004
+name: leaf
+namespace: cellular_component
+is_a: GO:0000002 ! left
+is_a: GO:0000003 ! right
+
+[Typedef]
+id: part_of
+name: part of
+"""
+
+
+@pytest.fixture
+def obo_file(data_dir):
+    """Write a small OBO file to the data directory."""
+    obo_file = data_dir / "ontologies" / "go-basic.obo"
+    obo_file.parent.mkdir()
+    obo_file.write_text(OBO)
+    return obo_file
+
+
+def test_compiled_ontology(obo_file):
+    """Test the term lookups and transitive closure."""
+    ontology = ontologies.load_compiled_ontology()
+    assert obo_file.with_suffix(".npz").exists()
+    assert ontology.terms() == {
+        "GO:0000001": "root",
+        "GO:0000002": "left",
+        "GO:0000003": "right",
+        "GO:0000004": "leaf",
+        "part_of": "part of",
+    }
+    assert ontology["GO:0000001"] == ["GO:0000002", "GO:0000003"]
+    assert ontology.children("root") == ["GO:0000002", "GO:0000003"]
+    assert ontology.descendants("GO:0000001") == [
+        "GO:0000002",
+        "GO:0000003",
+        "GO:0000004",
+    ]
+    assert ontology.ancestors("leaf") == [
+        "GO:0000001",
+        "GO:0000002",
+        "GO:0000003",
+    ]
+    assert ontology.aspects[ontology.code("leaf")] == "C"
+
+    # Loading from the cache should give the same ontology:
+    cached = ontologies.load_compiled_ontology()
+    assert dict(cached) == dict(ontology)
+    assert cached.descendants("root") == ontology.descendants("root")
+
+
+def test_ontology_from_mapping(generate_mapping):
+    """Test that the closure agrees with the recursive tree search."""
+    ontology = ontologies.Ontology.from_mapping(generate_mapping)
+    subset = ["a", "i", "x", "y", "z"]
+    expected = graph_search.new_map(generate_mapping, subset)
+    result = graph_search.new_map(ontology, subset)
+    for term in subset:
+        assert sorted(result[term]) == sorted(set(expected[term]))
+
+
+def test_ontology_cycle():
+    """Test that cycles are detected."""
+    with pytest.raises(ValueError):
+        ontologies.Ontology.from_mapping({"a": ["b"], "b": ["a"]})
@@ -0,0 +1,86 @@
+"""Test spreading the enrichment tests across processes."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from gopher import enrichment, parallel
+
+
+def test_bounds():
+    """Test splitting a range into shards."""
+    assert parallel._bounds(10, 3) == [(0, 3), (3, 7), (7, 10)]
+    assert parallel._bounds(2, 4) == [(0, 1), (1, 2)]
+    assert parallel._bounds(0, 2) == []
+
+
+def test_shared_array():
+    """Test that an attached array sees the same memory."""
+    array = np.arange(12, dtype=float).reshape(3, 4)
+    shared = parallel._SharedArray.copy(array)
+    try:
+        attached = parallel._SharedArray.attach(*shared.spec)
+        np.testing.assert_array_equal(attached.array, array)
+        attached.array[0, 0] = -1
+        assert shared.array[0, 0] == -1
+        attached.close()
+    finally:
+        shared.close(unlink=True)
+
+
+def test_sharded_enrichment():
+    """Test that several processes give the same results as one."""
+    rng = np.random.default_rng(2)
+    accessions = [f"P{i}" for i in range(100)]
+    prot = pd.DataFrame(rng.normal(size=(100, 3)), index=accessions)
+    annot = pd.DataFrame(
+        {
+            "uniprot_accession": rng.choice(accessions, size=400),
+            "go_id": rng.choice(list("abcdefgh"), size=400),
+            "aspect": "C",
+        }
+    )
+    annot["go_name"] = annot["go_id"].str.upper()
+    for kwargs in [{}, {"method": "permutation", "seed": 1}]:
+        expected = enrichment.test_enrichment(
+            prot, annotations=annot, n_permutations=100, **kwargs
+        )
+        result = enrichment.test_enrichment(
+            prot, annotations=annot, n_permutations=100, n_jobs=2, **kwargs
+        )
+        pd.testing.assert_frame_equal(result, expected)
+
+    # Without a seed, every shard still draws the same permutations:
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(parallel.stats, "fixed_seed", lambda: 1)
+        result = enrichment.test_enrichment(
+            prot,
+            annotations=annot,
+            method="permutation",
+            n_permutations=100,
+            n_jobs=4,
+        )
+
+    pd.testing.assert_frame_equal(result, expected)
+
+    # All of the available cores:
+    result = enrichment.test_enrichment(prot, annotations=annot, n_jobs=-1)
+    pd.testing.assert_frame_equal(
+        result, enrichment.test_enrichment(prot, annotations=annot)
+    )
+
+
+def test_resolve_jobs(monkeypatch):
+    """Test that all of the cores are used by default, on any platform."""
+    assert parallel.resolve_jobs(2) == 2
+    assert parallel.resolve_jobs(0) == 1
+    assert parallel.resolve_jobs(-1) >= 1
+    assert parallel.resolve_jobs(None) == parallel.resolve_jobs(-1)
+
+    # Platforms such as macOS and Windows lack sched_getaffinity():
+    monkeypatch.delattr(parallel.os, "sched_getaffinity", raising=False)
+    monkeypatch.setattr(parallel.os, "process_cpu_count", lambda: 3, False)
+    assert parallel.resolve_jobs(-1) == 3
+    monkeypatch.delattr(parallel.os, "process_cpu_count")
+    monkeypatch.setattr(parallel.os, "cpu_count", lambda: None)
+    assert parallel.resolve_jobs(-1) == 1
@@ -0,0 +1,126 @@
+"""Test the compact formats for enrichment results."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from gopher import gopher as cli
+from gopher import results
+
+
+@pytest.fixture
+def wide():
+    """Enrichment results for 6 terms in 3 samples."""
+    pvals = np.array(
+        [
+            [0.5, 0.01, np.nan],
+            [0.04, 0.2, 0.001],
+            [0.001, 0.03, 0.9],
+            [0.9, 0.04, 0.02],
+            [0.06, 0.5, 0.03],
+            [0.02, 0.002, 0.5],
+        ]
+    )
+    df = pd.DataFrame(
+        {
+            "GO ID": [f"GO:{i:07d}" for i in range(6)],
+            "GO Name": [f"term {i}" for i in range(6)],
+            "GO Aspect": ["C", "F", "P", "C", "F", "P"],
+        }
+    )
+    return pd.concat(
+        [df, pd.DataFrame(pvals, columns=["A", "B", "C"])], axis=1
+    )
+
+
+def test_fdr(wide):
+    """Test that only p-values below the threshold are kept."""
+    long = results.to_long(wide, fdr=0.03)
+    melted = wide.melt(
+        id_vars=["GO ID", "GO Name", "GO Aspect"],
+        var_name="Sample",
+        value_name="P-value",
+    )
+    expected = melted.loc[melted["P-value"] <= 0.03, :]
+    expected = expected.sort_values(["Sample", "P-value"])
+    assert long.columns.tolist() == expected.columns.tolist()
+    np.testing.assert_array_equal(
+        long.astype(str).to_numpy(),
+        expected.astype(str).to_numpy(),
+    )
+
+    logged = results.to_long(
+        wide.assign(**{s: np.log(wide[s]) for s in "ABC"}), fdr=0.03, log=True
+    )
+    np.testing.assert_allclose(np.exp(logged["Log P-value"]), long["P-value"])
+
+    everything = results.to_long(wide)
+    assert len(everything) == 17
+
+
+def test_top_k(wide):
+    """Test that the best terms of each sample are kept."""
+    long = results.to_long(wide, top_k=2)
+    assert long["Sample"].tolist() == ["A", "A", "B", "B", "C", "C"]
+    assert long["GO ID"].tolist() == [
+        "GO:0000002",
+        "GO:0000005",
+        "GO:0000005",
+        "GO:0000000",
+        "GO:0000001",
+        "GO:0000003",
+    ]
+    assert long["Rank"].tolist() == [1, 2, 1, 2, 1, 2]
+
+    # Both filters together:
+    long = results.to_long(wide, fdr=0.01, top_k=2)
+    assert long["GO ID"].tolist() == [
+        "GO:0000002",
+        "GO:0000005",
+        "GO:0000000",
+        "GO:0000001",
+    ]
+    assert long["Rank"].tolist() == [1, 1, 2, 1]
+
+    assert len(results.to_long(wide, top_k=100)) == 17
+
+
+@pytest.mark.parametrize("suffix", [".tsv", ".parquet", ".arrow"])
+def test_write(wide, tmp_path, suffix):
+    """Test that every format can be read back."""
+    pytest.importorskip("pyarrow")
+    path = tmp_path / f"results{suffix}"
+    results.write_results(wide, path, fdr=0.05)
+    if suffix == ".tsv":
+        observed = pd.read_table(path)
+    elif suffix == ".parquet":
+        observed = pd.read_parquet(path)
+    else:
+        observed = pd.read_feather(path)
+
+    expected = results.to_long(wide, fdr=0.05)
+    pd.testing.assert_frame_equal(
+        observed.astype(str), expected.astype(str), check_dtype=False
+    )
+
+    path = tmp_path / "wide.out"
+    results.write_results(wide, path, fmt="parquet")
+    pd.testing.assert_frame_equal(pd.read_parquet(path), wide)
+
+    with pytest.raises(ValueError):
+        results.write_results(wide, path, fmt="xlsx")
+
+
+def test_cli(tmp_path):
+    """Test that the command line writes compact output."""
+    proteins = tmp_path / "proteins.txt"
+    rows = ["Protein\tNumPeptides\tPeptideSequences\tA\tB"]
+    for i, acc in enumerate(["P10809", "P35527", "Q9UMS4", "P35637"]):
+        rows.append(f"sp|{acc}|X_HUMAN\t1\tPEPTIDE\t{i + 1}.0\t{4 - i}.0")
+
+    proteins.write_text("\n".join(rows) + "\n")
+    out_file = tmp_path / "results.txt"
+    cli.main([str(proteins), "-o", str(out_file), "--top-k", "1"])
+    long = pd.read_table(out_file)
+    assert long["Sample"].tolist() == ["A", "B"]
+    assert long["Rank"].tolist() == [1, 1]
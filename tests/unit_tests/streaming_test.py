@@ -0,0 +1,100 @@
+"""Test that chunked enrichment matches the in-memory results."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from gopher import enrichment, streaming
+
+
+@pytest.fixture
+def fake_data():
+    """Create a protein matrix with many samples and random annotations."""
+    rng = np.random.default_rng(7)
+    accessions = [f"P{i:05d}" for i in range(50)]
+    proteins = pd.DataFrame(
+        rng.normal(size=(50, 23)),
+        index=accessions,
+        columns=[f"Sample {i}" for i in range(23)],
+    )
+    annot = pd.DataFrame(
+        {
+            "uniprot_accession": rng.choice(accessions[:45], size=200),
+            "go_id": rng.choice(list("abcdefghij"), size=200),
+            "aspect": "C",
+        }
+    )
+    annot["go_name"] = annot["go_id"].str.upper()
+    return proteins, annot
+
+
+@pytest.mark.parametrize("memory_limit", [1, 5000, 2**30])
+def test_memmap_chunks(fake_data, tmp_path, memory_limit):
+    """Test chunked enrichment of a memmap for several chunk sizes."""
+    proteins, annot = fake_data
+    expected = enrichment.test_enrichment(
+        proteins, annotations=annot, desc=False
+    )
+
+    mmap = np.lib.format.open_memmap(
+        tmp_path / "proteins.npy", mode="w+", shape=proteins.shape
+    )
+    mmap[:] = proteins.to_numpy()
+    result = streaming.test_enrichment_chunked(
+        mmap,
+        index=proteins.index,
+        columns=proteins.columns,
+        annotations=annot,
+        memory_limit=memory_limit,
+        desc=False,
+    )
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_chunks_are_unadjusted(fake_data):
+    """Test that each chunk has the raw p-values for its columns."""
+    proteins, annot = fake_data
+    chunks = list(
+        streaming.iter_enrichment_chunks(
+            proteins, annotations=annot, memory_limit=5000
+        )
+    )
+    assert len(chunks) > 1
+    cols = [c for chunk in chunks for c in chunk.columns[3:]]
+    assert cols == list(proteins.columns)
+
+
+def test_parquet_chunks(fake_data, tmp_path):
+    """Test chunked enrichment from a Parquet file."""
+    pytest.importorskip("pyarrow")
+    proteins, annot = fake_data
+    proteins.to_parquet(tmp_path / "proteins.parquet")
+    expected = enrichment.test_enrichment(proteins, annotations=annot)
+    result = streaming.test_enrichment_chunked(
+        tmp_path / "proteins.parquet", annotations=annot, memory_limit=5000
+    )
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_permutation_chunks(fake_data):
+    """Test that permutation p-values do not depend on the chunk size."""
+    proteins, annot = fake_data
+    kwargs = {"annotations": annot, "method": "permutation", "seed": 1}
+    expected = enrichment.test_enrichment(
+        proteins, n_permutations=200, **kwargs
+    )
+    result = streaming.test_enrichment_chunked(
+        proteins, memory_limit=5000, n_permutations=200, **kwargs
+    )
+    pd.testing.assert_frame_equal(result, expected)
+
+    # Without an integer seed, one is drawn for all of the chunks:
+    kwargs["seed"] = np.random.default_rng(2)
+    expected = streaming.test_enrichment_chunked(
+        proteins, n_permutations=200, **kwargs
+    )
+    kwargs["seed"] = np.random.default_rng(2)
+    result = streaming.test_enrichment_chunked(
+        proteins, memory_limit=5000, n_permutations=200, **kwargs
+    )
+    pd.testing.assert_frame_equal(result, expected)
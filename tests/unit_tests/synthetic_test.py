@@ -0,0 +1,135 @@
+"""Test the synthetic data generator and the benchmarks built on it."""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from gopher import annotations, enrichment, normalize, synthetic
+from gopher.ontologies import Ontology
+
+BENCHMARK = Path(__file__).parents[2] / "benchmarks" / "benchmark.py"
+
+
+@pytest.fixture(scope="module")
+def dataset():
+    """A small synthetic dataset."""
+    return synthetic.SyntheticDataset.generate(
+        n_proteins=300, n_terms=120, n_samples=4, seed=1
+    )
+
+
+def test_deterministic(dataset):
+    """Test that the same seed always generates the same data."""
+    again = synthetic.SyntheticDataset.generate(
+        n_proteins=300, n_terms=120, n_samples=4, seed=1
+    )
+    pd.testing.assert_frame_equal(dataset.edges, again.edges)
+    pd.testing.assert_frame_equal(dataset.annotations, again.annotations)
+    pd.testing.assert_frame_equal(dataset.proteins, again.proteins)
+    assert dataset.enriched == again.enriched
+
+    # More samples do not change the ontology or annotations:
+    wider = synthetic.SyntheticDataset.generate(
+        n_proteins=300, n_terms=120, n_samples=8, seed=1
+    )
+    pd.testing.assert_frame_equal(dataset.edges, wider.edges)
+    pd.testing.assert_frame_equal(dataset.annotations, wider.annotations)
+
+    other = synthetic.SyntheticDataset.generate(
+        n_proteins=300, n_terms=120, n_samples=4, seed=2
+    )
+    assert not dataset.edges.equals(other.edges)
+
+
+def test_ontology(dataset):
+    """Test that the ontology is a DAG below the roots of each aspect."""
+    terms = dataset.terms
+    assert len(terms) == 120
+    assert terms["go_id"].is_unique
+
+    aspects = dict(zip(terms["go_id"], terms["aspect"], strict=True))
+    for parent, child in dataset.edges.itertuples(index=False):
+        assert aspects[parent] == aspects[child]
+
+    ontology = Ontology.from_edges(
+        terms["go_id"].tolist(),
+        terms["go_name"].tolist(),
+        terms["aspect"].tolist(),
+        list(dataset.edges.itertuples(index=False, name=None)),
+    )
+    roots = {root_id for root_id, _ in synthetic.ROOTS.values()}
+    for go_id in terms["go_id"].iloc[3:]:
+        assert roots & set(ontology.ancestors(go_id))
+
+
+def test_accessions(dataset):
+    """Test that the accessions are unique and UniProt-like."""
+    accessions = dataset.proteome["Protein"]
+    assert accessions.is_unique
+    assert accessions.str.fullmatch(r"[OPQ][0-9][A-Z0-9]{3}[0-9]").all()
+    assert (dataset.proteins.index == accessions).all()
+
+
+def test_write(dataset, tmp_path):
+    """Test that the written files can be read by gopher."""
+    files = dataset.write(tmp_path)
+    assert files["gaf"] == (
+        tmp_path / "annotations" / "2000-01-01" / "goa_human.gaf.gz"
+    )
+
+    ontology = Ontology.from_obo(files["obo"])
+    assert ontology.terms() == dict(
+        zip(dataset.terms["go_id"], dataset.terms["go_name"], strict=True)
+    )
+    assert len(ontology.child_indices) == len(dataset.edges)
+
+    annot = annotations.read_annotations(
+        files["gaf"], aspect=None, terms=ontology.terms()
+    )
+    expected = dataset.annotations.sort_values(["uniprot_accession", "go_id"])
+    observed = annot.astype(str).sort_values(["uniprot_accession", "go_id"])
+    np.testing.assert_array_equal(observed.to_numpy(), expected.to_numpy())
+
+    fasta = normalize.read_fasta(files["fasta"])
+    assert fasta["Protein"].tolist() == dataset.proteome["Protein"].tolist()
+    assert fasta["Sequence"].tolist() == dataset.proteome["Sequence"].tolist()
+
+
+def test_enriched_terms():
+    """Test that the enriched terms are found."""
+    dataset = synthetic.SyntheticDataset.generate(
+        n_proteins=1000, n_terms=200, n_samples=2, n_enriched=2, fold=16
+    )
+    results = enrichment.test_enrichment(
+        dataset.proteins, annotations=dataset.annotations
+    )
+    results = results.set_index("GO ID")
+    assert len(dataset.enriched) == 2
+    assert (results.loc[dataset.enriched, "Sample 1"] < 0.01).all()
+    assert (results.loc[dataset.enriched, "Sample 2"] > 0.5).all()
+
+
+def test_benchmark(tmp_path):
+    """Test that the benchmarks run and agree with SciPy."""
+    env = {k: v for k, v in os.environ.items() if k != "PYTEST_CURRENT_TEST"}
+    out_file = tmp_path / "timings.json"
+    cmd = [
+        sys.executable,
+        str(BENCHMARK),
+        "--case",
+        "300",
+        "100",
+        "2",
+        "--repeat",
+        "1",
+        "--output",
+        str(out_file),
+    ]
+    subprocess.run(cmd, env=env, check=True, capture_output=True)
+    cmd += ["--compare", str(out_file), "--tolerance", "1000"]
+    subprocess.run(cmd, env=env, check=True, capture_output=True)
@@ -10,7 +10,11 @@ from cloudpathlib.local import (
 )
 from pandas.testing import assert_frame_equal
 
-from gopher.parsers.tabular import read_diann
+from gopher.parsers.tabular import (
+    read_diann,
+    read_encyclopedia,
+    read_metamorpheus,
+)
 
 
 @pytest.fixture
@@ -91,3 +95,35 @@ def test_read_diann_faile_with_gg(cloud_asset_file):
         read_diann("s3://cloudpathlib-test-bucket/diann_report.gg_mat.tsv")
 
     assert "Expected columns" in str(e.value.args[0])
+
+
+def test_read_encyclopedia(tmp_path):
+    """Read EncyclopeDIA proteins, keeping only the intensities."""
+    path = tmp_path / "proteins.txt"
+    path.write_text(
+        "Protein\tNumPeptides\tPeptideSequences\tA.mzML\tB.mzML\n"
+        "sp|P12345|A_HUMAN\t2\tPEPTIDE;PEPTIDEK\t1\t2.5\n"
+        "sp|P23456|B_HUMAN\t1\tPEPTIDER\t3\t\n"
+    )
+    expected = pd.DataFrame(
+        {"A.mzML": [1.0, 3.0], "B.mzML": [2.5, float("nan")]},
+        index=pd.Index(["P12345", "P23456"], name="Protein"),
+    )
+    assert_frame_equal(read_encyclopedia(path), expected)
+
+
+def test_read_metamorpheus(tmp_path):
+    """Read MetaMorpheus target proteins and their intensities."""
+    path = tmp_path / "proteins.tsv"
+    path.write_text(
+        "Protein\tGene\tIntensity_A\tIntensity_B\t"
+        "Protein Decoy/Contaminant/Target\n"
+        "P12345|P67890\tG1\t10\t\tT\n"
+        "P23456\tG2\t30\t40\tT\n"
+        "DECOY_P1\tG3\t5\t6\tD\n"
+    )
+    expected = pd.DataFrame(
+        {"Intensity_A": [10.0, 30.0], "Intensity_B": [0.0, 40.0]},
+        index=pd.Index(["P12345", "P23456"], name="Protein"),
+    )
+    assert_frame_equal(read_metamorpheus(path), expected)
@@ -0,0 +1,121 @@
+"""Test the resumable, conditional downloads."""
+
+import hashlib
+
+import pytest
+import requests
+
+from gopher import cache, utils
+
+BODY = bytes(range(256)) * 400
+
+
+@pytest.fixture
+def server(http_server):
+    """Serve a file that is larger than a few chunks."""
+    http_server.files["/data.gz"] = BODY
+    return http_server
+
+
+def test_download(server, tmp_path):
+    """Test that a download is written atomically and checksummed."""
+    out_file = tmp_path / "data.gz"
+    digest = hashlib.sha256(BODY).hexdigest()
+    assert utils.http_download(
+        server.url + "data.gz", out_file, chunk_size=1000, sha256=digest
+    )
+    assert out_file.read_bytes() == BODY
+    assert not out_file.with_name("data.gz.part").exists()
+
+    # A wrong digest leaves the previous file in place:
+    with pytest.raises(ValueError, match="SHA-256"):
+        utils.http_download(
+            server.url + "data.gz",
+            out_file,
+            sha256="0" * 64,
+            conditional=False,
+        )
+
+    assert out_file.read_bytes() == BODY
+    assert not out_file.with_name("data.gz.part").exists()
+
+    with pytest.raises(requests.HTTPError):
+        utils.http_download(server.url + "missing.gz", tmp_path / "missing")
+
+    assert not (tmp_path / "missing").exists()
+
+
+def test_conditional(server, tmp_path):
+    """Test that unchanged files are not downloaded again."""
+    out_file = tmp_path / "data.gz"
+    assert utils.http_download(server.url + "data.gz", out_file)
+    assert not utils.http_download(server.url + "data.gz", out_file)
+    assert "If-None-Match" in server.headers[-1]
+    assert out_file.read_bytes() == BODY
+
+    server.files["/data.gz"] = BODY[::-1]
+    assert utils.http_download(server.url + "data.gz", out_file)
+    assert out_file.read_bytes() == BODY[::-1]
+
+    # Without the downloaded file, the headers are not used:
+    out_file.unlink()
+    assert utils.http_download(server.url + "data.gz", out_file)
+    assert "If-None-Match" not in server.headers[-1]
+
+
+def test_resume(server, tmp_path):
+    """Test that an interrupted download is resumed."""
+    out_file = tmp_path / "data.gz"
+    part_file = tmp_path / "data.gz.part"
+    server.truncate["/data.gz"] = 30000
+    with pytest.raises((requests.RequestException, OSError)):
+        utils.http_download(server.url + "data.gz", out_file, chunk_size=1000)
+
+    assert not out_file.exists()
+    assert part_file.stat().st_size == 30000
+
+    assert utils.http_download(server.url + "data.gz", out_file)
+    assert server.headers[-1]["Range"] == "bytes=30000-"
+    assert out_file.read_bytes() == BODY
+    assert not part_file.exists()
+
+    # A partial file of a file that has since changed is not resumed:
+    url = server.url + "data.gz"
+    server.files["/data.gz"] = BODY[::-1]
+    server.truncate["/data.gz"] = 20000
+    with pytest.raises((requests.RequestException, OSError)):
+        utils.http_download(url, out_file, chunk_size=1000, conditional=False)
+
+    server.files["/data.gz"] = BODY
+    assert utils.http_download(url, out_file, conditional=False)
+    assert server.headers[-1]["Range"] == "bytes=20000-"
+    assert out_file.read_bytes() == BODY
+
+    # A partial file that cannot be resumed is discarded:
+    server.truncate["/data.gz"] = 20000
+    with pytest.raises((requests.RequestException, OSError)):
+        utils.http_download(url, out_file, chunk_size=1000, conditional=False)
+
+    part_file.write_bytes(BODY + BODY)
+    assert utils.http_download(url, out_file, conditional=False)
+    assert out_file.read_bytes() == BODY
+    assert "Range" not in server.headers[-1]
+
+
+def test_content_encoding(server, tmp_path, monkeypatch):
+    """Test that compressed responses are decoded and not hashed needlessly."""
+    monkeypatch.setattr(cache, "file_digest", pytest.fail)
+    out_file = tmp_path / "data.gz"
+    server.gzip.add("/data.gz")
+    assert utils.http_download(server.url + "data.gz", out_file)
+    assert out_file.read_bytes() == BODY
+
+    # An interrupted compressed download starts again from the beginning:
+    server.truncate["/data.gz"] = 100
+    url = server.url + "data.gz"
+    with pytest.raises((requests.RequestException, OSError)):
+        utils.http_download(url, out_file, 1000, conditional=False)
+
+    assert utils.http_download(url, out_file, conditional=False)
+    assert "Range" not in server.headers[-1]
+    assert out_file.read_bytes() == BODY